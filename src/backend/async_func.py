@@ -0,0 +1,293 @@
+"""
+async_func.py
+
+Asynchronous login and posting engine: one coroutine per platform on a
+shared event loop, every call bounded by a timeout, posts preparing
+while the logins run, results reported per platform as they complete.
+
+Bluesky runs on the native asynchronous atproto client. The other SDKs
+(instagrapi, Mastodon.py, tweepy) are blocking: their calls run in the
+loop's worker threads, so a slow platform only holds its own thread
+and its timeout frees the others' results.
+
+Part of the "Ancient Wisdom Daily" project by OperaVaria.
+"""
+
+# Imports from built-in modules:
+import asyncio
+import logging
+from dataclasses import dataclass
+from time import perf_counter
+
+# Imports from local modules:
+from backend.auth_func import (bluesky_login_async, insta_login, mastodon_login,
+                               mastodon_refresh, x_auth, x_refresh)
+from backend.post_func import bluesky_post_async, insta_post, mastodon_post, x_post
+from config.path_constants import INSTA_SESSION
+from config.settings import API_TIMEOUT, INSTA_DELAY_RANGE
+
+# Setup logging.
+logger = logging.getLogger(__name__)
+
+
+# Platforms, in result order.
+PLATFORMS = ("Bluesky", "Instagram", "Mastodon", "X")
+
+
+@dataclass(frozen=True)
+class PlatformResult:
+    """
+    Outcome of a platform's run: the response, or the error and the
+    stage it failed at ("login", "prepare" or "posting").
+    """
+    platform: str
+    response: object = None
+    error: str = None
+    stage: str = None
+    latency: float = 0.0
+
+    @property
+    def ok(self):
+        """True if the platform posted."""
+        return self.error is None
+
+    def summary(self):
+        """
+        Returns:
+            summary(dict): JSON-serializable result, without the response.
+        """
+        return {"ok": self.ok, "stage": self.stage, "error": self.error,
+                "latency_ms": round(self.latency * 1000)}
+
+
+async def post_all(bs_cl, in_cl, mt_api, x_api, x_cl,
+                   text_post, image_post, timeout=API_TIMEOUT):
+    """
+    Post to every platform concurrently.
+
+    Args:
+        bs_cl, in_cl, mt_api, x_api, x_cl: authenticated
+            social media Client and API objects.
+        text_post: TextPost object.
+        image_post: ImagePost object.
+        timeout(float): seconds allowed per platform.
+
+    Returns:
+        results(tuple[PlatformResult]): in PLATFORMS order.
+    """
+    posts = asyncio.get_running_loop().create_future()
+    posts.set_result((text_post, image_post))
+    clients = (bs_cl, in_cl, mt_api, (x_api, x_cl))
+    return await _collect(_login_then_post(name, _ready(client), posts, timeout)
+                          for name, client in zip(PLATFORMS, clients))
+
+
+async def publish(keys, prepare, timeout=API_TIMEOUT, store=None):
+    """
+    Log in and prepare the posts at the same time: the preparation
+    (quote selection, rendering, encoding) runs in a worker thread while
+    the logins wait on the network. Each platform posts as soon as its
+    own login and the posts are ready; a failure only affects its own
+    platform. Stored sessions due for a refresh are refreshed alongside.
+    The image's temporary files are removed at the end.
+
+    Args:
+        keys: nested login information dict.
+        prepare: function returning (TextPost, ImagePost) objects.
+        timeout(float): seconds allowed per platform, per step.
+        store: SessionStore object or None, see session_func.
+
+    Returns:
+        results(tuple[PlatformResult]): in PLATFORMS order.
+    """
+    posts = asyncio.ensure_future(asyncio.to_thread(prepare))
+    refreshes = [] if store is None else _refreshes(keys, store, timeout)
+    try:
+        return await _collect(_login_then_post(name, login, posts, timeout)
+                              for name, login in _logins(keys, store).items())
+    finally:
+        # Let the preparation finish even if every login failed.
+        await asyncio.wait([posts])
+        if not posts.cancelled() and not posts.exception():
+            posts.result()[1].discard_file()
+        for error in await asyncio.gather(*refreshes, return_exceptions=True):
+            if error is not None:
+                logger.error("Session refresh failed: %r", error)
+
+
+def run_summary(results):
+    """
+    Summarize the results of a run for monitoring.
+
+    Args:
+        results(list[PlatformResult]): publish or post_all results.
+
+    Returns:
+        summary(dict): JSON-serializable {"ok": all succeeded,
+                       "platforms": {platform name: result summary}}.
+    """
+    return {"ok": all(result.ok for result in results),
+            "platforms": {result.platform: result.summary() for result in results}}
+
+
+async def _login_then_post(name, login, posts, timeout):
+    """
+    Helper function. Log in to a platform, wait for the posts, post.
+    Never raises: errors are reported in the result.
+
+    Args:
+        name(str): platform name.
+        login: awaitable of the platform's client, see _logins.
+        posts: future of the (TextPost, ImagePost) objects.
+        timeout(float): seconds allowed per step.
+
+    Returns:
+        result: PlatformResult object.
+    """
+    start = perf_counter()
+    stage = "login"
+    try:
+        client = await _with_timeout(name, login, stage, timeout)
+        stage = "prepare"
+        # Shielded: one platform's cancellation must not cancel the others' posts.
+        text_post, image_post = await asyncio.shield(posts)
+        stage = "posting"
+        response = await _with_timeout(name, _posting(name, client, text_post, image_post),
+                                       stage, timeout)
+    # Any SDK or network error: the other platforms go on.
+    except Exception as e:  # pylint: disable=broad-exception-caught
+        error = f"{type(e).__name__}: {e}" if str(e) else type(e).__name__
+        return PlatformResult(name, error=error, stage=stage, latency=perf_counter() - start)
+    return PlatformResult(name, response=response, latency=perf_counter() - start)
+
+
+async def _ready(client):
+    """
+    Helper function for post_all: an already authenticated client.
+
+    Args:
+        client: Client or API object.
+
+    Returns:
+        client: the same object.
+    """
+    return client
+
+
+async def _collect(calls):
+    """
+    Helper function. Run platform calls concurrently, log each result
+    as soon as it completes.
+
+    Args:
+        calls: iterable of _login_then_post coroutines.
+
+    Returns:
+        results(tuple[PlatformResult]): in PLATFORMS order.
+    """
+    results = {}
+    for completed in asyncio.as_completed([asyncio.ensure_future(call) for call in calls]):
+        result = await completed
+        if result.ok:
+            logger.info("%s posted in %.2f s", result.platform, result.latency)
+        else:
+            logger.error("%s failed at %s after %.2f s: %s", result.platform,
+                         result.stage, result.latency, result.error)
+        results[result.platform] = result
+    return tuple(results[name] for name in PLATFORMS if name in results)
+
+
+def _logins(keys, store=None):
+    """
+    Helper function. Login calls of every platform, not yet awaited.
+
+    Args:
+        keys: nested login information dict.
+        store: SessionStore object or None.
+
+    Returns:
+        logins(dict): {platform name: awaitable}, in PLATFORMS order.
+    """
+    return {
+        "Bluesky": bluesky_login_async(keys["bluesky"]["handle"],
+                                       keys["bluesky"]["password"], store=store),
+        "Instagram": asyncio.to_thread(insta_login, keys["instagram"]["username"],
+                                       keys["instagram"]["password"],
+                                       INSTA_SESSION, INSTA_DELAY_RANGE),
+        "Mastodon": asyncio.to_thread(mastodon_login, keys["mastodon"]["access_token"],
+                                      keys["mastodon"]["api_base_uri"], store=store),
+        "X": asyncio.to_thread(x_auth, keys["x"], store=store),
+    }
+
+
+def _refreshes(keys, store, timeout):
+    """
+    Helper function for publish. Start refreshing the stored Mastodon
+    and X validations due for it, in worker threads. Bluesky sessions
+    are refreshed by the client itself, when its access token expires.
+
+    Args:
+        keys: nested login information dict.
+        store: SessionStore object.
+        timeout(float): seconds allowed per platform.
+
+    Returns:
+        refreshes(list): running tasks.
+    """
+    return [asyncio.ensure_future(_with_timeout(name, call, "session refresh", timeout))
+            for name, call in (
+                ("Mastodon", asyncio.to_thread(mastodon_refresh, keys["mastodon"]["access_token"],
+                                               keys["mastodon"]["api_base_uri"], store)),
+                ("X", asyncio.to_thread(x_refresh, keys["x"], store)))]
+
+
+def _posting(name, client, text_post, image_post):
+    """
+    Helper function. Posting call of a platform, not yet awaited.
+
+    Args:
+        name(str): platform name.
+        client: the platform's login result (X: (x_api, x_cl)).
+        text_post: TextPost object.
+        image_post: ImagePost object.
+
+    Returns:
+        awaitable of the request response object.
+    """
+    if name == "Bluesky":
+        return bluesky_post_async(client, image_post, text_post)
+    if name == "X":
+        return asyncio.to_thread(x_post, *client, image_post, text_post)
+    post_func = {"Instagram": insta_post, "Mastodon": mastodon_post}[name]
+    return asyncio.to_thread(post_func, client, image_post, text_post)
+
+
+async def _with_timeout(name, call, action, timeout):
+    """
+    Helper function. Await a call, bounded by a timeout.
+    A timed out blocking SDK call keeps its worker thread until it
+    returns, but its result is no longer waited for.
+
+    Args:
+        name(str): platform name.
+        call: awaitable.
+        action(str): see above.
+        timeout(float): seconds allowed.
+
+    Returns:
+        result of the call.
+
+    Raises:
+        asyncio.TimeoutError: if the call takes longer than the timeout
+                              (the builtin TimeoutError from Python 3.11).
+    """
+    try:
+        return await asyncio.wait_for(call, timeout)
+    except asyncio.TimeoutError:
+        logger.error("%s %s timed out after %s s", name, action, timeout)
+        raise
+
+
+# Print on accidental run:
+if __name__ == "__main__":
+    print("Importable module. Not meant to be run!")
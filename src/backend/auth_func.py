@@ -7,12 +7,15 @@ Part of the "Ancient Wisdom Daily" project by OperaVaria.
 """
 
 # Imports from built-in modules:
+import asyncio
 import logging
 from os.path import exists as os_exists
 
 # Imports from external packages:
+from atproto import AsyncClient as BsAsyncClient
 from atproto import Client as BsClient
-from atproto_client.exceptions import UnauthorizedError
+from atproto import SessionEvent, models
+from atproto_client.exceptions import AtProtocolError, UnauthorizedError
 from instagrapi import Client as InstaClient
 from instagrapi.exceptions import ClientUnauthorizedError, LoginRequired
 from mastodon import Mastodon
@@ -22,6 +25,9 @@ from tweepy import Client as XClient
 from tweepy import OAuth1UserHandler
 from tweepy.errors import Unauthorized
 
+# Imports from local modules:
+from backend.session_func import fingerprint
+
 # Setup logging:
 logger = logging.getLogger(__name__)
 
@@ -49,6 +55,75 @@ def bluesky_login(login, password):
         raise
 
 
+async def bluesky_login_async(login, password, store=None):
+    """
+    Set up Bluesky login on the asynchronous client with error handling.
+    With a session store, a stored session is resumed without logging
+    in (its access token is refreshed if expiring), and new or refreshed
+    sessions are stored. Store file access runs in worker threads.
+
+    Args:
+        login: Bluesky handle.
+        password: Bluesky password.
+        store: SessionStore object or None.
+
+    Returns:
+        bs_cl: authenticated Bluesky AsyncClient object.
+
+    Raises:
+        UnauthorizedError: if login fails.
+    """
+    bs_cl = BsAsyncClient()
+    if store is not None:
+        owner = fingerprint(login, password)
+
+        async def save_session(event, session):
+            if event in (SessionEvent.CREATE, SessionEvent.REFRESH):
+                await asyncio.to_thread(store.put, "bluesky", owner,
+                                        {"session": session.encode()})
+
+        bs_cl.on_session_change(save_session)
+        data = await asyncio.to_thread(store.get, "bluesky", owner)
+        if data is not None and await _bluesky_resume(bs_cl, data["session"]):
+            return bs_cl
+        await asyncio.to_thread(store.drop, "bluesky")
+    try:
+        await bs_cl.login(login, password)
+        return bs_cl
+    except UnauthorizedError as e:
+        logger.error("Bluesky login failed: %s", e)
+        raise
+
+
+async def _bluesky_resume(bs_cl, session_string):
+    """
+    Helper function for bluesky_login_async. Resume a stored session:
+    no createSession request, only a refreshSession one if the access
+    token is expiring.
+
+    Args:
+        bs_cl: new Bluesky AsyncClient object.
+        session_string: exported session string.
+
+    Returns:
+        Success boolean.
+    """
+    # The public login(session_string=...) fetches the profile too: the
+    # client only needs the DID for posting.
+    # pylint: disable=protected-access
+    try:
+        session = await bs_cl._import_session_string(session_string)
+        if bs_cl._should_refresh_session():
+            await bs_cl._refresh_and_set_session()
+    except (AtProtocolError, ValueError) as e:
+        logger.info("Stored Bluesky session rejected, logging in: %s", e)
+        return False
+    bs_cl.me = models.AppBskyActorDefs.ProfileViewDetailed(did=session.did,
+                                                           handle=session.handle)
+    logger.info("Bluesky session resumed")
+    return True
+
+
 def insta_login(username, password, settings_path, delay_range):
     """
     Set up Instagram login using either username and password,
@@ -138,13 +213,16 @@ def _try_credentials_login(client, username, password, settings_path):
         return False
 
 
-def mastodon_login(access_token, api_base_uri):
+def mastodon_login(access_token, api_base_uri, store=None):
     """
-    Set up Mastodon login with error handling.
+    Set up Mastodon login with error handling. Without a stored
+    validation, the credentials are validated (and the validation
+    stored).
 
     Args:
         access_token: Mastodon application access token.
         api_base_uri: Mastodon application redirect URI.
+        store: SessionStore object or None (no validation).
 
     Returns:
         mt_api: authenticated Mastodon API object.
@@ -154,18 +232,62 @@ def mastodon_login(access_token, api_base_uri):
     """
     try:
         mt_api = Mastodon(access_token=access_token, api_base_url=api_base_uri)
+        if store is not None and store.get(
+                "mastodon", fingerprint(access_token, api_base_uri)) is None:
+            mastodon_validate(access_token, api_base_uri, store, mt_api)
         return mt_api
     except MastodonUnauthorizedError as e:
         logger.error("Mastodon authentication failed: %s", e)
         raise
 
 
-def x_auth(x_keys):
+def mastodon_validate(access_token, api_base_uri, store, mt_api=None):
     """
-    Authenticate both versions of the X API.
+    Validate Mastodon credentials with a request, store the validation
+    (or drop the stored one if rejected).
+
+    Args:
+        access_token, api_base_uri: see mastodon_login.
+        store: SessionStore object.
+        mt_api: Mastodon API object of the credentials, None to create one.
+
+    Raises:
+        MastodonUnauthorizedError: if the credentials are rejected.
+    """
+    mt_api = mt_api or Mastodon(access_token=access_token, api_base_url=api_base_uri)
+    try:
+        account = mt_api.account_verify_credentials()
+    except MastodonUnauthorizedError:
+        store.drop("mastodon")
+        raise
+    store.put("mastodon", fingerprint(access_token, api_base_uri),
+              {"account_id": str(account["id"])})
+
+
+def mastodon_refresh(access_token, api_base_uri, store):
+    """
+    Revalidate the stored Mastodon validation if it is due for a
+    refresh (see SessionStore.stale). Missing ones are left to the login.
+
+    Args: see mastodon_validate.
+
+    Raises:
+        MastodonUnauthorizedError: if the credentials are rejected.
+    """
+    if (store.get("mastodon", fingerprint(access_token, api_base_uri)) is not None
+            and store.stale("mastodon")):
+        mastodon_validate(access_token, api_base_uri, store)
+
+
+def x_auth(x_keys, store=None):
+    """
+    Authenticate both versions of the X API. Without a stored
+    validation, the credentials are validated (and the validation
+    stored).
 
     Args:
         x_keys: dictionary containing all required keys and tokens.
+        store: SessionStore object or None (no validation).
 
     Returns:
         x_api: authenticated v1.1 X API object.
@@ -196,12 +318,67 @@ def x_auth(x_keys):
             consumer_secret=x_keys["consumer_secret"],
             wait_on_rate_limit=True,
         )
+        if store is not None and store.get("x", _x_owner(x_keys)) is None:
+            x_validate(x_keys, store, x_cl)
     except Unauthorized as e:
         logger.error("X API v2 authentication failed: %s", e)
         raise
     return x_api, x_cl
 
 
+def x_validate(x_keys, store, x_cl=None):
+    """
+    Validate X credentials with a request, store the validation (or
+    drop the stored one if rejected).
+
+    Args:
+        x_keys: see x_auth.
+        store: SessionStore object.
+        x_cl: v2 X Client object of the credentials, None to create one.
+
+    Raises:
+        Unauthorized: if the credentials are rejected.
+    """
+    x_cl = x_cl or XClient(access_token_secret=x_keys["access_token_secret"],
+                           access_token=x_keys["access_token"],
+                           bearer_token=x_keys["bearer_token"],
+                           consumer_key=x_keys["consumer_key"],
+                           consumer_secret=x_keys["consumer_secret"])
+    try:
+        user = x_cl.get_me().data
+    except Unauthorized:
+        store.drop("x")
+        raise
+    store.put("x", _x_owner(x_keys), {"user_id": str(user.id)})
+
+
+def x_refresh(x_keys, store):
+    """
+    Revalidate the stored X validation if it is due for a refresh (see
+    SessionStore.stale). Missing ones are left to the login.
+
+    Args: see x_validate.
+
+    Raises:
+        Unauthorized: if the credentials are rejected.
+    """
+    if store.get("x", _x_owner(x_keys)) is not None and store.stale("x"):
+        x_validate(x_keys, store)
+
+
+def _x_owner(x_keys):
+    """
+    Helper function. Fingerprint of the X keys.
+
+    Args:
+        x_keys: see x_auth.
+
+    Returns:
+        fingerprint(str): see session_func.fingerprint.
+    """
+    return fingerprint(*(str(x_keys[name]) for name in sorted(x_keys)))
+
+
 # Print on accidental run:
 if __name__ == "__main__":
     print("Importable module. Not meant to be run!")
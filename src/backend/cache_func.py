@@ -0,0 +1,185 @@
+"""
+cache_func.py
+
+Content-addressed on-disk cache of rendered quote images.
+
+Entries are files named by the hash of everything that affects the
+rendered bytes (see render_key). Least recently used entries are evicted
+once the directory grows over its size cap; hits refresh the file's
+modification time, so the cap is shared by every process using the same
+directory.
+
+Part of the "Ancient Wisdom Daily" project by OperaVaria.
+"""
+
+# Imports from built-in modules:
+import logging
+import os
+import threading
+import time
+from hashlib import sha256
+from pathlib import Path
+from tempfile import mkstemp
+
+# Setup logging.
+logger = logging.getLogger(__name__)
+
+
+def render_key(*parts):
+    """
+    Hash render inputs into a cache key. Paths stand for their files:
+    their size and modification time are hashed too.
+
+    Args:
+        parts: str, int, tuple or Path values.
+
+    Returns:
+        key(str): hex digest.
+    """
+    digest = sha256()
+    for part in parts:
+        if isinstance(part, Path):
+            try:
+                stat = part.stat()
+                part = (str(part), stat.st_size, stat.st_mtime_ns)
+            except OSError:
+                part = (str(part), None)
+        digest.update(repr(part).encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def _touch(path):
+    """
+    Set a file's modification time to now, explicitly: file system
+    timestamps set by writes may be too coarse to order entries.
+
+    Args:
+        path: Path or str of the file.
+    """
+    now = time.time_ns()
+    os.utime(path, ns=(now, now))
+
+
+class RenderCache:
+    """Directory of cached encoded images with a total size cap."""
+
+    def __init__(self, directory, max_bytes, suffix=".jpg"):
+        """
+        Create a RenderCache instance.
+
+        Args:
+            directory: Path of the cache directory, created on first write.
+            max_bytes(int): size cap of the directory.
+            suffix(str): file name suffix of the entries.
+        """
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+        self.hits = 0
+        self.misses = 0
+        # Estimated directory size, None until the first write scans it.
+        self._total = None
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Return the cached bytes of a key and mark them recently used.
+
+        Args:
+            key(str): cache key (see render_key).
+
+        Returns:
+            data(bytes/None): cached bytes or None on a miss.
+        """
+        path = self._path(key)
+        try:
+            data = path.read_bytes()
+            _touch(path)
+        except OSError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return data
+
+    def put(self, key, data):
+        """
+        Store bytes under a key (atomically, concurrent readers never see
+        a partial file), then evict old entries if over the cap.
+
+        Args:
+            key(str): cache key.
+            data(bytes/memoryview): encoded image.
+        """
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            handle, temp_path = mkstemp(suffix=".tmp", dir=self.directory)
+            with os.fdopen(handle, "wb") as file:
+                file.write(data)
+            _touch(temp_path)
+            os.replace(temp_path, self._path(key))
+        except OSError as e:
+            # The cache is an optimization: never fail a render over it.
+            logger.error("Failed to write render cache entry: %s", e)
+            return
+        with self._lock:
+            if self._total is None:
+                self._total = sum(size for _, size, _ in self._entries())
+            else:
+                self._total += len(data)
+            if self._total > self.max_bytes:
+                self._evict()
+
+    def _path(self, key):
+        """
+        Helper method. Return the file path of a key.
+
+        Args:
+            key(str): cache key.
+
+        Returns:
+            path: Path object.
+        """
+        return self.directory.joinpath(key + self.suffix)
+
+    def _entries(self):
+        """
+        Helper method for put and _evict. List the directory's entries.
+
+        Returns:
+            entries(list[tuple]): (mtime, size, path) tuples.
+        """
+        entries = []
+        with os.scandir(self.directory) as scan:
+            for entry in scan:
+                if entry.name.endswith(self.suffix):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+        return entries
+
+    def _evict(self):
+        """
+        Helper method for put. Rescan the directory (other processes may
+        have written to it) and delete least recently used entries until
+        the total is a tenth under the cap.
+        """
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        target = self.max_bytes * 0.9
+        removed = 0
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+        self._total = total
+        logger.debug("Render cache: %d entries evicted", removed)
+
+
+# Print on accidental run:
+if __name__ == "__main__":
+    print("Importable module. Not meant to be run!")
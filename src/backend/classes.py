@@ -8,16 +8,41 @@ Part of the "Ancient Wisdom Daily" project by OperaVaria.
 
 # Built-in imports:
 import logging
-import textwrap
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
+from functools import cached_property
+from io import BytesIO
+from pathlib import Path
+from tempfile import mkstemp
 
 # Imports from external packages:
-from PIL import Image, ImageDraw, ImageFont
+from PIL import ImageDraw
+
+# Imports from local modules:
+from backend.cache_func import render_key
+from backend.layout_func import TextBlock, fit_layout
+from backend.length_func import fits
+from backend.procedural_func import seed_from
+from backend.template_func import Background, load_background, template_key
+from backend.variant_func import EncodedImage, encode_variant
+from config.path_constants import TEMP_DIR, TMPFS_DIR
+from config.settings import IMG_BACKGROUND
 
 # Setup logging.
 logger = logging.getLogger(__name__)
 
+# Version of the image layout, part of the render cache key:
+# bump when create_image output changes.
+LAYOUT_VERSION = 2
+
+# Background of every image post.
+BACKGROUND = Background(**IMG_BACKGROUND)
+
+# Leading bytes of a PNG file.
+PNG_SIGNATURE = b"\x89PNG"
+
 @dataclass(frozen=True)
 class Wisdom:
     """
@@ -53,26 +78,79 @@ class TextPost:
             f'Source: "{wisdom_obj.attribution} in {wisdom_obj.locus_formatted}"'
         )
         self.comment_text = wisdom_obj.comment
+        # Length check results {platform: bool}.
+        self._fits = {}
+
+    def fits(self, platform):
+        """
+        Check the full text against the platform's length limit,
+        counted locally by the platform's rules (see length_func).
+
+        Args:
+            platform(str): "bluesky", "mastodon" or "x".
+
+        Returns:
+            True if the full text can be posted as text.
+        """
+        if platform not in self._fits:
+            self._fits[platform] = fits(platform, self.full_text)
+        return self._fits[platform]
 
 
 class ImagePost:
     """Social media image post data and factory in Python object form."""
 
     def __init__(self, wis_obj, image_size, bg_color, text_color,
-                 reg_font, bold_font):
+                 reg_font, bold_font, cache=None):
         """Create ImagePost instance from Wisdom object data
-        and image attributes."""
+        and image attributes. The image is drawn on first use; with a
+        RenderCache (see cache_func) the encoded image is looked up first
+        and only drawn on a miss."""
         self.size = image_size
         self.bg_color = bg_color
         self.text_color = text_color
-        self.reg_font = reg_font
-        self.bold_font = bold_font
+        # Regular and bold font files.
+        self._fonts = (reg_font, bold_font)
         self.path = None
-        self.image = self.create_image(wis_obj)
+        self.cache = cache
+        self._wis_obj = wis_obj
+        # Encoded images {platform: EncodedImage}, None for the baseline.
+        self._media = {}
+        self._temp_paths = {}
+        # Guards the one-time encoding and temporary files of this instance.
+        self._lock = threading.Lock()
+
+    @property
+    def reg_font(self):
+        """Path or str of the regular font file."""
+        return self._fonts[0]
+
+    @property
+    def bold_font(self):
+        """Path or str of the bold font file."""
+        return self._fonts[1]
+
+    @cached_property
+    def image(self):
+        """PIL Image object of the post, drawn on first access."""
+        return self.create_image(self._wis_obj)
+
+    @property
+    def cache_key(self):
+        """Render cache key: hash of the drawn fields and render settings."""
+        wis_obj = self._wis_obj
+        return render_key(LAYOUT_VERSION, wis_obj.original, wis_obj.translation,
+                          wis_obj.attribution, wis_obj.locus, tuple(self.size),
+                          tuple(self.bg_color), tuple(self.text_color),
+                          Path(self.reg_font), Path(self.bold_font),
+                          template_key(self.size, self.bg_color, BACKGROUND),
+                          # Seeded backgrounds differ per quote.
+                          wis_obj.id if BACKGROUND.seeded else None)
 
     def create_image(self, wis_obj):
         """
-        Create and return an image with the quote text.
+        Create and return an image with the quote text, laid out at the
+        largest font size that fits (see layout_func).
 
         Args:
             wis_obj: Wisdom dataclass instance.
@@ -80,75 +158,158 @@ class ImagePost:
         Returns:
             quote_image: PIL Image object.
         """
-        # Create background image.
-        quote_image = Image.new("RGB", self.size, self.bg_color)
-        # Load fonts with helper method.
-        font_large_reg, font_large_bold, font_small_bold = self._load_fonts()
-        # Create wrapped text.
-        text_origin = textwrap.fill(f'"{wis_obj.original}"', width=40)
-        text_transl = textwrap.fill(f'"{wis_obj.translation}"', width=40)
-        text_attrib = f"/ {wis_obj.attribution}\n In {wis_obj.locus} /"
+        # Copy the background template.
+        quote_image = load_background(self.size, self.bg_color, BACKGROUND,
+                                      seed_from(wis_obj.id))
+        # Lay out text blocks.
+        _, lines = fit_layout(self.text_blocks(wis_obj), self.size)
         # Draw text on image.
         draw_cont = ImageDraw.Draw(quote_image)
-        draw_cont.multiline_text(
-            xy=(540, 384),
-            text=text_origin,
-            fill=self.text_color,
-            font=font_large_bold,
-            anchor="mm",
-            align="center",
-        )
-        draw_cont.multiline_text(
-            xy=(540, 512),
-            text=text_transl,
-            fill=self.text_color,
-            font=font_large_reg,
-            anchor="mm",
-            align="center",
-        )
-        draw_cont.multiline_text(
-            xy=(540, 768),
-            text=text_attrib,
-            fill=self.text_color,
-            font=font_small_bold,
-            anchor="mm",
-            align="center",
-        )
+        for line in lines:
+            draw_cont.text(
+                xy=(line.x, line.y),
+                text=line.text,
+                fill=self.text_color,
+                font=line.font,
+                anchor="ma",
+            )
         return quote_image
 
-    def _load_fonts(self):
+    def text_blocks(self, wis_obj):
+        """
+        Args:
+            wis_obj: Wisdom dataclass instance.
+
+        Returns:
+            blocks(tuple[TextBlock]): original, translation, attribution.
+        """
+        return (TextBlock(f'"{wis_obj.original}"', self.bold_font),
+                TextBlock(f'"{wis_obj.translation}"', self.reg_font),
+                TextBlock(f"/ {wis_obj.attribution}\n In {wis_obj.locus} /",
+                          self.bold_font, 0.75))
+
+    def encode(self):
+        """
+        Encode the image as JPEG once, in memory. Later calls (from any
+        thread) return the same buffer. A render cache hit skips drawing.
+
+        Returns:
+            bin_data(bytes): binary image data.
+        """
+        with self._lock:
+            if None not in self._media and self.cache is not None:
+                key = self.cache_key
+                data = self.cache.get(key)
+                if data is None:
+                    data = self._encode_jpeg()
+                    self.cache.put(key, data)
+                self._media[None] = EncodedImage.from_bytes(data, "JPEG")
+            elif None not in self._media:
+                self._media[None] = EncodedImage.from_bytes(self._encode_jpeg(), "JPEG")
+            return self._media[None].data
+
+    def encode_variants(self, specs):
+        """
+        Encode the per-platform variants of the image (see variant_func)
+        in parallel, from the one drawn image. Variants already encoded
+        are kept; render cache hits skip drawing.
+
+        Args:
+            specs(dict): {platform: VariantSpec}.
+
+        Returns:
+            media(dict): {platform: EncodedImage}.
+        """
+        with self._lock:
+            missing = {platform: spec for platform, spec in specs.items()
+                       if platform not in self._media}
+        encoded = {}
+        for platform, spec in list(missing.items()):
+            data = None if self.cache is None else self.cache.get(self._variant_key(spec))
+            if data is not None:
+                encoded[platform] = _from_cache(data, spec)
+                del missing[platform]
+        if missing:
+            # Draw once, before the encoder threads share the image.
+            image = self.image
+            with ThreadPoolExecutor(max_workers=len(missing)) as executor:
+                futures = {platform: executor.submit(encode_variant, image, spec)
+                           for platform, spec in missing.items()}
+                for platform, future in futures.items():
+                    encoded[platform] = future.result()
+                    if self.cache is not None:
+                        self.cache.put(self._variant_key(missing[platform]),
+                                       encoded[platform].data)
+        with self._lock:
+            for platform, media in encoded.items():
+                self._media.setdefault(platform, media)
+            return {platform: self._media[platform] for platform in specs}
+
+    def media(self, platform=None):
+        """
+        Return the encoded image of a platform: its variant if encoded
+        (see encode_variants), otherwise the baseline JPEG.
+
+        Args:
+            platform(str/None): platform name, None for the baseline.
+
+        Returns:
+            EncodedImage object.
+        """
+        with self._lock:
+            media = self._media.get(platform)
+        if media is None:
+            self.encode()
+            media = self._media[None]
+        return media
+
+    def _encode_jpeg(self):
+        """
+        Helper method for encode. Encode the drawn image.
+
+        Returns:
+            bin_data(bytes): binary image data.
+        """
+        buffer = BytesIO()
+        self.image.save(buffer, "JPEG")
+        return buffer.getvalue()
+
+    def _variant_key(self, spec):
+        """
+        Helper method for encode_variants.
+
+        Args:
+            spec: VariantSpec object.
+
+        Returns:
+            key(str): render cache key of the variant.
+        """
+        return render_key(self.cache_key, spec)
+
+    def view(self, platform=None):
+        """
+        Args:
+            platform(str/None): platform name, None for the baseline.
+
+        Returns:
+            memoryview: zero-copy view of the encoded image.
+        """
+        return memoryview(self.media(platform).data)
+
+    def open_stream(self, platform=None):
         """
-        Helper method for create_image. Load and return fonts for image rendering,
-        load ImageFont default with error message if custom font unavailable.
+        Args:
+            platform(str/None): platform name, None for the baseline.
 
         Returns:
-            font_large_reg, font_large_bold, font_small_bold:
-                FreeTypeFont or ImageFont objects.
-        """
-        # Declare font variables.
-        font_large_reg = None
-        font_large_bold = None
-        font_small_bold = None
-        try:
-            # Try loading the custom fonts.
-            font_large_reg = ImageFont.truetype(self.reg_font, 40)
-            font_large_bold = ImageFont.truetype(self.bold_font, 40)
-            font_small_bold = ImageFont.truetype(self.bold_font, 30)
-        except FileNotFoundError:
-            logger.error("Font file not found. Using default font")
-            font_large_reg = ImageFont.load_default()
-            font_large_bold = ImageFont.load_default()
-            font_small_bold = ImageFont.load_default()
-        except OSError as e:
-            logger.error("Font loading error: %s. Using default font", e)
-            font_large_reg = ImageFont.load_default()
-            font_large_bold = ImageFont.load_default()
-            font_small_bold = ImageFont.load_default()
-        return font_large_reg, font_large_bold, font_small_bold
+            BytesIO: new file-like object over the encoded image, shares
+                     the buffer until written to. For clients taking files.
+        """
+        return BytesIO(self.media(platform).data)
 
     def save_image(self, path):
         """
-        Saves image to a specified path as a .jpg file,
+        Saves the encoded image to a specified path as a .jpg file,
         creates parent folder if does not exist,
         assigns location to self.path.
         
@@ -157,31 +318,85 @@ class ImagePost:
         """
         if not os.path.exists(os.path.dirname(path)):
             os.makedirs(os.path.dirname(path))
-        self.image.save(path, "JPEG")
+        with open(path, "wb") as file:
+            file.write(self.view())
         self.path = path
 
-    def open_bin(self):
+    def file_path(self, platform=None):
         """
-        Open saved image as binary data with error handling.
+        Return a path to the encoded image for clients that only accept
+        paths: self.path if saved (baseline), otherwise a temporary file
+        written once per platform, on tmpfs where available
+        (see discard_file).
+
+        Args:
+            platform(str/None): platform name, None for the baseline.
+
+        Returns:
+            path: Path or str of the image file.
+        """
+        media = self.media(platform)
+        with self._lock:
+            if platform is None and self.path is not None:
+                return self.path
+            if platform in self._temp_paths:
+                return self._temp_paths[platform]
+        temp_dir = TMPFS_DIR if TMPFS_DIR.is_dir() else TEMP_DIR
+        temp_dir.mkdir(parents=True, exist_ok=True)
+        handle, temp_path = mkstemp(suffix=media.extension, dir=temp_dir)
+        with os.fdopen(handle, "wb") as file:
+            file.write(media.data)
+        with self._lock:
+            if platform not in self._temp_paths:
+                self._temp_paths[platform] = temp_path
+                if platform is None:
+                    self.path = temp_path
+                return temp_path
+        # Another thread was faster.
+        os.remove(temp_path)
+        return self._temp_paths[platform]
+
+    def discard_file(self):
+        """Remove the temporary files written by file_path, if any."""
+        with self._lock:
+            temp_paths, self._temp_paths = self._temp_paths, {}
+            if self.path is not None and self.path == temp_paths.get(None):
+                self.path = None
+        for temp_path in temp_paths.values():
+            try:
+                os.remove(temp_path)
+            except OSError as e:
+                logger.error("Failed to remove temporary image: %s", e)
+
+    def open_bin(self, platform=None):
+        """
+        Return the encoded image as binary data, from memory:
+        no file is needed.
+
+        Args:
+            platform(str/None): platform name, None for the baseline.
 
         Returns:
             bin_data(bytes): binary image data.
-        
-        Raises:
-            TypeError: if Image data has not been saved yet
-                       (i.e. self.path = None).
-            FileNotFoundError, PermissionError:
-                if image file loading fails.
-        """
-        if self.path is None:
-            raise TypeError("Image data has not yet been saved")
-        try:
-            with open(self.path, "rb") as file:
-                bin_data = file.read()
-                return bin_data
-        except (FileNotFoundError, PermissionError) as e:
-            logger.error("Failed to load quote image file: %s", e)
-            raise
+        """
+        return self.media(platform).data
+
+
+def _from_cache(data, spec):
+    """
+    Helper function for ImagePost.encode_variants. Wrap cached variant
+    bytes: a lossless variant over its budget was stored as JPEG.
+
+    Args:
+        data(bytes): cached image.
+        spec: VariantSpec object.
+
+    Returns:
+        EncodedImage object.
+    """
+    if spec.format == "PNG" and not data.startswith(PNG_SIGNATURE):
+        return EncodedImage.from_bytes(data, "JPEG")
+    return EncodedImage.from_bytes(data, spec.format)
 
 
 # Print on accidental run:
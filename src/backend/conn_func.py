@@ -0,0 +1,195 @@
+"""
+conn_func.py
+
+Functions for managing long-lived SQLite connections.
+
+Part of the "Ancient Wisdom Daily" project by OperaVaria.
+"""
+
+# Imports from built-in modules:
+import logging
+import sqlite3
+import threading
+import weakref
+from contextlib import contextmanager
+from pathlib import Path
+
+# Imports from local modules:
+from config.settings import DB_PRAGMAS
+
+# Setup logging.
+logger = logging.getLogger(__name__)
+
+# Per-thread _ThreadConnections holders.
+_local = threading.local()
+# Weak registry of every live holder, for close_connections(shutdown=True).
+_registry = weakref.WeakSet()
+_registry_lock = threading.Lock()
+
+# Connection roles, by file open mode:
+#   "state": read-write, the posting state (WAL journal);
+#   "corpus": read-write, corpus writes (imports, index builds), rollback journal;
+#   "read": read-only, corpus readers (search, glyph checks, rendering).
+ROLES = ("state", "corpus", "read")
+# Pragmas changing the file itself, applied to state databases only:
+# the shipped corpus keeps its rollback journal.
+STATE_PRAGMAS = ("journal_mode", "synchronous")
+
+
+class _ThreadConnections:
+    """
+    Connections of one thread {(db path, corpus path, role): connection}.
+    Held only by the thread-local, so it is collected when its thread
+    exits and the finalizer closes the connections left open.
+    """
+    __slots__ = ("cons", "__weakref__")
+
+    def __init__(self):
+        self.cons = {}
+        weakref.finalize(self, _close_all, self.cons)
+
+
+def _close_all(cons):
+    """
+    Close and forget every connection of a dictionary.
+
+    Args:
+        cons(dict): {key: connection}.
+    """
+    while cons:
+        _, con = cons.popitem()
+        con.close()
+
+
+def get_connection(db_file, corpus_file=None, role="state"):
+    """
+    Return the calling thread's connection to a database file,
+    open and tune a new one on first use.
+
+    Args:
+        db_file: Path to database file.
+        corpus_file: Path to a corpus database to attach read-only and
+                     immutable as "corpus", None for single-file use.
+                     With a corpus the database file is created if missing.
+        role(str): "state", "corpus" or "read", see ROLES.
+
+    Returns:
+        con: SQLite connection object.
+
+    Raises:
+        sqlite3.Error: if the database cannot be opened.
+        ValueError: if the role is unknown.
+    """
+    if role not in ROLES:
+        raise ValueError(f"Unknown connection role: {role}")
+    holder = getattr(_local, "holder", None)
+    if holder is None:
+        holder = _local.holder = _ThreadConnections()
+        with _registry_lock:
+            _registry.add(holder)
+    db_path = str(Path(db_file).resolve())
+    corpus_path = None if corpus_file is None else str(Path(corpus_file).resolve())
+    key = (db_path, corpus_path, role)
+    con = holder.cons.get(key)
+    if con is None:
+        con = _open_connection(db_path, corpus_path, role)
+        holder.cons[key] = con
+    return con
+
+
+def _open_connection(db_path, corpus_path, role):
+    """
+    Helper function for get_connection. Open the database file
+    (read-only for readers, created only for a separate state database),
+    apply the configured pragmas (the journal ones to state databases
+    only) and attach the corpus.
+
+    Args:
+        db_path: absolute path string of the database file.
+        corpus_path: absolute path string of the corpus file or None.
+        role(str): see get_connection.
+
+    Returns:
+        con: SQLite connection object.
+    """
+    if role == "read":
+        mode = "ro"
+    else:
+        mode = "rw" if corpus_path is None else "rwc"
+    # check_same_thread off: the exit finalizer and a shutdown
+    # close_connections may close it from another thread, otherwise
+    # each connection is only used by its own thread.
+    con = sqlite3.connect(f"{Path(db_path).as_uri()}?mode={mode}", uri=True,
+                          check_same_thread=False)
+    for pragma, value in DB_PRAGMAS.items():
+        if role == "state" or pragma not in STATE_PRAGMAS:
+            con.execute(f"PRAGMA {pragma} = {value}")
+    if corpus_path is not None:
+        # Immutable: no locking or change detection, the corpus file
+        # must not be written while attached.
+        con.execute("ATTACH DATABASE ? AS corpus",
+                    (f"{Path(corpus_path).as_uri()}?mode=ro&immutable=1",))
+        for pragma in ("mmap_size", "cache_size"):
+            con.execute(f"PRAGMA corpus.{pragma} = {DB_PRAGMAS[pragma]}")
+    logger.debug("Opened database connection: %s", db_path)
+    return con
+
+
+@contextmanager
+def db_connection(db_file, corpus_file=None, role="state"):
+    """
+    Context manager yielding the calling thread's warm connection.
+    The connection stays open on exit.
+
+    Args: see get_connection.
+
+    Yields:
+        con: SQLite connection object.
+    """
+    yield get_connection(db_file, corpus_file, role)
+
+
+@contextmanager
+def db_transaction(db_file, corpus_file=None, role="state"):
+    """
+    Context manager yielding a cursor on the calling thread's connection.
+    Commits on a clean exit, rolls back if an exception is raised.
+
+    Args: see get_connection.
+
+    Yields:
+        cur: SQLite cursor object.
+    """
+    con = get_connection(db_file, corpus_file, role)
+    try:
+        yield con.cursor()
+        con.commit()
+    except BaseException:
+        con.rollback()
+        raise
+
+
+def close_connections(shutdown=False):
+    """
+    Close the calling thread's connections. Connections of exited threads
+    are closed automatically.
+
+    Args:
+        shutdown(bool): close the connections of every thread instead.
+                        Only safe at shutdown, once no other thread is
+                        using the database: a connection closed from
+                        another thread mid-transaction breaks it.
+    """
+    if not shutdown:
+        holder = getattr(_local, "holder", None)
+        if holder is not None:
+            _close_all(holder.cons)
+        return
+    with _registry_lock:
+        for holder in list(_registry):
+            _close_all(holder.cons)
+
+
+# Print on accidental run:
+if __name__ == "__main__":
+    print("Importable module. Not meant to be run!")
@@ -3,103 +3,670 @@ db_func.py
 
 Functions related to database operations.
 
+The quotes live in the wisdoms table (corpus), the posting state in the
+state table (state database), separately for each channel (bot account).
+By default both are in the same file; with a separate state file the
+corpus is attached read-only and immutable, so one corpus file can be
+shared by several bot instances. Imports and search index builds write
+the corpus (see search_func): run them only while no instance has it
+attached.
+
 Part of the "Ancient Wisdom Daily" project by OperaVaria.
 """
 
 # Imports from built-in modules:
 import logging
+import random
 import sqlite3
+from datetime import date, timedelta
 
-# Import Wisdom dataclass.
+# Import Wisdom dataclass and connection manager.
 from backend.classes import Wisdom
+from backend.conn_func import db_transaction
+from config.settings import DB_DEFAULT_CHANNEL, DB_SELECT_MODE
 
 # Setup logging.
 logger = logging.getLogger(__name__)
 
+# Posting state, one row per channel and quote id.
+STATE_TABLE = """CREATE TABLE IF NOT EXISTS state (
+                     channel TEXT NOT NULL,
+                     id_title TEXT NOT NULL,
+                     used INTEGER NOT NULL DEFAULT 0,
+                     PRIMARY KEY (channel, id_title))"""
+
+# Partial index holding only the unused rows of each channel, keeps the
+# random pick away from full table scans and sorts.
+UNUSED_INDEX = ("CREATE INDEX IF NOT EXISTS state_unused "
+                "ON state(channel) WHERE used = 0")
+
+# Shuffled order of quote ids per channel for the "deck" selection mode.
+DECK_TABLE = """CREATE TABLE IF NOT EXISTS deck (
+                    channel TEXT NOT NULL,
+                    pos INTEGER NOT NULL,
+                    id_title TEXT NOT NULL,
+                    PRIMARY KEY (channel, pos)) WITHOUT ROWID"""
+
+# Posting history per channel, newest last.
+HISTORY_TABLE = """CREATE TABLE IF NOT EXISTS history (
+                       seq INTEGER PRIMARY KEY,
+                       channel TEXT NOT NULL,
+                       id_title TEXT NOT NULL,
+                       posted_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP)"""
+HISTORY_INDEX = ("CREATE INDEX IF NOT EXISTS history_channel "
+                 "ON history(channel, seq)")
+# Last posts of a quote, for the samplers' recency terms.
+HISTORY_QUOTE_INDEX = ("CREATE INDEX IF NOT EXISTS history_quote "
+                       "ON history(channel, id_title, seq)")
+
+# Forward schedule: quotes reserved per channel and posting date
+# (ISO format), the daily run only looks up its date.
+SCHEDULE_TABLE = """CREATE TABLE IF NOT EXISTS schedule (
+                        channel TEXT NOT NULL,
+                        post_date TEXT NOT NULL,
+                        id_title TEXT NOT NULL,
+                        posted INTEGER NOT NULL DEFAULT 0,
+                        PRIMARY KEY (channel, post_date)) WITHOUT ROWID"""
+
+# Key/value metadata, per channel: the trigger-maintained
+# "remaining:<channel>" counter, "synced:<channel>", a generation
+# number bumped whenever new corpus ids are copied into the state table,
+# and "corpus:<channel>", the corpus version the state was synced with.
+META_TABLE = ("CREATE TABLE IF NOT EXISTS state_meta "
+              "(key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+
+# Corpus version stamp, in the corpus file: bumped by triggers whenever
+# a quote id is added, so the state sync can skip unchanged corpora.
+CORPUS_META_TABLE = ("CREATE TABLE IF NOT EXISTS corpus_meta "
+                     "(key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+CORPUS_VERSION_TRIGGERS = (
+    """CREATE TRIGGER IF NOT EXISTS wisdoms_version_ins AFTER INSERT ON wisdoms
+       BEGIN UPDATE corpus_meta SET value = value + 1 WHERE key = 'version'; END""",
+    """CREATE TRIGGER IF NOT EXISTS wisdoms_version_upd AFTER UPDATE OF id_title ON wisdoms
+       WHEN old.id_title IS NOT new.id_title
+       BEGIN UPDATE corpus_meta SET value = value + 1 WHERE key = 'version'; END""",
+)
+
+# Triggers keeping the "remaining" counter in step with the used flags.
+COUNTER_TRIGGERS = (
+    """CREATE TRIGGER IF NOT EXISTS state_remaining_ins AFTER INSERT ON state
+       BEGIN UPDATE state_meta SET value = value + (new.used = 0)
+             WHERE key = 'remaining:' || new.channel; END""",
+    """CREATE TRIGGER IF NOT EXISTS state_remaining_del AFTER DELETE ON state
+       BEGIN UPDATE state_meta SET value = value - (old.used = 0)
+             WHERE key = 'remaining:' || old.channel; END""",
+    """CREATE TRIGGER IF NOT EXISTS state_remaining_upd AFTER UPDATE OF used ON state
+       WHEN old.used IS NOT new.used
+       BEGIN UPDATE state_meta SET value = value + (new.used = 0) - (old.used = 0)
+             WHERE key = 'remaining:' || new.channel; END""",
+)
+
+# Atomic claims: flag a quote used and return its id in a single statement.
+CLAIM_ID = ("UPDATE state SET used = 1 "
+            "WHERE channel = :channel AND id_title = :id_title AND used = 0 "
+            "RETURNING id_title")
+CLAIM_ROWID = ("UPDATE state SET used = 1 "
+               "WHERE rowid = :rowid AND channel = :channel AND used = 0 "
+               "RETURNING id_title")
+CLAIM_OFFSET = """UPDATE state SET used = 1 WHERE used = 0 AND rowid = (
+                      SELECT rowid FROM state WHERE channel = :channel AND used = 0
+                      LIMIT 1 OFFSET (
+                          SELECT abs(random()) % max(value, 1) FROM state_meta
+                          WHERE key = 'remaining:' || :channel))
+                  RETURNING id_title"""
+
+# Atomic deck pop: remove the channel's head card and return its id.
+DECK_POP = """DELETE FROM deck WHERE channel = :channel AND pos = (
+                  SELECT MIN(pos) FROM deck WHERE channel = :channel)
+              RETURNING id_title"""
 
-def db_get(db_file):
+# Take the quote scheduled for a date, at most once.
+CLAIM_SCHEDULED = ("UPDATE schedule SET posted = 1 "
+                   "WHERE channel = :channel AND post_date = :post_date AND posted = 0 "
+                   "RETURNING id_title")
+
+# Upcoming schedule entries of a channel with their quotes, by date.
+SELECT_SCHEDULE = """SELECT schedule.post_date, wisdoms.id_title, quote_orig, quote_eng,
+                            attrib_to, locus, locus_form, comment, state.used
+                     FROM schedule
+                     JOIN wisdoms ON wisdoms.id_title = schedule.id_title
+                     JOIN state ON state.channel = schedule.channel
+                                   AND state.id_title = schedule.id_title
+                     WHERE schedule.channel = :channel AND schedule.post_date >= :start
+                           AND schedule.posted = 0
+                     ORDER BY schedule.post_date"""
+
+# Quotes reserved for an upcoming date of a channel: they stay used
+# through resets and out of new decks until their date.
+PENDING_SCHEDULED = ("SELECT id_title FROM schedule "
+                     "WHERE channel = :channel AND posted = 0")
+
+# Rowid range of a channel's unused rows, as two separate
+# subqueries so both use the min/max index optimization.
+UNUSED_RANGE = """SELECT
+    (SELECT MIN(rowid) FROM state WHERE channel = :channel AND used = 0),
+    (SELECT MAX(rowid) FROM state WHERE channel = :channel AND used = 0)"""
+
+# Quote row joined with its posting state, in Wisdom field order.
+SELECT_WISDOM = """SELECT wisdoms.id_title, quote_orig, quote_eng, attrib_to,
+                          locus, locus_form, comment, state.used
+                   FROM wisdoms JOIN state ON state.id_title = wisdoms.id_title
+                   WHERE state.channel = :channel AND wisdoms.id_title = :id_title"""
+
+# Number of direct rowid probes before falling back to offset sampling.
+ROWID_PROBES = 8
+
+
+def db_get(db_file, mode=DB_SELECT_MODE, state_file=None,
+           channel=DB_DEFAULT_CHANNEL, sampler=None, post_date=None):
     """
     Get attributes from database and create a Wisdom instance.
+    A quote scheduled for the posting date is taken first,
+    otherwise one is selected.
 
     Args:
-        db_file: Path to database file.
+        db_file: Path to database (corpus) file.
+        mode: selection mode, "random" or "deck".
+        state_file: Path to a separate state database file, None to keep
+                    the state in the corpus file.
+        channel(str): channel (bot account) claiming the quote.
+        sampler: sampler object (see sampler_func) replacing the uniform
+                 pick in "random" mode, None for uniform.
+        post_date: datetime.date of the post, None for today.
 
     Returns:
         wis_obj: instance of the Wisdom dataclass populated from the database.
 
     Raises:
         sqlite3.Error: if there is a database-related error.
+        ValueError: if the selection mode is unknown.
     """
+    if mode not in ("random", "deck"):
+        raise ValueError(f"Unknown selection mode: {mode}")
+    post_date = (post_date or date.today()).isoformat()
     try:
-        # Database access.
-        con = sqlite3.connect(db_file)
-        cur = con.cursor()
-        # Call select random function.
-        wis_tuple = select_random(cur)
-        # If result is None ( = no more unused quotes left):
-        # call reset database function, fetch random again.
-        if wis_tuple is None:
-            db_reset(con, cur)
-            wis_tuple = select_random(cur)
-        # Create Wisdom object.
-        wis_obj = Wisdom(*wis_tuple)
-        # Change "used" value to True(1).
-        id_tuple = (wis_obj.id,)
-        cur.execute("UPDATE wisdoms SET used = 1 WHERE id_title = ?", id_tuple)
-        con.commit()
-        # Call log_remaining function.
-        log_remaining(cur)
-        # Close connection.
-        con.close()
+        # Database access on the thread's warm connection.
+        with state_transaction(db_file, state_file) as cur:
+            # Create indexes, tables and triggers if missing.
+            init_schema(cur, channel)
+            wis_obj = _scheduled_get(cur, channel, post_date)
+            if wis_obj is None:
+                wis_obj = _claim(cur, channel, mode, sampler)
+                # Record the post in the channel's history.
+                cur.execute("INSERT INTO history (channel, id_title) VALUES (?, ?)",
+                            (channel, wis_obj.id))
+            # Call log_remaining function.
+            log_remaining(cur, mode, channel)
         return wis_obj
     except sqlite3.Error as e:
         logger.error("Database error occurred: %s", e)
-        con.close()
         raise
 
 
-def select_random(cur):
+def schedule_reserve(db_file, days, mode=DB_SELECT_MODE, state_file=None,
+                     channel=DB_DEFAULT_CHANNEL, sampler=None, start=None):
+    """
+    Claim the quotes of the next N unscheduled days of a channel in a
+    single transaction, each with its posting date. Reservation continues
+    after the channel's last scheduled date.
+
+    Args:
+        db_file, mode, state_file, channel, sampler: see db_get.
+        days(int): number of days to reserve.
+        start: datetime.date of the earliest date to reserve, None for today.
+
+    Returns:
+        reserved(list[tuple]): (post_date(str), Wisdom instance) pairs.
+
+    Raises:
+        sqlite3.Error: if there is a database-related error.
+        ValueError: if the selection mode is unknown.
+    """
+    if mode not in ("random", "deck"):
+        raise ValueError(f"Unknown selection mode: {mode}")
+    first = start or date.today()
+    reserved = []
+    try:
+        with state_transaction(db_file, state_file) as cur:
+            init_schema(cur, channel)
+            cur.execute("SELECT MAX(post_date) FROM schedule WHERE channel = ?",
+                        (channel,))
+            last = cur.fetchone()[0]
+            if last is not None:
+                first = max(first, date.fromisoformat(last) + timedelta(days=1))
+            for offset in range(days):
+                post_date = (first + timedelta(days=offset)).isoformat()
+                wis_obj = _claim(cur, channel, mode, sampler)
+                cur.execute("INSERT INTO schedule (channel, post_date, id_title) "
+                            "VALUES (?, ?, ?)", (channel, post_date, wis_obj.id))
+                # History in posting order, so samplers see the queue.
+                cur.execute("INSERT INTO history (channel, id_title, posted_at) "
+                            "VALUES (?, ?, ?)", (channel, wis_obj.id, post_date))
+                reserved.append((post_date, wis_obj))
+        logger.info("%d days reserved (%s)", len(reserved), channel)
+        return reserved
+    except sqlite3.Error as e:
+        logger.error("Database error occurred: %s", e)
+        raise
+
+
+def schedule_list(db_file, state_file=None, channel=DB_DEFAULT_CHANNEL, start=None):
+    """
+    List the channel's upcoming scheduled quotes, without claiming anything.
+
+    Args:
+        db_file, state_file, channel: see db_get.
+        start: datetime.date of the first date to list, None for today.
+
+    Returns:
+        upcoming(list[tuple]): (post_date(str), Wisdom instance) pairs by date.
+
+    Raises:
+        sqlite3.Error: if there is a database-related error.
+    """
+    start = (start or date.today()).isoformat()
+    try:
+        with state_transaction(db_file, state_file) as cur:
+            init_schema(cur, channel)
+            cur.execute(SELECT_SCHEDULE, {"channel": channel, "start": start})
+            return [(row[0], Wisdom(*row[1:])) for row in cur.fetchall()]
+    except sqlite3.Error as e:
+        logger.error("Database error occurred: %s", e)
+        raise
+
+
+def state_transaction(db_file, state_file=None):
+    """
+    Open a transaction on the state database, with the corpus attached
+    if the state is kept in a separate file.
+
+    Args:
+        db_file: Path to database (corpus) file.
+        state_file: Path to state database file or None.
+
+    Returns:
+        db_transaction context manager.
+    """
+    if state_file is None:
+        return db_transaction(db_file)
+    return db_transaction(state_file, corpus_file=db_file)
+
+
+def init_schema(cur, channel=DB_DEFAULT_CHANNEL):
+    """
+    Create the state table, indexes and counter triggers if they do not
+    exist yet (and the corpus version stamp, if the state is kept in the
+    corpus file), copy new corpus ids into the channel's state.
+
+    Args:
+        cur: SQLite cursor object.
+        channel(str): channel name.
+    """
+    for command in (STATE_TABLE, UNUSED_INDEX, DECK_TABLE, HISTORY_TABLE, HISTORY_INDEX,
+                    HISTORY_QUOTE_INDEX, SCHEDULE_TABLE, META_TABLE, *COUNTER_TRIGGERS):
+        cur.execute(command)
+    # An attached corpus is read-only: imports create its stamp.
+    if "corpus" not in (row[1] for row in cur.execute("PRAGMA database_list")):
+        init_corpus(cur)
+    sync_state(cur, channel)
+    cur.connection.commit()
+
+
+def init_corpus(cur):
+    """
+    Create the corpus version stamp and its triggers if missing.
+    Writes the corpus: see the module docstring.
+
+    Args:
+        cur: SQLite cursor object on the corpus file.
+    """
+    cur.execute(CORPUS_META_TABLE)
+    cur.execute("INSERT OR IGNORE INTO corpus_meta (key, value) VALUES ('version', 0)")
+    for trigger in CORPUS_VERSION_TRIGGERS:
+        cur.execute(trigger)
+
+
+def sync_state(cur, channel=DB_DEFAULT_CHANNEL):
+    """
+    Copy corpus ids missing from the channel's state into it, matched by
+    id_title (the implicit wisdoms rowids may be renumbered by VACUUM).
+    Skipped while the corpus version equals the one last synced, so a
+    plain run does not read the corpus; corpora without a version stamp
+    (an attached corpus never imported into) are checked every time.
+    On first use of a channel its "remaining" counter is seeded; the
+    default channel also carries over the legacy wisdoms.used flags.
+    The "synced:<channel>" generation is bumped whenever ids were added.
+
+    Args:
+        cur: SQLite cursor object.
+        channel(str): channel name.
+    """
+    version = _corpus_version(cur)
+    cur.execute("SELECT value FROM state_meta WHERE key = ?",
+                (f"corpus:{channel}",))
+    if version is not None and cur.fetchone() == (version,):
+        return
+    if version is not None:
+        cur.execute("INSERT OR REPLACE INTO state_meta (key, value) VALUES (?, ?)",
+                    (f"corpus:{channel}", version))
+    cur.execute("SELECT value FROM state_meta WHERE key = ?",
+                (f"synced:{channel}",))
+    row = cur.fetchone()
+    if row is None:
+        used = "used" if channel == DB_DEFAULT_CHANNEL else "0"
+        cur.execute(f"INSERT OR IGNORE INTO state (channel, id_title, used) "
+                    f"SELECT ?, id_title, {used} FROM wisdoms", (channel,))
+        recount_remaining(cur, channel)
+        # Drop the rowid watermark of older versions.
+        cur.execute("DELETE FROM state_meta WHERE key = ?",
+                    (f"synced_rowid:{channel}",))
+        cur.execute("INSERT INTO state_meta (key, value) VALUES (?, 1)",
+                    (f"synced:{channel}",))
+        return
+    # Anti-join on the state primary key: one index lookup per quote.
+    cur.execute("INSERT INTO state (channel, id_title) "
+                "SELECT :channel, id_title FROM wisdoms WHERE NOT EXISTS ("
+                "SELECT 1 FROM state WHERE channel = :channel "
+                "AND state.id_title = wisdoms.id_title)", {"channel": channel})
+    if cur.rowcount > 0:
+        cur.execute("UPDATE state_meta SET value = value + 1 WHERE key = ?",
+                    (f"synced:{channel}",))
+
+
+def _corpus_version(cur):
+    """
+    Helper function for sync_state: read the corpus version stamp.
+
+    Args:
+        cur: SQLite cursor object.
+
+    Returns:
+        version(int)/None: None if the corpus has no stamp.
+    """
+    try:
+        row = cur.execute("SELECT value FROM corpus_meta WHERE key = 'version'").fetchone()
+    except sqlite3.OperationalError:
+        return None
+    return None if row is None else row[0]
+
+
+def recount_remaining(cur, channel=DB_DEFAULT_CHANNEL):
     """
-    Select a random row from the database.
+    Rebuild the channel's "remaining" counter with a full count.
 
     Args:
         cur: SQLite cursor object.
+        channel(str): channel name.
+
+    Returns:
+        rem_quotes(int): number of remaining unused quotes.
+    """
+    cur.execute("SELECT COUNT(*) FROM state WHERE channel = ? AND used = 0",
+                (channel,))
+    rem_quotes = cur.fetchone()[0]
+    cur.execute("INSERT OR REPLACE INTO state_meta (key, value) VALUES (?, ?)",
+                (f"remaining:{channel}", rem_quotes))
+    return rem_quotes
+
+
+def _scheduled_get(cur, channel, post_date):
+    """
+    Helper function for db_get: take the quote scheduled for the date.
+    The quote was already claimed when it was scheduled.
+
+    Args: see above.
+
+    Returns:
+        wis_obj/None: Wisdom instance or None if nothing is scheduled
+                      (or the quote was removed from the corpus).
+    """
+    row = cur.execute(CLAIM_SCHEDULED, {"channel": channel,
+                                        "post_date": post_date}).fetchone()
+    if row is None:
+        return None
+    wis_tuple = cur.execute(SELECT_WISDOM, {"channel": channel,
+                                            "id_title": row[0]}).fetchone()
+    if wis_tuple is None:
+        logger.warning("Scheduled quote %s no longer in the corpus", row[0])
+        return None
+    logger.info("Scheduled quote taken for %s", post_date)
+    return Wisdom(*wis_tuple)
+
+
+def _claim(cur, channel, mode, sampler):
+    """
+    Helper function for db_get and schedule_reserve: claim the next quote
+    with the selection mode. Nothing is committed.
+
+    Args: see above.
+
+    Returns:
+        wis_obj: Wisdom instance.
+    """
+    if mode == "deck":
+        return _deck_get(cur, channel)
+    if sampler is not None:
+        return _sampled_get(cur, channel, sampler)
+    return _random_get(cur, channel)
+
+
+def _random_get(cur, channel):
+    """
+    Helper function for db_get, "random" mode: claim an unused quote.
+
+    Args: see above.
+
+    Returns:
+        wis_obj: Wisdom instance.
+    """
+    while True:
+        # Call claim random function.
+        id_title = claim_random(cur, channel)
+        # If result is None: make sure the counter did not drift, then
+        # ( = no more unused quotes left) call reset database function,
+        # claim random again.
+        if id_title is None and recount_remaining(cur, channel) > 0:
+            id_title = claim_random(cur, channel)
+        if id_title is None:
+            _reset_state(cur, channel)
+            id_title = claim_random(cur, channel)
+        # Still None after the reset: nothing to post.
+        if id_title is None:
+            raise sqlite3.DataError("No quotes in the database")
+        wis_tuple = cur.execute(SELECT_WISDOM, {"channel": channel,
+                                                "id_title": id_title}).fetchone()
+        if wis_tuple is not None:
+            break
+        # Quote removed from the corpus: drop its state, claim again.
+        cur.execute("DELETE FROM state WHERE channel = ? AND id_title = ?",
+                    (channel, id_title))
+    # Create Wisdom object.
+    return Wisdom(*wis_tuple)
+
+
+def _sampled_get(cur, channel, sampler):
+    """
+    Helper function for db_get, "random" mode with a sampler:
+    claim the quote drawn by the sampler.
+
+    Args: see above.
 
     Returns:
-        wis_tuple/None: a tuple with the row data or None if no rows found.
+        wis_obj: Wisdom instance.
     """
-    com_random = "SELECT * FROM wisdoms WHERE used = 0 ORDER BY RANDOM()"
-    res = cur.execute(com_random)
-    wis_tuple = res.fetchone()
-    return wis_tuple
+    was_reset = False
+    while True:
+        id_title = sampler.draw(cur, channel)
+        # No more unused quotes left: reset, start over.
+        if id_title is None:
+            if was_reset:
+                raise sqlite3.DataError("No quotes in the database")
+            _reset_state(cur, channel)
+            sampler.invalidate(channel)
+            was_reset = True
+            continue
+        # Claim atomically, another process may have been faster.
+        claimed = cur.execute(CLAIM_ID, {"channel": channel,
+                                         "id_title": id_title}).fetchall()
+        sampler.claimed(channel, id_title)
+        if not claimed:
+            continue
+        wis_tuple = cur.execute(SELECT_WISDOM, {"channel": channel,
+                                                "id_title": id_title}).fetchone()
+        return Wisdom(*wis_tuple)
 
 
-def db_reset(con, cur):
+def _deck_get(cur, channel):
     """
-    Reset all 'used' values to False(0).
+    Helper function for db_get, "deck" mode: pop the head of the
+    shuffled deck, deal a new deck when the cycle is over.
+    The used flags are never written.
+
+    Args: see above.
+
+    Returns:
+        wis_obj: Wisdom instance.
+    """
+    wis_tuple = deck_pop(cur, channel)
+    if wis_tuple is None:
+        deck_deal(cur, channel)
+        wis_tuple = deck_pop(cur, channel)
+    # Still None after a new deal: nothing to post.
+    if wis_tuple is None:
+        raise sqlite3.DataError("No quotes in the database")
+    return Wisdom(*wis_tuple)
+
+
+def deck_pop(cur, channel=DB_DEFAULT_CHANNEL):
+    """
+    Remove the head of the channel's deck and return its row.
+    Ids no longer present in the corpus are skipped.
+
+    Args:
+        cur: SQLite cursor object.
+        channel(str): channel name.
+
+    Returns:
+        wis_tuple/None: a tuple with the row data or None if the deck is empty.
+    """
+    while True:
+        # Single statement: concurrent processes can never pop the same head.
+        head = cur.execute(DECK_POP, {"channel": channel}).fetchone()
+        if head is None:
+            if cur.execute("SELECT 1 FROM deck WHERE channel = ? LIMIT 1",
+                           (channel,)).fetchone() is None:
+                return None
+            # Head taken by another process in between: pop again.
+            continue
+        wis_tuple = cur.execute(SELECT_WISDOM, {"channel": channel,
+                                                "id_title": head[0]}).fetchone()
+        if wis_tuple is not None:
+            return wis_tuple
+
+
+def deck_deal(cur, channel=DB_DEFAULT_CHANNEL):
+    """
+    Start a new cycle for a channel: store a fresh random order
+    of all quote ids, except those scheduled for an upcoming date.
+
+    Args:
+        cur: SQLite cursor object.
+        channel(str): channel name.
+    """
+    cur.execute(f"SELECT id_title FROM state WHERE channel = :channel "
+                f"AND id_title NOT IN ({PENDING_SCHEDULED})", {"channel": channel})
+    id_list = [row[0] for row in cur.fetchall()]
+    random.shuffle(id_list)
+    cur.execute("DELETE FROM deck WHERE channel = ?", (channel,))
+    cur.executemany("INSERT INTO deck (channel, pos, id_title) VALUES (?, ?, ?)",
+                    ((channel, pos, id_title) for pos, id_title in enumerate(id_list)))
+    logger.info("No more items, new deck dealt")
+
+
+def claim_random(cur, channel=DB_DEFAULT_CHANNEL):
+    """
+    Claim a random unused quote: flag it as used and return its id in one
+    atomic UPDATE ... RETURNING statement, so concurrent bot processes can
+    never claim the same quote. No sort over the table is needed: first
+    random rowids are probed within the channel's range of unused rows
+    (O(log n) lookups), then a random offset into the partial index of
+    the channel's unused rows is taken, sized by the "remaining" counter.
+    Both methods are uniform over the unused rows.
+
+    Args:
+        cur: SQLite cursor object.
+        channel(str): channel name.
+
+    Returns:
+        id_title/None: id of the claimed quote or None if no rows found.
+    """
+    cur.execute(UNUSED_RANGE, {"channel": channel})
+    low, high = cur.fetchone()
+    # No unused rows: early return None.
+    if low is None:
+        return None
+    # Rowid rejection sampling.
+    for _ in range(ROWID_PROBES):
+        rows = cur.execute(CLAIM_ROWID, {"rowid": random.randint(low, high),
+                                         "channel": channel}).fetchall()
+        if rows:
+            return rows[0][0]
+    # Offset sampling over the unused index.
+    rows = cur.execute(CLAIM_OFFSET, {"channel": channel}).fetchall()
+    return rows[0][0] if rows else None
+
+
+def db_reset(con, cur, channel=DB_DEFAULT_CHANNEL):
+    """
+    Reset all 'used' values of a channel to False(0), except those of
+    quotes scheduled for an upcoming date, and commit.
 
     Args:
         con: SQLite connection object.
         cur: SQLite cursor object.
+        channel(str): channel name.
     """
-    cur.execute("UPDATE wisdoms SET used = 0 WHERE used = 1")
+    _reset_state(cur, channel)
     con.commit()
+
+
+def _reset_state(cur, channel):
+    """
+    Helper function for db_reset and the selection helpers:
+    reset the channel's 'used' values without committing. Quotes
+    scheduled for an upcoming date stay used: they are posted on
+    their date, not claimed again in the new cycle.
+
+    Args: see above.
+    """
+    cur.execute(f"UPDATE state SET used = 0 WHERE channel = :channel AND used = 1 "
+                f"AND id_title NOT IN ({PENDING_SCHEDULED})", {"channel": channel})
     logger.info("No more items, database reset")
 
 
-def log_remaining(cur):
+def log_remaining(cur, mode="random", channel=DB_DEFAULT_CHANNEL):
     """
-    Log and return the number of remaining unused quotes.
+    Log and return the number of remaining unused quotes of a channel.
 
     Args:
         cur: SQLite cursor object.
+        mode: selection mode, "random" or "deck".
+        channel(str): channel name.
 
     Returns:
         rem_quotes(int): number of remaining unused quotes.
     """
-    cur.execute("SELECT COUNT(*) FROM wisdoms WHERE used = 0")
-    rem_quotes = cur.fetchone()[0]
-    logger.info("%d items remaining in the database", rem_quotes)
+    if mode == "deck":
+        # Deck positions are contiguous: no need to count the rows.
+        cur.execute("SELECT MAX(pos) - MIN(pos) + 1 FROM deck WHERE channel = ?",
+                    (channel,))
+        rem_quotes = cur.fetchone()[0] or 0
+    else:
+        # Read the trigger-maintained counter.
+        cur.execute("SELECT value FROM state_meta WHERE key = ?",
+                    (f"remaining:{channel}",))
+        rem_quotes = cur.fetchone()[0]
+    logger.info("%d items remaining in the database (%s)", rem_quotes, channel)
     return rem_quotes
 
 
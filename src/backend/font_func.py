@@ -0,0 +1,88 @@
+"""
+font_func.py
+
+Process-wide cache of loaded fonts, shared by every ImagePost.
+
+Part of the "Ancient Wisdom Daily" project by OperaVaria.
+"""
+
+# Imports from built-in modules:
+import logging
+import threading
+from functools import lru_cache
+
+# Imports from external packages:
+from PIL import ImageFont
+
+# Imports from local modules:
+from config.settings import FONT_CACHE_SIZE
+
+# Setup logging.
+logger = logging.getLogger(__name__)
+
+# Serializes loading, so concurrent misses parse a font file only once.
+_font_lock = threading.Lock()
+
+
+def load_font(font_path, size, variant=None):
+    """
+    Return a loaded font from the cache, load it on first use.
+    Falls back to the ImageFont default font (cached as well) with an
+    error message if the font file cannot be loaded.
+
+    Args:
+        font_path: Path or str of the font file.
+        size(int): font size in pixels.
+        variant(str/None): named instance of a variable font, e.g. "Bold".
+
+    Returns:
+        font: FreeTypeFont or ImageFont object, shared: do not modify.
+    """
+    with _font_lock:
+        return _load_font(str(font_path), size, variant)
+
+
+def _open_font(font_path, size, variant):
+    """
+    Helper function for load_font: load a font, uncached.
+
+    Args: see above.
+
+    Returns:
+        font: FreeTypeFont or ImageFont object.
+    """
+    try:
+        font = ImageFont.truetype(font_path, size)
+        if variant is not None:
+            font.set_variation_by_name(variant)
+        logger.debug("Font loaded: %s (%d px)", font_path, size)
+        return font
+    except FileNotFoundError:
+        logger.error("Font file not found. Using default font")
+    except OSError as e:
+        logger.error("Font loading error: %s. Using default font", e)
+    return ImageFont.load_default()
+
+
+# Cached on (path, size, variant), bound without a decorator so the
+# cached function keeps _open_font's signature for static checkers.
+_load_font = lru_cache(maxsize=FONT_CACHE_SIZE)(_open_font)
+
+
+def font_cache_info():
+    """
+    Returns:
+        CacheInfo named tuple: hits, misses, maxsize, currsize.
+    """
+    return _load_font.cache_info()
+
+
+def clear_font_cache():
+    """Drop every cached font and reset the hit/miss counters."""
+    with _font_lock:
+        _load_font.cache_clear()
+
+
+# Print on accidental run:
+if __name__ == "__main__":
+    print("Importable module. Not meant to be run!")
@@ -0,0 +1,351 @@
+"""
+glyph_func.py
+
+Glyph coverage of the fonts: which codepoints their cmap tables map,
+read straight from the font files (nothing is rendered), cached as an
+index next to the fonts, and a corpus check against it that reports
+the characters the images could only draw as boxes.
+
+Part of the "Ancient Wisdom Daily" project by OperaVaria.
+"""
+
+# Imports from built-in modules:
+import json
+import logging
+import re
+import sqlite3
+import struct
+import threading
+from dataclasses import dataclass
+from itertools import islice
+from pathlib import Path
+
+# Imports from local modules:
+from backend.conn_func import db_connection
+from config.path_constants import FONT_COVERAGE_FILE, GENTIUM_BOLD_TTF, GENTIUM_REG_TTF
+
+# Setup logging.
+logger = logging.getLogger(__name__)
+
+# Version of the index file format.
+INDEX_VERSION = 1
+
+# Rows checked together on the fast path.
+CHECK_CHUNK_SIZE = 1024
+
+# Characters never drawn as glyphs: line breaks and tabs.
+LAYOUT_CHARS = frozenset("\n\r\t")
+
+# Loaded coverage sets, per font file {(path, size, mtime): frozenset}.
+_coverage = {}
+_coverage_lock = threading.Lock()
+
+
+@dataclass(frozen=True)
+class GlyphIssue:
+    """Characters of a quote field missing from a font."""
+    id: str
+    field: str
+    chars: str
+
+    @property
+    def codepoints(self):
+        """Codepoints in U+XXXX notation."""
+        return [f"U+{ord(char):04X}" for char in self.chars]
+
+
+def font_coverage(font_path, index_file=FONT_COVERAGE_FILE):
+    """
+    Return the codepoints a font maps to glyphs. Read from the index
+    file if it is current for the font file, otherwise parsed from the
+    font and written to the index.
+
+    Args:
+        font_path: Path or str of a TrueType/OpenType font file.
+        index_file: Path of the coverage index .json file.
+
+    Returns:
+        coverage(frozenset[str]): covered characters.
+
+    Raises:
+        OSError: if the font file cannot be read.
+        ValueError: if the font has no supported Unicode cmap subtable.
+    """
+    font_path = Path(font_path)
+    stat = font_path.stat()
+    memo_key = (str(font_path), stat.st_size, stat.st_mtime_ns)
+    with _coverage_lock:
+        if memo_key in _coverage:
+            return _coverage[memo_key]
+        index = _read_index(index_file)
+        entry = index.get(font_path.name)
+        if entry and (entry["size"], entry["mtime_ns"]) == memo_key[1:]:
+            ranges = entry["ranges"]
+        else:
+            ranges = _ranges(read_cmap(font_path.read_bytes()))
+            index[font_path.name] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns,
+                                     "ranges": ranges}
+            _write_index(index_file, index)
+            logger.info("Glyph coverage indexed: %s (%d ranges)", font_path.name, len(ranges))
+        coverage = frozenset(chr(codepoint) for start, end in ranges
+                             for codepoint in range(start, end + 1))
+        _coverage[memo_key] = coverage
+        return coverage
+
+
+def drawn_fields(reg_font, bold_font):
+    """
+    Map the quote columns drawn on the images to their fonts (see
+    ImagePost.text_blocks). The other columns are posted as text only,
+    in the platforms' own fonts.
+
+    Args:
+        reg_font, bold_font: Path to font files.
+
+    Returns:
+        field_fonts(dict): {column name: (font paths)}.
+    """
+    return {"quote_orig": (bold_font,), "quote_eng": (reg_font,),
+            "attrib_to": (bold_font,), "locus": (bold_font,)}
+
+
+# Fields drawn with the image fonts.
+DRAWN_FIELDS = drawn_fields(GENTIUM_REG_TTF, GENTIUM_BOLD_TTF)
+
+
+def check_rows(rows, field_fonts):
+    """
+    Check quote fields against font coverage in one pass.
+
+    Args:
+        rows: iterable of dicts (or sqlite3.Row objects) keyed by column name.
+        field_fonts(dict): {column name: font files the field must be
+                           drawable with}, see drawn_fields.
+
+    Returns:
+        issues(list[GlyphIssue]): missing characters per field.
+    """
+    patterns = {field: _uncovered_pattern(fonts) for field, fonts in field_fonts.items()}
+    issues = []
+    rows = iter(rows)
+    while chunk := list(islice(rows, CHECK_CHUNK_SIZE)):
+        for field, pattern in patterns.items():
+            # Fast path in C: a whole chunk of the field is covered.
+            if not pattern.search("".join([row[field] or "" for row in chunk])):
+                continue
+            for row in chunk:
+                missing = pattern.findall(row[field] or "")
+                if missing:
+                    issues.append(GlyphIssue(row["id_title"], field,
+                                             "".join(sorted(set(missing)))))
+    return issues
+
+
+def _uncovered_pattern(fonts):
+    """
+    Helper function for check_rows. Compile a regular expression
+    matching the characters missing from any of the fonts.
+
+    Args:
+        fonts(list): font files.
+
+    Returns:
+        pattern: compiled negated character class of the covered ranges.
+    """
+    covered = frozenset.intersection(*(font_coverage(font) for font in fonts)) | LAYOUT_CHARS
+    ranges = _ranges((ord(char), ord(char)) for char in covered)
+    return re.compile("[^" + "".join(
+        re.escape(chr(start)) if start == end else f"{re.escape(chr(start))}-{re.escape(chr(end))}"
+        for start, end in ranges) + "]")
+
+
+def check_corpus(db_file, field_fonts=None):
+    """
+    Check every quote of the database against font coverage.
+
+    Args:
+        db_file: Path to database file.
+        field_fonts(dict): see check_rows, None for the image fonts.
+
+    Returns:
+        issues(list[GlyphIssue]): missing characters per field.
+
+    Raises:
+        sqlite3.Error: if there is a database-related error.
+    """
+    field_fonts = field_fonts or DRAWN_FIELDS
+    with db_connection(db_file, role="read") as con:
+        cur = con.cursor()
+        cur.row_factory = sqlite3.Row
+        cur.execute(f"SELECT id_title, {', '.join(field_fonts)} FROM wisdoms")
+        return check_rows(cur, field_fonts)
+
+
+def log_issues(issues):
+    """
+    Log glyph issues, one warning per field.
+
+    Args:
+        issues(list[GlyphIssue]): check_rows result.
+    """
+    for issue in issues:
+        logger.warning("Glyphs missing from the fonts: %s, %s: %s", issue.id,
+                       issue.field, " ".join(issue.codepoints))
+
+
+def read_cmap(data):
+    """
+    Parse the Unicode cmap subtable of a TrueType/OpenType font
+    (format 12 preferred, else format 4).
+
+    Args:
+        data(bytes): font file contents.
+
+    Returns:
+        segments(list[tuple]): (start, end) codepoint ranges mapped to
+                               a glyph other than .notdef.
+
+    Raises:
+        ValueError: if there is no cmap table or supported subtable.
+    """
+    num_tables = struct.unpack_from(">H", data, 4)[0]
+    cmap_offset = None
+    for record in range(num_tables):
+        tag, _, offset, _ = struct.unpack_from(">4sIII", data, 12 + 16 * record)
+        if tag == b"cmap":
+            cmap_offset = offset
+    if cmap_offset is None:
+        raise ValueError("Font has no cmap table")
+    subtables = {}
+    for record in range(struct.unpack_from(">H", data, cmap_offset + 2)[0]):
+        platform_id, encoding_id, offset = struct.unpack_from(
+            ">HHI", data, cmap_offset + 4 + 8 * record)
+        subtable = cmap_offset + offset
+        subtables[(platform_id, encoding_id, struct.unpack_from(">H", data, subtable)[0])] \
+            = subtable
+    for key in ((3, 10, 12), (0, 4, 12), (0, 6, 12)):
+        if key in subtables:
+            return _format_12(data, subtables[key])
+    for key in ((3, 1, 4), (0, 3, 4), (0, 1, 4), (0, 0, 4)):
+        if key in subtables:
+            return _format_4(data, subtables[key])
+    raise ValueError("Font has no supported Unicode cmap subtable")
+
+
+def _format_12(data, offset):
+    """
+    Helper function for read_cmap. Segmented coverage subtable.
+
+    Args:
+        data(bytes): font file contents.
+        offset(int): subtable offset.
+
+    Returns:
+        segments(list[tuple]): (start, end) codepoint ranges.
+    """
+    num_groups = struct.unpack_from(">I", data, offset + 12)[0]
+    segments = []
+    for group in range(num_groups):
+        start, end, glyph = struct.unpack_from(">III", data, offset + 16 + 12 * group)
+        if glyph == 0:
+            # Only the first codepoint maps to .notdef.
+            start += 1
+        if start <= end:
+            segments.append((start, end))
+    return segments
+
+
+def _format_4(data, offset):
+    """
+    Helper function for read_cmap. BMP segment mapping subtable:
+    segments are checked codepoint by codepoint for .notdef mappings.
+
+    Args:
+        data(bytes): font file contents.
+        offset(int): subtable offset.
+
+    Returns:
+        segments(list[tuple]): (start, end) codepoint ranges.
+    """
+    seg_count = struct.unpack_from(">H", data, offset + 6)[0] // 2
+    ends = struct.unpack_from(f">{seg_count}H", data, offset + 14)
+    starts_at = offset + 16 + 2 * seg_count
+    starts = struct.unpack_from(f">{seg_count}H", data, starts_at)
+    deltas = struct.unpack_from(f">{seg_count}h", data, starts_at + 2 * seg_count)
+    range_offsets_at = starts_at + 4 * seg_count
+    range_offsets = struct.unpack_from(f">{seg_count}H", data, range_offsets_at)
+    codepoints = []
+    for seg, (start, end) in enumerate(zip(starts, ends)):
+        if start == 0xFFFF:
+            continue
+        for codepoint in range(start, end + 1):
+            if range_offsets[seg] == 0:
+                glyph = (codepoint + deltas[seg]) & 0xFFFF
+            else:
+                glyph_at = (range_offsets_at + 2 * seg + range_offsets[seg]
+                            + 2 * (codepoint - start))
+                glyph = struct.unpack_from(">H", data, glyph_at)[0]
+                if glyph:
+                    glyph = (glyph + deltas[seg]) & 0xFFFF
+            if glyph:
+                codepoints.append(codepoint)
+    return _ranges([(codepoint, codepoint) for codepoint in codepoints])
+
+
+def _ranges(segments):
+    """
+    Helper function. Merge codepoint ranges.
+
+    Args:
+        segments(list[tuple]): (start, end) ranges.
+
+    Returns:
+        ranges(list[list]): sorted, merged [start, end] ranges.
+    """
+    ranges = []
+    for start, end in sorted(segments):
+        if ranges and start <= ranges[-1][1] + 1:
+            ranges[-1][1] = max(ranges[-1][1], end)
+        else:
+            ranges.append([start, end])
+    return ranges
+
+
+def _read_index(index_file):
+    """
+    Helper function for font_coverage.
+
+    Args:
+        index_file: Path of the index file.
+
+    Returns:
+        index(dict): {font file name: entry}, empty if missing or outdated.
+    """
+    try:
+        index = json.loads(Path(index_file).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+    if index.get("version") != INDEX_VERSION:
+        return {}
+    return index.get("fonts", {})
+
+
+def _write_index(index_file, index):
+    """
+    Helper function for font_coverage. Failing to write only costs a
+    re-parse next time.
+
+    Args:
+        index_file: Path of the index file.
+        index(dict): {font file name: entry}.
+    """
+    try:
+        Path(index_file).write_text(
+            json.dumps({"version": INDEX_VERSION, "fonts": index}), encoding="utf-8")
+    except OSError as e:
+        logger.error("Failed to write glyph coverage index: %s", e)
+
+
+# Print on accidental run:
+if __name__ == "__main__":
+    print("Importable module. Not meant to be run!")
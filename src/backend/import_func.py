@@ -0,0 +1,191 @@
+"""
+import_func.py
+
+Functions for importing quotes from .csv and .json files into the database.
+
+Part of the "Ancient Wisdom Daily" project by OperaVaria.
+"""
+
+# Imports from built-in modules:
+import csv
+import json
+import logging
+from itertools import islice
+from pathlib import Path
+from time import perf_counter
+
+# Imports from local modules:
+from backend.conn_func import db_transaction
+from backend.db_func import init_corpus
+from backend.glyph_func import DRAWN_FIELDS, check_rows, log_issues
+from backend.search_func import init_search
+from config.settings import IMPORT_BATCH_SIZE, IMPORT_CHUNK_SIZE
+
+# Setup logging.
+logger = logging.getLogger(__name__)
+
+# Quote content columns, in table order ("used" is state, never imported).
+COLUMNS = ("id_title", "quote_orig", "quote_eng", "attrib_to",
+           "locus", "locus_form", "comment")
+
+# Upsert on id_title: new rows start unused, existing rows keep their
+# "used" value and are only written when their content changed.
+UPSERT = (
+    f"INSERT INTO wisdoms ({', '.join(COLUMNS)}, used) "
+    f"VALUES ({', '.join('?' * len(COLUMNS))}, 0) "
+    f"ON CONFLICT(id_title) DO UPDATE SET "
+    f"{', '.join(f'{col} = excluded.{col}' for col in COLUMNS[1:])} "
+    f"WHERE ({', '.join(COLUMNS[1:])}) IS NOT "
+    f"({', '.join(f'excluded.{col}' for col in COLUMNS[1:])})"
+)
+
+
+def import_file(db_file, src_file, batch_size=IMPORT_BATCH_SIZE, field_fonts=None):
+    """
+    Import a .csv or .json quote file into the database.
+
+    Args:
+        db_file: Path to database file.
+        src_file: Path to the .csv or .json file.
+        batch_size(int): rows per transaction.
+        field_fonts(dict): glyph coverage to check (see import_rows).
+
+    Returns:
+        row_count(int): number of rows read from the file.
+
+    Raises:
+        ValueError: if the file type is not supported or the file is malformed.
+        sqlite3.Error: if there is a database-related error.
+    """
+    suffix = Path(src_file).suffix.lower()
+    if suffix == ".csv":
+        rows = iter_csv(src_file)
+    elif suffix == ".json":
+        rows = iter_json(src_file)
+    else:
+        raise ValueError(f"Unsupported import file type: {suffix}")
+    return import_rows(db_file, rows, batch_size, field_fonts)
+
+
+def import_rows(db_file, rows, batch_size=IMPORT_BATCH_SIZE, field_fonts=None):
+    """
+    Upsert quote rows into the database, one transaction per batch,
+    bumping the corpus version when new quotes are added, then build
+    the search index if missing (the triggers keep an existing one in
+    sync). Characters the image fonts cannot draw are
+    reported as warnings on the way (see glyph_func).
+
+    Args:
+        db_file: Path to database file.
+        rows: iterable of dicts keyed by column name.
+        batch_size(int): rows per transaction.
+        field_fonts(dict): {column name: font files} to check glyph
+                           coverage against, None for the image fonts,
+                           empty to skip the check.
+
+    Returns:
+        row_count(int): number of rows imported.
+    """
+    start = perf_counter()
+    row_count = 0
+    field_fonts = DRAWN_FIELDS if field_fonts is None else field_fonts
+    issues = []
+    rows = iter(rows)
+    # Version stamp triggers first: new ids bump it, so every channel
+    # picks them up on its next run.
+    with db_transaction(db_file, role="corpus") as cur:
+        init_corpus(cur)
+    while batch := list(islice(rows, batch_size)):
+        if field_fonts:
+            issues.extend(check_rows(batch, field_fonts))
+        with db_transaction(db_file, role="corpus") as cur:
+            cur.executemany(UPSERT, [tuple(row[col] for col in COLUMNS) for row in batch])
+        row_count += len(batch)
+        logger.debug("%d rows imported", row_count)
+    log_issues(issues)
+    # Have the search index ready before the corpus is shared read-only.
+    with db_transaction(db_file, role="corpus") as cur:
+        init_search(cur)
+    elapsed = perf_counter() - start
+    logger.info("Imported %d rows in %.2f s (%.0f rows/s)", row_count,
+                elapsed, row_count / elapsed if elapsed else 0)
+    return row_count
+
+
+def iter_csv(csv_file):
+    """
+    Stream rows from a .csv file with a header line.
+
+    Args:
+        csv_file: Path to the .csv file.
+
+    Yields:
+        row(dict): one quote per row.
+    """
+    with open(csv_file, "r", encoding="utf-8", newline="") as file:
+        yield from csv.DictReader(file)
+
+
+def iter_json(json_file, chunk_size=IMPORT_CHUNK_SIZE):
+    """
+    Stream objects from a .json file holding an array of quote objects,
+    reading the file in chunks instead of loading it whole.
+
+    Args:
+        json_file: Path to the .json file.
+        chunk_size(int): characters read per chunk.
+
+    Yields:
+        row(dict): one quote per array item.
+
+    Raises:
+        ValueError: if the file is not a JSON array, is malformed or is
+                    truncated, with the byte offset of the error.
+    """
+    decoder = json.JSONDecoder()
+    with open(json_file, "r", encoding="utf-8") as file:
+        buffer = ""
+        # Bytes of the file before the buffer.
+        offset = 0
+        in_array = False
+        while True:
+            chunk = file.read(chunk_size)
+            buffer += chunk
+            pos = 0
+            while True:
+                # Skip whitespace and separators between items.
+                while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+                    pos += 1
+                if pos == len(buffer):
+                    break
+                if not in_array:
+                    if buffer[pos] != "[":
+                        raise ValueError("JSON import file must hold an array")
+                    in_array = True
+                    pos += 1
+                    continue
+                if buffer[pos] == "]":
+                    return
+                # Decode one item, read more if it may be incomplete: an
+                # error over a chunk before the buffer end (other than an
+                # unterminated, possibly long, string) is not a truncation.
+                try:
+                    row, pos = decoder.raw_decode(buffer, pos)
+                except json.JSONDecodeError as e:
+                    if (len(buffer) - e.pos > chunk_size
+                            and not e.msg.startswith("Unterminated string")):
+                        error_at = offset + len(buffer[:e.pos].encode("utf-8"))
+                        raise ValueError(f"JSON import file is malformed at byte "
+                                         f"{error_at}: {e.msg}") from e
+                    break
+                yield row
+            offset += len(buffer[:pos].encode("utf-8"))
+            buffer = buffer[pos:]
+            if not chunk:
+                raise ValueError(f"JSON import file is truncated or malformed "
+                                 f"at byte {offset}")
+
+
+# Print on accidental run:
+if __name__ == "__main__":
+    print("Importable module. Not meant to be run!")
@@ -0,0 +1,265 @@
+"""
+layout_func.py
+
+Pixel-based text layout for quote images: wraps by measured advance
+widths, finds the largest font size that fits by binary search and
+stacks the text blocks vertically centered.
+
+Part of the "Ancient Wisdom Daily" project by OperaVaria.
+"""
+
+# Imports from built-in modules:
+import logging
+from dataclasses import dataclass
+from weakref import WeakKeyDictionary
+
+# Imports from local modules:
+from backend.font_func import load_font
+from config.settings import LAYOUT_GAP, LAYOUT_MARGIN, LAYOUT_SIZE_RANGE
+
+# Setup logging.
+logger = logging.getLogger(__name__)
+
+# Memoized word widths per font object {font: {word: width}}.
+_width_tables = WeakKeyDictionary()
+
+
+@dataclass(frozen=True)
+class TextBlock:
+    """A paragraph group drawn with one font, sized relative to the base size."""
+    text: str
+    font_path: str
+    scale: float = 1.0
+
+
+@dataclass(frozen=True)
+class PlacedLine:
+    """A laid out line: top center anchor position, text and font."""
+    x: float
+    y: float
+    text: str
+    font: object
+
+
+def fit_layout(blocks, canvas_size, size_range=LAYOUT_SIZE_RANGE,
+               margin=LAYOUT_MARGIN, gap=LAYOUT_GAP):
+    """
+    Lay out text blocks on a canvas at the largest base font size
+    (binary search over size_range) at which all of them fit.
+
+    Args:
+        blocks(list[TextBlock]): blocks, top to bottom.
+        canvas_size(tuple): (width, height) in pixels.
+        size_range(tuple): smallest and largest base font size.
+        margin(float): margin as a fraction of the canvas width.
+        gap(float): space between blocks as a fraction of the base size.
+
+    Returns:
+        size(int), lines(list[PlacedLine]): base font size and lines to draw.
+    """
+    width, height = canvas_size
+    max_width = width * (1 - 2 * margin)
+    max_height = height - 2 * width * margin
+    low, high = size_range
+    best = None
+    while low <= high:
+        size = (low + high) // 2
+        wrapped = _wrap_blocks(blocks, size, max_width)
+        if wrapped is not None and _stack_height(wrapped, size, gap) <= max_height:
+            best = (size, wrapped)
+            low = size + 1
+        else:
+            high = size - 1
+    if best is None:
+        size = size_range[0]
+        logger.warning("Text does not fit the image, laid out at size %d", size)
+        best = (size, _wrap_blocks(blocks, size, max_width, force=True))
+    size, wrapped = best
+    return size, _place(wrapped, size, gap, canvas_size)
+
+
+def text_width(font, text):
+    """
+    Width of a single-line text in pixels: memoized word widths plus
+    spaces (kerning across spaces is ignored).
+
+    Args:
+        font: FreeTypeFont or ImageFont object.
+        text(str): text without line breaks.
+
+    Returns:
+        width(float): advance width.
+    """
+    table = _width_table(font)
+    words = text.split(" ")
+    return sum(_word_width(font, table, word) for word in words) \
+        + (len(words) - 1) * _word_width(font, table, " ")
+
+
+def line_height(font):
+    """
+    Args:
+        font: FreeTypeFont or ImageFont object.
+
+    Returns:
+        height(int): distance between two baselines.
+    """
+    if hasattr(font, "getmetrics"):
+        ascent, descent = font.getmetrics()
+        return ascent + descent
+    _, top, _, bottom = font.getbbox("Ág")
+    return bottom - top
+
+
+def _width_table(font):
+    """
+    Helper function. Return the memoized word width table of a font.
+
+    Args:
+        font: FreeTypeFont or ImageFont object.
+
+    Returns:
+        table(dict): {word: width}.
+    """
+    table = _width_tables.get(font)
+    if table is None:
+        table = _width_tables[font] = {}
+    return table
+
+
+def _word_width(font, table, word):
+    """
+    Helper function. Width of a word, measured once per font.
+
+    Args:
+        font: font object.
+        table(dict): the font's width table.
+        word(str): word.
+
+    Returns:
+        width(float): advance width.
+    """
+    width = table.get(word)
+    if width is None:
+        width = table[word] = font.getlength(word)
+    return width
+
+
+def _wrap_blocks(blocks, size, max_width, force=False):
+    """
+    Helper function for fit_layout. Wrap every block at a base size.
+
+    Args:
+        blocks(list[TextBlock]): blocks.
+        size(int): base font size.
+        max_width(float): line width limit in pixels.
+        force(bool): break words wider than a line instead of failing.
+
+    Returns:
+        wrapped(list[tuple])/None: (font, lines) per block, None if a word
+                                   does not fit on a line.
+    """
+    wrapped = []
+    for block in blocks:
+        font = load_font(block.font_path, max(1, round(size * block.scale)))
+        lines = []
+        for paragraph in block.text.split("\n"):
+            paragraph_lines = _wrap(font, paragraph.strip(), max_width, force)
+            if paragraph_lines is None:
+                return None
+            lines.extend(paragraph_lines)
+        wrapped.append((font, lines))
+    return wrapped
+
+
+def _wrap(font, text, max_width, force):
+    """
+    Helper function for _wrap_blocks. Greedy wrap of a paragraph by
+    measured width.
+
+    Args: see above.
+
+    Returns:
+        lines(list[str])/None: wrapped lines, None if a word is too wide.
+    """
+    table = _width_table(font)
+    space = _word_width(font, table, " ")
+    lines, line, line_width = [], [], 0.0
+    for word in text.split():
+        width = _word_width(font, table, word)
+        if width > max_width:
+            if not force:
+                return None
+            # Break an overlong word by characters.
+            if line:
+                lines.append(" ".join(line))
+            pieces = _break_word(font, table, word, max_width)
+            lines.extend(pieces[:-1])
+            line, line_width = [pieces[-1]], _word_width(font, table, pieces[-1])
+            continue
+        if line and line_width + space + width > max_width:
+            lines.append(" ".join(line))
+            line, line_width = [], 0.0
+        line_width += (space if line else 0.0) + width
+        line.append(word)
+    lines.append(" ".join(line))
+    return lines
+
+
+def _break_word(font, table, word, max_width):
+    """
+    Helper function for _wrap. Split a word into pieces that fit a line.
+
+    Args: see above.
+
+    Returns:
+        pieces(list[str]): word pieces.
+    """
+    pieces, piece = [], ""
+    for char in word:
+        if piece and _word_width(font, table, piece + char) > max_width:
+            pieces.append(piece)
+            piece = ""
+        piece += char
+    pieces.append(piece)
+    return pieces
+
+
+def _stack_height(wrapped, size, gap):
+    """
+    Helper function for fit_layout. Total height of the stacked blocks.
+
+    Args: see above.
+
+    Returns:
+        height(float): pixels.
+    """
+    lines_height = sum(line_height(font) * len(lines) for font, lines in wrapped)
+    return lines_height + gap * size * (len(wrapped) - 1)
+
+
+def _place(wrapped, size, gap, canvas_size):
+    """
+    Helper function for fit_layout. Position the lines: blocks stacked
+    and vertically centered, lines horizontally centered.
+
+    Args: see above.
+
+    Returns:
+        lines(list[PlacedLine]): lines to draw with anchor "ma".
+    """
+    width, height = canvas_size
+    y = (height - _stack_height(wrapped, size, gap)) / 2
+    placed = []
+    for font, lines in wrapped:
+        step = line_height(font)
+        for text in lines:
+            placed.append(PlacedLine(width / 2, y, text, font))
+            y += step
+        y += gap * size
+    return placed
+
+
+# Print on accidental run:
+if __name__ == "__main__":
+    print("Importable module. Not meant to be run!")
@@ -0,0 +1,170 @@
+"""
+length_func.py
+
+Local post length checks by each platform's own counting rules, so the
+posting mode (text or image) is chosen before any request:
+    bluesky: grapheme clusters (and UTF-8 bytes);
+    mastodon: grapheme clusters, links as 23, remote mentions without
+              their domain;
+    x: weighted code points (twitter-text v3: Latin, Greek, Cyrillic,
+       punctuation 1, everything else 2, emoji sequences 2), links as 23.
+
+Grapheme clusters follow Unicode UAX #29 for what the posts contain
+(combining marks, emoji sequences, flags), without the Hangul and
+Indic conjunct rules.
+
+Part of the "Ancient Wisdom Daily" project by OperaVaria.
+"""
+
+# Imports from built-in modules:
+import re
+import unicodedata
+
+# Imports from local modules:
+from config.settings import TEXT_LIMITS
+
+# Links, counted at a fixed length by Mastodon and X.
+URL_PATTERN = re.compile(r"https?://\S+")
+URL_LENGTH = 23
+
+# Remote Mastodon mentions (@user@domain), counted as @user.
+MENTION_PATTERN = re.compile(r"(@\w+)@[\w.-]+\w")
+
+# Bluesky's byte limit besides the grapheme limit.
+BLUESKY_MAX_BYTES = 3000
+
+# X code point ranges of weight 1, others weigh 2.
+X_LIGHT_RANGES = ((0x0000, 0x10FF), (0x2000, 0x200D), (0x2010, 0x201F), (0x2032, 0x2037))
+
+# Characters that never start a grapheme cluster.
+ZWJ = "\u200d"
+EXTEND_CATEGORIES = frozenset(("Mn", "Me", "Mc"))
+
+
+def text_length(platform, text):
+    """
+    Length of a text as the platform counts it.
+
+    Args:
+        platform(str): "bluesky", "mastodon" or "x".
+        text(str): post text.
+
+    Returns:
+        length(int): in the platform's units.
+
+    Raises:
+        ValueError: on an unknown platform.
+    """
+    if platform == "bluesky":
+        return sum(1 for _ in graphemes(text))
+    if platform == "mastodon":
+        text = MENTION_PATTERN.sub(r"\1", URL_PATTERN.sub("x" * URL_LENGTH, text))
+        return sum(1 for _ in graphemes(text))
+    if platform == "x":
+        text = unicodedata.normalize("NFC", text)
+        urls = len(URL_PATTERN.findall(text))
+        return urls * URL_LENGTH + sum(_x_weight(cluster) for cluster
+                                       in graphemes(URL_PATTERN.sub("", text)))
+    raise ValueError(f"No length rules for platform: {platform}")
+
+
+def fits(platform, text):
+    """
+    Check a text against the platform's limit (TEXT_LIMITS).
+
+    Args:
+        platform(str): see text_length.
+        text(str): post text.
+
+    Returns:
+        True if the platform accepts the text as a text post.
+    """
+    if platform == "bluesky" and len(text.encode("utf-8")) > BLUESKY_MAX_BYTES:
+        return False
+    return text_length(platform, text) <= TEXT_LIMITS[platform]
+
+
+def graphemes(text):
+    """
+    Split a text into grapheme clusters (user-perceived characters).
+
+    Args:
+        text(str): any text.
+
+    Yields:
+        cluster(str): a base character with its combining marks, or an
+                      emoji (ZWJ, modifier, flag) sequence.
+    """
+    cluster = ""
+    regional = 0
+    for char in text:
+        if cluster and _continues(cluster[-1], char, regional):
+            cluster += char
+        else:
+            if cluster:
+                yield cluster
+            cluster = char
+            regional = 0
+        if _is_regional(char):
+            regional += 1
+    if cluster:
+        yield cluster
+
+
+def _continues(prev, char, regional):
+    """
+    Helper function for graphemes: is there no cluster boundary
+    between two characters?
+
+    Args:
+        prev, char(str): consecutive characters.
+        regional(int): regional indicators in the cluster so far.
+
+    Returns:
+        True if char belongs to the cluster of prev.
+    """
+    if prev == "\r":
+        return char == "\n"
+    if ZWJ in (prev, char):
+        return True
+    if _is_regional(char):
+        # Flags: regional indicators pair up.
+        return regional % 2 == 1 and _is_regional(prev)
+    codepoint = ord(char)
+    return (unicodedata.category(char) in EXTEND_CATEGORIES
+            # Variation selectors.
+            or 0xFE00 <= codepoint <= 0xFE0F
+            or _is_emoji_component(char))
+
+
+def _is_regional(char):
+    """Helper function: regional indicator symbol (flag halves)."""
+    return 0x1F1E6 <= ord(char) <= 0x1F1FF
+
+
+def _is_emoji_component(char):
+    """Helper function: skin tone modifier or tag sequence character."""
+    codepoint = ord(char)
+    return 0x1F3FB <= codepoint <= 0x1F3FF or 0xE0020 <= codepoint <= 0xE007F
+
+
+def _x_weight(cluster):
+    """
+    Helper function for text_length: weight of a grapheme cluster on X.
+
+    Args:
+        cluster(str): grapheme cluster.
+
+    Returns:
+        weight(int): 2 for emoji, else the sum of the code point weights.
+    """
+    if len(cluster) > 1 and any(char in (ZWJ, "\ufe0f") or _is_regional(char)
+                                or _is_emoji_component(char) for char in cluster):
+        return 2
+    return sum(1 if any(start <= ord(char) <= end for start, end in X_LIGHT_RANGES) else 2
+               for char in cluster)
+
+
+# Print on accidental run:
+if __name__ == "__main__":
+    print("Importable module. Not meant to be run!")
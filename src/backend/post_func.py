@@ -19,13 +19,15 @@ from tweepy.errors import BadRequest, Forbidden
 # Local imports:
 from backend.db_func import db_get
 from backend.classes import TextPost, ImagePost
+from config.settings import DB_DEFAULT_CHANNEL
 
 # Setup logging:
 logger = logging.getLogger(__name__)
 
 
 def assemble_posts(db_file, image_size, bg_color, text_color,
-                   reg_font, bold_font):
+                   reg_font, bold_font, state_file=None,
+                   channel=DB_DEFAULT_CHANNEL, sampler=None, render_cache=None):
     """
     Function to assemble posts from Wisdom object data.
 
@@ -34,6 +36,10 @@ def assemble_posts(db_file, image_size, bg_color, text_color,
         image_size: image resolution in format tuple(x, y).
         bg_color, text_color: color information in format tuple(r, g, b)
         reg_font, bold_font: Path to font files.
+        state_file: Path to separate state database file or None.
+        channel(str): channel (bot account) the posts are for.
+        sampler: quote sampler object or None for uniform selection.
+        render_cache: RenderCache object or None to always draw the image.
 
     Returns:
         image_post: ImagePost object.
@@ -44,14 +50,15 @@ def assemble_posts(db_file, image_size, bg_color, text_color,
     """
     try:
         # Get Wisdom object.
-        wis_obj = db_get(db_file)
+        wis_obj = db_get(db_file, state_file=state_file,
+                         channel=channel, sampler=sampler)
         # Log selected quote.
         logger.info("Quote selected: %s", wis_obj.id)
         # Create instances.
         text_post = TextPost(wis_obj)
         image_post = ImagePost(wis_obj, image_size,
                                bg_color, text_color,
-                               reg_font, bold_font)
+                               reg_font, bold_font, render_cache)
         return text_post, image_post
     except RuntimeError as e:
         logger.error("Failed to assemble posts: %s", e)
@@ -60,8 +67,8 @@ def assemble_posts(db_file, image_size, bg_color, text_color,
 
 def bluesky_post(bs_cl, image_post, text_post):
     """
-    Post to Bluesky, if rejected (due to character length), try posting
-    as image.
+    Post to Bluesky as text if it fits the length limit, else (or if
+    rejected) as image.
 
     Args:
         bs_cl: authenticated Bluesky client object.
@@ -74,22 +81,60 @@ def bluesky_post(bs_cl, image_post, text_post):
     Raises:
         RequestException: if post request fails.
     """
+    if text_post.fits("bluesky"):
+        try:
+            # Attempt to post text.
+            bs_res = bs_cl.send_post(text=text_post.full_text)
+            return bs_res
+        except BadRequestError:
+            logger.info("Text posting to Bluesky failed. Falling back to image post")
+    else:
+        logger.info("Text too long for Bluesky. Posting image")
     try:
-        # Attempt to post text.
-        bs_res = bs_cl.send_post(text=text_post.full_text)
+        bs_res = bs_cl.send_image(text=text_post.comment_text,
+                                  image=image_post.open_bin("bluesky"),
+                                  image_alt=text_post.accessibility_text)
         return bs_res
-    except BadRequestError:
+    except RequestException as e:
+        # Image fail: raise error.
+        logger.error("Image posting to Bluesky failed: %s", e)
+        raise
+
+
+async def bluesky_post_async(bs_cl, image_post, text_post):
+    """
+    Post to Bluesky with the asynchronous client, as text if it fits
+    the length limit, else (or if rejected) as image.
+
+    Args:
+        bs_cl: authenticated Bluesky AsyncClient object.
+        image_post: ImagePost object.
+        text_post: TextPost object.
+
+    Returns:
+        bs_res: request response object.
+
+    Raises:
+        RequestException: if post request fails.
+    """
+    if text_post.fits("bluesky"):
         try:
-            # Fall back to image.
-            logger.info("Text posting to Bluesky failed. Falling back to image post")
-            bs_res = bs_cl.send_image(text=text_post.comment_text,
-                                      image=image_post.open_bin(),
-                                      image_alt=text_post.accessibility_text)
+            # Attempt to post text.
+            bs_res = await bs_cl.send_post(text=text_post.full_text)
             return bs_res
-        except RequestException as e:
-            # Image fail: raise error.
-            logger.error("Image posting to Bluesky failed: %s", e)
-            raise
+        except BadRequestError:
+            logger.info("Text posting to Bluesky failed. Falling back to image post")
+    else:
+        logger.info("Text too long for Bluesky. Posting image")
+    try:
+        bs_res = await bs_cl.send_image(text=text_post.comment_text,
+                                        image=image_post.open_bin("bluesky"),
+                                        image_alt=text_post.accessibility_text)
+        return bs_res
+    except RequestException as e:
+        # Image fail: raise error.
+        logger.error("Image posting to Bluesky failed: %s", e)
+        raise
 
 
 def insta_post(in_cl, image_post, text_post):
@@ -109,7 +154,7 @@ def insta_post(in_cl, image_post, text_post):
     """
     try:
         in_res = in_cl.photo_upload(
-            path=image_post.path,
+            path=image_post.file_path("instagram"),
             caption=text_post.comment_text,
             extra_data={"custom_accessibility_caption": text_post.accessibility_text},
         )
@@ -121,8 +166,8 @@ def insta_post(in_cl, image_post, text_post):
 
 def mastodon_post(mt_api, image_post, text_post):
     """
-    Post text to Mastodon, if rejected (due to character length), try posting
-    as image.
+    Post text to Mastodon if it fits the length limit, else (or if
+    rejected) post as image.
 
     Args:
         mt_api: authenticated Mastodon API object.
@@ -135,31 +180,34 @@ def mastodon_post(mt_api, image_post, text_post):
     Raises:
         MastodonAPIError: if image post fallback fails.
     """
-    try:
-        # Attempt to post text.
-        mt_res = mt_api.status_post(status=text_post.full_text,
-                                  visibility="public")
-        return mt_res
-    except MastodonAPIError:
+    if text_post.fits("mastodon"):
         try:
-            # Fall back to image.
-            logger.info("Text posting to X failed. Falling back to image post")
-            media = mt_api.media_post(media_file=image_post.path,
-                                    description=text_post.accessibility_text)
+            # Attempt to post text.
             mt_res = mt_api.status_post(status=text_post.full_text,
-                                        media_ids=[media["id"]],
                                         visibility="public")
             return mt_res
-        except MastodonAPIError as e:
-            # Image fail: raise error.
-            logger.error("Image posting to Mastodon failed: %s", e)
-            raise
+        except MastodonAPIError:
+            logger.info("Text posting to Mastodon failed. Falling back to image post")
+    else:
+        logger.info("Text too long for Mastodon. Posting image")
+    try:
+        media = mt_api.media_post(media_file=image_post.open_stream("mastodon"),
+                                  mime_type=image_post.media("mastodon").mime_type,
+                                  description=text_post.accessibility_text)
+        mt_res = mt_api.status_post(status=text_post.comment_text,
+                                    media_ids=[media["id"]],
+                                    visibility="public")
+        return mt_res
+    except MastodonAPIError as e:
+        # Image fail: raise error.
+        logger.error("Image posting to Mastodon failed: %s", e)
+        raise
 
 
 def x_post(x_api, x_cl, image_post, text_post):
     """
-    Post text to X, if rejected (due to character length), try posting
-    as image.
+    Post text to X if it fits the length limit, else (or if rejected)
+    post as image.
 
     Args:
         x_api, x_cl: authenticated X Client and API objects.        
@@ -172,23 +220,26 @@ def x_post(x_api, x_cl, image_post, text_post):
     Raises:
         BadRequest: if image post fallback fails.
     """
-    try:
-        # Attempt to post text.
-        x_res = x_cl.create_tweet(text=text_post.full_text)
-        return x_res
-    except Forbidden:
+    if text_post.fits("x"):
         try:
-            # Fall back to image.
-            logger.info("Text posting to X failed. Falling back to image post")
-            media = x_api.media_upload(filename=image_post.path,
-                                       media_category="tweet_image")
-            x_res = x_cl.create_tweet(text=text_post.comment_text,
-                                      media_ids=[media.media_id])
+            # Attempt to post text.
+            x_res = x_cl.create_tweet(text=text_post.full_text)
             return x_res
-        except BadRequest as e:
-            # Image fail: raise error.
-            logger.error("Image posting to X failed: %s", e)
-            raise
+        except Forbidden:
+            logger.info("Text posting to X failed. Falling back to image post")
+    else:
+        logger.info("Text too long for X. Posting image")
+    try:
+        media = x_api.media_upload(filename=f"post{image_post.media('x').extension}",
+                                   file=image_post.open_stream("x"),
+                                   media_category="tweet_image")
+        x_res = x_cl.create_tweet(text=text_post.comment_text,
+                                  media_ids=[media.media_id])
+        return x_res
+    except BadRequest as e:
+        # Image fail: raise error.
+        logger.error("Image posting to X failed: %s", e)
+        raise
 
 
 # Print on accidental run:
@@ -0,0 +1,159 @@
+"""
+procedural_func.py
+
+Procedural quote image backgrounds: linear and radial gradients,
+parchment texture and film grain. Computed as NumPy array math and
+Pillow operations (no per-pixel Python loops), seeded, so they are
+deterministic.
+
+Part of the "Ancient Wisdom Daily" project by OperaVaria.
+"""
+
+# Imports from built-in modules:
+import logging
+from functools import lru_cache
+from hashlib import sha256
+
+# Imports from external packages:
+import numpy as np
+from PIL import Image, ImageChops
+
+# Setup logging.
+logger = logging.getLogger(__name__)
+
+# Parchment noise octaves: (grid cell size as a fraction of the
+# shorter side, weight in percent).
+PARCHMENT_OCTAVES = ((0.25, 50), (0.08, 30), (0.02, 20))
+
+
+def seed_from(text):
+    """
+    Derive a random seed from a text, e.g. a quote id: stable across
+    runs and processes, unlike hash().
+
+    Args:
+        text(str): seed text.
+
+    Returns:
+        seed(int): 64-bit seed.
+    """
+    return int.from_bytes(sha256(text.encode("utf-8")).digest()[:8], "big")
+
+
+def gradient(size, inner_color, outer_color, pattern="linear", angle=90.0):
+    """
+    Create a gradient image.
+
+    Args:
+        size(tuple): (width, height) in pixels.
+        inner_color(tuple): (r, g, b) at the start (linear) or center (radial).
+        outer_color(tuple): (r, g, b) at the end (linear) or corners (radial).
+        pattern(str): "linear" or "radial".
+        angle(float): direction of a linear gradient in degrees, 90 is downward.
+
+    Returns:
+        RGB PIL Image object.
+
+    Raises:
+        ValueError: if the pattern is unknown.
+    """
+    width, height = size
+    # Coordinates from -1 to 1: a row and a column, broadcast together.
+    x = np.linspace(-1, 1, width, dtype=np.float32)[np.newaxis, :]
+    y = np.linspace(-1, 1, height, dtype=np.float32)[:, np.newaxis]
+    if pattern == "linear":
+        theta = np.deg2rad(angle)
+        # Projection on the direction, scaled to 0-1 over the canvas.
+        extent = 2 * (abs(np.cos(theta)) + abs(np.sin(theta)))
+        ramp = x * np.float32(np.cos(theta) / extent) \
+            + (y * np.float32(np.sin(theta) / extent) + np.float32(0.5))
+    elif pattern == "radial":
+        ramp = np.sqrt(x * x + y * y) * np.float32(1 / np.sqrt(2))
+    else:
+        raise ValueError(f"Unknown gradient pattern: {pattern}")
+    # Quantize to 256 steps and map them through a color palette.
+    steps = np.clip(ramp * 255 + 0.5, 0, 255).astype(np.uint8)
+    fractions = np.linspace(0, 1, 256)[:, np.newaxis]
+    inner = np.asarray(inner_color, dtype=np.float64)
+    palette = inner + (np.asarray(outer_color, dtype=np.float64) - inner) * fractions
+    image = Image.fromarray(steps)
+    image.putpalette(np.round(palette).astype(np.uint8).tobytes())
+    return image.convert("RGB")
+
+
+def texture(image, seed, parchment=0.0, grain=0.0):
+    """
+    Return a copy of an image with seeded noise layers applied: one
+    brightness offset map, computed by NumPy in integer arithmetic,
+    added by Pillow.
+
+    Args:
+        image: RGB PIL Image object, not modified.
+        seed(int): random seed (see seed_from).
+        parchment(float): strength (0-1) of the mottled parchment texture,
+                          up to +-48 levels.
+        grain(float): strength (0-1) of the per-pixel film grain,
+                      up to +-32 levels.
+
+    Returns:
+        RGB PIL Image object.
+    """
+    if not parchment and not grain:
+        return image.copy()
+    rng = np.random.default_rng(seed)
+    width, height = image.size
+    offset = np.full((height, width), 128, dtype=np.int16)
+    if parchment:
+        # A seeded window of the shared noise field, randomly mirrored.
+        field = _noise_field(width, height)
+        top, left = rng.integers(0, height + 1), rng.integers(0, width + 1)
+        window = field[top:top + height, left:left + width]
+        flip_y, flip_x = rng.integers(0, 2, size=2)
+        window = window[::-1 if flip_y else 1, ::-1 if flip_x else 1]
+        # Fixed point: strength in 1/256 steps.
+        offset += (window * round(parchment * 96)) >> 8
+    if grain:
+        # Random bytes as noise of zero mean, shared by the channels
+        # (luminance grain).
+        noise = np.frombuffer(rng.bytes(width * height), dtype=np.int8)
+        noise = noise.reshape(height, width).astype(np.int16)
+        noise *= round(grain * 64)
+        noise >>= 8
+        offset += noise
+    np.clip(offset, 0, 255, out=offset)
+    offset_image = Image.fromarray(offset.astype(np.uint8)).convert("RGB")
+    return ImageChops.add(image, offset_image, offset=-128)
+
+
+@lru_cache(maxsize=4)
+def _noise_field(width, height):
+    """
+    Helper function for texture, cached per canvas size. Sum of
+    upscaled random grids of decreasing cell size (value noise), twice
+    the canvas size, so seeded windows of it differ per quote.
+
+    Args:
+        width, height(int): canvas size in pixels.
+
+    Returns:
+        field: read-only int16 array of shape (2 * height, 2 * width),
+               -128-127.
+    """
+    size = (2 * width, 2 * height)
+    rng = np.random.default_rng(0)
+    field = np.zeros((size[1], size[0]), dtype=np.int16)
+    for cell, weight in PARCHMENT_OCTAVES:
+        step = max(1, round(min(width, height) * cell))
+        grid = rng.integers(0, 256, (size[1] // step + 2, size[0] // step + 2),
+                            dtype=np.uint8)
+        # Pillow interpolates the grid up in C.
+        layer = Image.fromarray(grid).resize(size, Image.Resampling.BICUBIC)
+        field += np.asarray(layer, dtype=np.int16) * weight // 100
+    field -= 128
+    field.flags.writeable = False
+    return field
+
+
+# Print on accidental run:
+if __name__ == "__main__":
+    print("Importable module. Not meant to be run!")
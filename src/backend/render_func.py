@@ -0,0 +1,182 @@
+"""
+render_func.py
+
+Parallel batch rendering of quote images, for editorial review
+and for warming the render cache.
+
+Part of the "Ancient Wisdom Daily" project by OperaVaria.
+"""
+
+# Imports from built-in modules:
+import logging
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from itertools import islice
+from pathlib import Path
+from time import perf_counter
+
+# Imports from local modules:
+from backend.cache_func import RenderCache
+from backend.classes import ImagePost, Wisdom
+from backend.conn_func import db_connection
+from backend.variant_func import variant_specs
+from config.settings import IMG_VARIANTS, RENDER_BATCH_SIZE
+
+# Setup logging.
+logger = logging.getLogger(__name__)
+
+# Quote rows in Wisdom field order.
+SELECT_ROWS = ("SELECT id_title, quote_orig, quote_eng, attrib_to, locus, "
+               "locus_form, comment, used FROM wisdoms")
+
+# Render settings of a worker process, set by _init_worker.
+_worker = {}
+
+
+def render_corpus(db_file, image_settings, out_dir=None, cache_settings=None,
+                  ids=None, author=None, workers=None, variants=None):
+    """
+    Render the quotes of the database (or a subset) to .jpg files and/or
+    the render cache with a process pool, logging the progress. The cache
+    is filled with the per-platform variants the posts are encoded to.
+
+    Args:
+        db_file: Path to database file.
+        image_settings(tuple): image_size, bg_color, text_color,
+                               reg_font, bold_font (see ImagePost).
+        out_dir: Path of a directory to write <id_title>.jpg files to, or None.
+        cache_settings(tuple): RenderCache directory and max_bytes, or None.
+        ids(list[str]): only render these quote ids, None for all.
+        author(str): only render quotes whose attribution contains this text.
+        workers(int): number of worker processes, None for one per usable core.
+        variants(dict): per-platform image variants to cache (see variant_func),
+                        None for IMG_VARIANTS.
+
+    Returns:
+        rendered(int): number of images rendered.
+
+    Raises:
+        ValueError: if there is neither an output directory nor a cache,
+                    or a variant format is not supported.
+        sqlite3.Error: if there is a database-related error.
+    """
+    if out_dir is None and cache_settings is None:
+        raise ValueError("Nothing to render to: give an output directory or a cache")
+    if out_dir is not None:
+        Path(out_dir).mkdir(parents=True, exist_ok=True)
+    specs = variant_specs(IMG_VARIANTS if variants is None else variants)
+    workers = workers or _usable_cores()
+    start = perf_counter()
+    rendered = 0
+    with db_connection(db_file, role="read") as con, ProcessPoolExecutor(
+            max_workers=workers, initializer=_init_worker,
+            initargs=(image_settings, out_dir, cache_settings, specs)) as executor:
+        rows = con.execute(*_filter_query(ids, author))
+        pending = set()
+        # Keep at most two batches per worker in flight: memory stays
+        # flat however large the corpus is.
+        while batch := list(islice(rows, RENDER_BATCH_SIZE)):
+            pending.add(executor.submit(_render_rows, batch))
+            if len(pending) >= workers * 2:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                rendered += _collect(done, rendered, start)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            rendered += _collect(done, rendered, start)
+    logger.info("Rendered %d images in %.1f s with %d workers",
+                rendered, perf_counter() - start, workers)
+    return rendered
+
+
+def _usable_cores():
+    """
+    Helper function for render_corpus.
+
+    Returns:
+        Number of CPU cores this process may run on.
+    """
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def _filter_query(ids, author):
+    """
+    Helper function for render_corpus. Build the row query of the subset.
+
+    Args: see above.
+
+    Returns:
+        query(str), params(list): SQL and its parameters.
+    """
+    conditions, params = [], []
+    if ids:
+        conditions.append(f"id_title IN ({', '.join('?' * len(ids))})")
+        params.extend(ids)
+    if author:
+        conditions.append("attrib_to LIKE ?")
+        params.append(f"%{author}%")
+    if conditions:
+        return f"{SELECT_ROWS} WHERE {' AND '.join(conditions)}", params
+    return SELECT_ROWS, params
+
+
+def _collect(done, rendered, start):
+    """
+    Helper function for render_corpus. Gather finished batches, log progress.
+
+    Args:
+        done(set): finished futures.
+        rendered(int): images rendered before these batches.
+        start(float): perf_counter value at start.
+
+    Returns:
+        count(int): images rendered in these batches.
+    """
+    count = sum(future.result() for future in done)
+    elapsed = perf_counter() - start
+    logger.info("%d images rendered (%.0f images/s)", rendered + count,
+                (rendered + count) / elapsed if elapsed else 0)
+    return count
+
+
+def _init_worker(image_settings, out_dir, cache_settings, specs):
+    """
+    Worker process initializer: keep the settings. Nothing is preloaded:
+    the layout picks the font sizes per quote, each size is then loaded
+    once per worker by its process-wide font cache (see font_func).
+
+    Args:
+        image_settings, out_dir, cache_settings: see render_corpus.
+        specs(dict): {platform: VariantSpec} to cache.
+    """
+    _worker["image_settings"] = image_settings
+    _worker["specs"] = specs
+    _worker["out_dir"] = None if out_dir is None else Path(out_dir)
+    _worker["cache"] = None if cache_settings is None else RenderCache(*cache_settings)
+
+
+def _render_rows(rows):
+    """
+    Worker function: render a batch of quote rows.
+
+    Args:
+        rows(list[tuple]): quote rows in Wisdom field order.
+
+    Returns:
+        count(int): number of images rendered.
+    """
+    out_dir = _worker["out_dir"]
+    for row in rows:
+        wis_obj = Wisdom(*row)
+        image_post = ImagePost(wis_obj, *_worker["image_settings"], _worker["cache"])
+        if out_dir is not None:
+            out_dir.joinpath(f"{wis_obj.id}.jpg").write_bytes(image_post.view())
+        if _worker["cache"] is not None:
+            image_post.encode_variants(_worker["specs"])
+    return len(rows)
+
+
+# Print on accidental run:
+if __name__ == "__main__":
+    print("Importable module. Not meant to be run!")
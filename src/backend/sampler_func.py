@@ -0,0 +1,373 @@
+"""
+sampler_func.py
+
+Weighted, constraint-aware quote samplers for db_func.
+
+A sampler picks the id of the next quote for a channel; db_func then claims
+it atomically. Any object with draw(cur, channel), claimed(channel, id_title)
+and invalidate(channel) methods can be passed to db_get.
+
+Part of the "Ancient Wisdom Daily" project by OperaVaria.
+"""
+
+# Imports from built-in modules:
+import logging
+import math
+import random
+from collections import Counter
+from dataclasses import dataclass, field
+
+# Setup logging.
+logger = logging.getLogger(__name__)
+
+# Columns a sampler may weight or group by.
+SAMPLER_COLUMNS = ("attrib_to", "locus")
+
+# Tree lookups per draw (rejected by float error or by the recency
+# term) before the tree is rebuilt, dropping the float error of repeated
+# updates, and the pick falls back to an exact linear scan.
+FIND_ATTEMPTS = 16
+
+# Recency terms past this many half lives (closer to 1 than
+# 2 ** -RECENCY_HORIZON) are taken as 1: posts are only counted back so far.
+RECENCY_HORIZON = 20
+
+
+class FenwickTree:
+    """
+    Binary indexed tree over float weights: O(log n) point updates,
+    prefix sums and weighted index lookup.
+    """
+
+    def __init__(self, weights):
+        """Build the tree from a list of weights in O(n)."""
+        self.size = len(weights)
+        self.tree = [0.0] + list(weights)
+        for i in range(1, self.size + 1):
+            parent = i + (i & -i)
+            if parent <= self.size:
+                self.tree[parent] += self.tree[i]
+
+    def add(self, index, delta):
+        """
+        Add delta to the weight at a zero-based index.
+
+        Args:
+            index(int): position.
+            delta(float): weight change.
+        """
+        i = index + 1
+        while i <= self.size:
+            self.tree[i] += delta
+            i += i & -i
+
+    def total(self):
+        """
+        Returns:
+            Sum of all weights.
+        """
+        i = self.size
+        result = 0.0
+        while i > 0:
+            result += self.tree[i]
+            i -= i & -i
+        return result
+
+    def find(self, value):
+        """
+        Find the zero-based index whose cumulative weight range holds value.
+
+        Args:
+            value(float): number in [0, total).
+
+        Returns:
+            index(int): position.
+        """
+        pos = 0
+        step = 1 << self.size.bit_length()
+        while step:
+            nxt = pos + step
+            if nxt <= self.size and self.tree[nxt] <= value:
+                pos = nxt
+                value -= self.tree[nxt]
+            step >>= 1
+        return min(pos, self.size - 1)
+
+
+@dataclass
+class _ChannelState:
+    """Per-channel sampling state of a WeightedSampler."""
+    ids: list
+    weights: list
+    tree: FenwickTree
+    positions: dict
+    groups: dict = field(default_factory=dict)
+    keys: list = field(default_factory=list)
+    live: int = 0
+
+
+class WeightedSampler:
+    """
+    Weighted quote sampler with author (or other column) exclusion windows.
+
+    Weights are the product of the enabled factors:
+        balance_column: 1 / number of quotes sharing the column value,
+                        e.g. every author is equally likely.
+        recency_half_life: 1 - 0.5 ** (posts since last posted / half life),
+                           counting the post itself,
+                           quotes never posted get full weight.
+    exclude_column, exclude_window: quotes sharing the column value with any
+    of the channel's last N posts are skipped while others are available.
+
+    The balance weights are precomputed once per channel (and process) into
+    a Fenwick tree and updated incrementally on claims. The recency term
+    changes with every post, so it is computed on each draw from the
+    history instead: a quote picked by the tree is accepted with its
+    recency term as probability (rejection sampling, exact). A draw costs
+    O(log n) per attempt, plus O(log n) for every quote temporarily
+    excluded.
+    """
+
+    def __init__(self, balance_column=None, recency_half_life=None,
+                 exclude_column=None, exclude_window=0):
+        """
+        Create a WeightedSampler instance.
+
+        Raises:
+            ValueError: if a column is not supported.
+        """
+        for column in (balance_column, exclude_column):
+            if column is not None and column not in SAMPLER_COLUMNS:
+                raise ValueError(f"Unsupported sampler column: {column}")
+        self.balance_column = balance_column
+        self.recency_half_life = recency_half_life
+        self.exclude_column = exclude_column
+        self.exclude_window = exclude_window
+        self._channels = {}
+        self._synced = {}
+
+    def draw(self, cur, channel):
+        """
+        Draw the id of an unused quote for a channel.
+
+        Args:
+            cur: SQLite cursor object on the state database.
+            channel(str): channel name.
+
+        Returns:
+            id_title/None: quote id or None if no unused quotes are left.
+        """
+        state = self._state(cur, channel)
+        zeroed = self._exclude(cur, channel, state)
+        try:
+            # Count-based checks: the tree total carries float error.
+            if zeroed and state.live == len(zeroed):
+                # Only excluded quotes are left: lift the exclusion.
+                self._restore(state, zeroed)
+                zeroed = set()
+            if state.live == 0:
+                return None
+            for _ in range(FIND_ATTEMPTS):
+                total = state.tree.total()
+                if total <= 0:
+                    break
+                index = state.tree.find(random.random() * total)
+                # Guard against float rounding landing on a zero weight.
+                if state.weights[index] <= 0 or index in zeroed:
+                    continue
+                if random.random() < self._recency(cur, channel, state.ids[index]):
+                    return state.ids[index]
+            logger.debug("Sampler draw rejected for channel %s, scanning", channel)
+            weights = [0.0 if index in zeroed else weight
+                       for index, weight in enumerate(state.weights)]
+            state.tree = FenwickTree(weights)
+            ages = self._ages(cur, channel)
+            return random.choices(state.ids, [
+                weight * self._factor(ages.get(id_title))
+                for id_title, weight in zip(state.ids, weights)])[0]
+        finally:
+            self._restore(state, zeroed)
+
+    def claimed(self, channel, id_title):
+        """
+        Zero the weight of a quote claimed (by this or another process).
+
+        Args:
+            channel(str): channel name.
+            id_title(str): quote id.
+        """
+        state = self._channels.get(channel)
+        if state is None:
+            return
+        index = state.positions.get(id_title)
+        if index is not None and state.weights[index] > 0:
+            state.tree.add(index, -state.weights[index])
+            state.weights[index] = 0.0
+            state.live -= 1
+
+    def invalidate(self, channel):
+        """
+        Drop the precomputed state of a channel (e.g. after a reset).
+
+        Args:
+            channel(str): channel name.
+        """
+        self._channels.pop(channel, None)
+        self._synced.pop(channel, None)
+
+    def _state(self, cur, channel):
+        """
+        Helper method for draw. Return the channel's sampling state,
+        build it if missing or if new quotes were synced since.
+
+        Args: see draw.
+
+        Returns:
+            state: _ChannelState object.
+        """
+        cur.execute("SELECT value FROM state_meta WHERE key = ?",
+                    (f"synced:{channel}",))
+        synced = cur.fetchone()[0]
+        state = self._channels.get(channel)
+        if state is None or self._synced.get(channel) != synced:
+            state = self._build(cur, channel)
+            self._synced[channel] = synced
+            self._channels[channel] = state
+        return state
+
+    def _build(self, cur, channel):
+        """
+        Helper method for _state. Load the channel's quotes and compute
+        their balance weights: one O(n) pass.
+
+        Args: see draw.
+
+        Returns:
+            state: _ChannelState object.
+        """
+        key_expr = f"wisdoms.{self.exclude_column}" if self.exclude_column else "NULL"
+        bal_expr = f"wisdoms.{self.balance_column}" if self.balance_column else "NULL"
+        cur.execute(f"SELECT state.id_title, state.used, {key_expr}, {bal_expr} "
+                    f"FROM state JOIN wisdoms ON wisdoms.id_title = state.id_title "
+                    f"WHERE state.channel = ?", (channel,))
+        rows = cur.fetchall()
+        # Balance factor.
+        freq = Counter(row[3] for row in rows)
+        state = _ChannelState([], [], None, {})
+        for index, (id_title, used, key, bal) in enumerate(rows):
+            weight = 0.0
+            if not used:
+                weight = 1.0 / freq[bal] if self.balance_column else 1.0
+            state.ids.append(id_title)
+            state.weights.append(weight)
+            state.keys.append(key)
+            state.positions[id_title] = index
+            state.groups.setdefault(key, []).append(index)
+        state.tree = FenwickTree(state.weights)
+        state.live = sum(1 for weight in state.weights if weight > 0)
+        logger.debug("Sampler state built for channel %s: %d quotes", channel, len(rows))
+        return state
+
+    def _recency(self, cur, channel, id_title):
+        """
+        Helper method for draw. Recency term of a quote, from the
+        channel's posts since it was last posted: O(log n) lookups plus
+        at most RECENCY_HORIZON half lives of posts counted.
+
+        Args:
+            cur, channel: see draw.
+            id_title(str): quote id.
+
+        Returns:
+            term(float): in (0, 1], 1 if recency is off.
+        """
+        if not self.recency_half_life:
+            return 1.0
+        cur.execute("SELECT MAX(seq) FROM history WHERE channel = ? AND id_title = ?",
+                    (channel, id_title))
+        last = cur.fetchone()[0]
+        if last is None:
+            return 1.0
+        cur.execute("SELECT COUNT(*) FROM (SELECT 1 FROM history "
+                    "WHERE channel = ? AND seq > ? LIMIT ?)",
+                    (channel, last, math.ceil(self.recency_half_life * RECENCY_HORIZON)))
+        return self._factor(cur.fetchone()[0])
+
+    def _factor(self, age):
+        """
+        Helper method. Recency term of a quote posted age posts ago.
+
+        Args:
+            age(int/None): posts since, None if never posted.
+
+        Returns:
+            term(float): in (0, 1].
+        """
+        if (not self.recency_half_life or age is None
+                or age >= self.recency_half_life * RECENCY_HORIZON):
+            return 1.0
+        return 1.0 - 0.5 ** ((age + 1) / self.recency_half_life)
+
+    def _ages(self, cur, channel):
+        """
+        Helper method for draw, exact fallback: number of the channel's
+        posts since each quote was last posted.
+
+        Args: see draw.
+
+        Returns:
+            ages(dict): {id_title: posts since}, empty if recency is off.
+        """
+        if not self.recency_half_life:
+            return {}
+        cur.execute("SELECT id_title FROM history WHERE channel = ? ORDER BY seq",
+                    (channel,))
+        last_posted = {}
+        posts = 0
+        for posts, (id_title,) in enumerate(cur.fetchall(), start=1):
+            last_posted[id_title] = posts
+        return {id_title: posts - post for id_title, post in last_posted.items()}
+
+    def _exclude(self, cur, channel, state):
+        """
+        Helper method for draw. Temporarily zero the weights of quotes
+        sharing the exclusion column value with the last N posts.
+
+        Args: see draw.
+
+        Returns:
+            zeroed(set[int]): positions zeroed, to restore later.
+        """
+        if not self.exclude_column or self.exclude_window <= 0:
+            return set()
+        cur.execute("SELECT id_title FROM history WHERE channel = ? "
+                    "ORDER BY seq DESC LIMIT ?", (channel, self.exclude_window))
+        recent_keys = set()
+        for (id_title,) in cur.fetchall():
+            index = state.positions.get(id_title)
+            if index is not None:
+                recent_keys.add(state.keys[index])
+        zeroed = set()
+        for key in recent_keys:
+            for index in state.groups.get(key, ()):
+                if state.weights[index] > 0:
+                    state.tree.add(index, -state.weights[index])
+                    zeroed.add(index)
+        return zeroed
+
+    @staticmethod
+    def _restore(state, zeroed):
+        """
+        Helper method for draw. Restore temporarily zeroed weights.
+
+        Args:
+            state: _ChannelState object.
+            zeroed(set[int]): positions to restore.
+        """
+        for index in zeroed:
+            state.tree.add(index, state.weights[index])
+
+
+# Print on accidental run:
+if __name__ == "__main__":
+    print("Importable module. Not meant to be run!")
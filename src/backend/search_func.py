@@ -0,0 +1,291 @@
+"""
+search_func.py
+
+Functions for full-text search over the quote database.
+
+The search index lives in the corpus file. Building or migrating it (on
+first search or after an import, see import_func) and refolding its
+vocabulary after content changes write the corpus, so imports and those
+searches must only run while no bot process has the corpus attached as
+immutable (see db_func), e.g. between scheduled posts. Searching an
+index that is up to date only reads the file.
+
+Part of the "Ancient Wisdom Daily" project by OperaVaria.
+"""
+
+# Imports from built-in modules:
+import logging
+import re
+import sqlite3
+import unicodedata
+
+# Imports from local modules:
+from backend.classes import Wisdom
+from backend.conn_func import db_transaction
+
+# Setup logging.
+logger = logging.getLogger(__name__)
+
+# Corpus key/value metadata, holds "fts_version", "fts_schema"
+# and "fold_version" (the fts_version wisdoms_fold was built from).
+META_TABLE = ("CREATE TABLE IF NOT EXISTS wisdoms_meta "
+              "(key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+
+# Version of the index layout below, older indexes are rebuilt.
+FTS_SCHEMA = 2
+
+# Searchable columns.
+FTS_COLUMNS = ("quote_orig", "quote_eng", "attrib_to", "locus", "comment")
+
+# Stable integer keys of the quote ids: the implicit wisdoms rowids
+# (TEXT primary key) may be renumbered by VACUUM.
+KEYS_TABLE = """CREATE TABLE IF NOT EXISTS wisdoms_keys (
+                    key INTEGER PRIMARY KEY,
+                    id_title TEXT NOT NULL UNIQUE)"""
+
+# Contentless FTS5 table keyed by wisdoms_keys.key, the text is read
+# from wisdoms. The unicode61 tokenizer folds Latin diacritics, Greek
+# ones through the folded vocabulary (see wisdoms_fold, _build_match).
+FTS_TABLE = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS wisdoms_fts USING fts5("
+    f"{', '.join(FTS_COLUMNS)}, content='', "
+    f"tokenize='unicode61 remove_diacritics 2')"
+)
+FTS_VOCAB = ("CREATE VIRTUAL TABLE IF NOT EXISTS wisdoms_fts_vocab "
+             "USING fts5vocab(wisdoms_fts, 'row')")
+
+# Folded vocabulary: the index terms by their folded form (only terms
+# that fold differently), rebuilt when "fold_version" lags "fts_version".
+FOLD_TABLE = """CREATE TABLE IF NOT EXISTS wisdoms_fold (
+                    folded TEXT NOT NULL,
+                    term TEXT NOT NULL,
+                    PRIMARY KEY (folded, term)) WITHOUT ROWID"""
+
+# Sync triggers. The update trigger ignores "used" changes, and every
+# content change bumps "fts_version" to invalidate the folded vocabulary.
+_NEW = ", ".join(f"new.{col}" for col in FTS_COLUMNS)
+_OLD = ", ".join(f"old.{col}" for col in FTS_COLUMNS)
+_FTS_INSERT = (f"INSERT OR IGNORE INTO wisdoms_keys (id_title) VALUES (new.id_title); "
+               f"INSERT INTO wisdoms_fts (rowid, {', '.join(FTS_COLUMNS)}) "
+               f"SELECT key, {_NEW} FROM wisdoms_keys WHERE id_title = new.id_title;")
+_FTS_DELETE = (f"INSERT INTO wisdoms_fts (wisdoms_fts, rowid, {', '.join(FTS_COLUMNS)}) "
+               f"SELECT 'delete', key, {_OLD} FROM wisdoms_keys "
+               f"WHERE id_title = old.id_title; "
+               f"DELETE FROM wisdoms_keys WHERE id_title = old.id_title;")
+_BUMP = "UPDATE wisdoms_meta SET value = value + 1 WHERE key = 'fts_version';"
+FTS_TRIGGERS = {
+    "wisdoms_fts_ins": f"""CREATE TRIGGER wisdoms_fts_ins AFTER INSERT ON wisdoms
+                           BEGIN {_FTS_INSERT} {_BUMP} END""",
+    "wisdoms_fts_del": f"""CREATE TRIGGER wisdoms_fts_del AFTER DELETE ON wisdoms
+                           BEGIN {_FTS_DELETE} {_BUMP} END""",
+    "wisdoms_fts_upd": f"""CREATE TRIGGER wisdoms_fts_upd
+                           AFTER UPDATE OF id_title, {', '.join(FTS_COLUMNS)} ON wisdoms
+                           BEGIN {_FTS_DELETE} {_FTS_INSERT} {_BUMP} END""",
+}
+
+def init_search(cur):
+    """
+    Create (or migrate) the search index and its sync triggers if the
+    corpus does not hold an up-to-date one yet, and fill it from the
+    wisdoms table. Rebuild the folded vocabulary if the index changed
+    since. No writes if both are current.
+
+    Args:
+        cur: SQLite cursor object.
+    """
+    if not _index_current(cur):
+        _build_index(cur)
+    if not _fold_current(cur):
+        _build_fold(cur)
+
+
+def _build_index(cur):
+    """
+    Helper function for init_search. (Re)build the search index.
+
+    Args: see above.
+    """
+    # Drop older index layouts (external content on the implicit rowid).
+    for trigger in FTS_TRIGGERS:
+        cur.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    for table in ("wisdoms_fts_vocab", "wisdoms_fts", "wisdoms_keys"):
+        cur.execute(f"DROP TABLE IF EXISTS {table}")
+    for command in (META_TABLE, KEYS_TABLE, FTS_TABLE, FTS_VOCAB,
+                    *FTS_TRIGGERS.values()):
+        cur.execute(command)
+    cur.execute("INSERT INTO wisdoms_keys (id_title) SELECT id_title FROM wisdoms")
+    cur.execute(f"INSERT INTO wisdoms_fts (rowid, {', '.join(FTS_COLUMNS)}) "
+                f"SELECT key, {', '.join(FTS_COLUMNS)} "
+                f"FROM wisdoms JOIN wisdoms_keys USING (id_title)")
+    cur.execute("INSERT OR IGNORE INTO wisdoms_meta (key, value) VALUES ('fts_version', 0)")
+    cur.execute("UPDATE wisdoms_meta SET value = value + 1 WHERE key = 'fts_version'")
+    cur.execute("INSERT OR REPLACE INTO wisdoms_meta (key, value) VALUES ('fts_schema', ?)",
+                (FTS_SCHEMA,))
+    logger.info("Search index built")
+
+
+def _build_fold(cur):
+    """
+    Helper function for init_search. Rebuild the folded vocabulary
+    from the index vocabulary: one pass per content change, instead
+    of one per searching process.
+
+    Args: see above.
+    """
+    cur.execute(FOLD_TABLE)
+    cur.execute("DELETE FROM wisdoms_fold")
+    terms = [row[0] for row in cur.execute("SELECT term FROM wisdoms_fts_vocab").fetchall()]
+    cur.executemany("INSERT INTO wisdoms_fold (folded, term) VALUES (?, ?)",
+                    ((fold_text(term), term) for term in terms if fold_text(term) != term))
+    cur.execute("INSERT OR REPLACE INTO wisdoms_meta (key, value) "
+                "SELECT 'fold_version', value FROM wisdoms_meta WHERE key = 'fts_version'")
+    logger.debug("Search vocabulary folded: %d terms", len(terms))
+
+
+def search_ready(cur):
+    """
+    Check if the corpus holds an up-to-date search index and folded
+    vocabulary.
+
+    Args:
+        cur: SQLite cursor object, read-only is enough.
+
+    Returns:
+        True if init_search has nothing to do.
+    """
+    return _index_current(cur) and _fold_current(cur)
+
+
+def _index_current(cur):
+    """
+    Helper function for search_ready.
+
+    Args: see above.
+
+    Returns:
+        True if the index exists in the current layout.
+    """
+    if not cur.execute("SELECT 1 FROM sqlite_master WHERE name = 'wisdoms_meta'").fetchall():
+        return False
+    return cur.execute("SELECT value FROM wisdoms_meta "
+                       "WHERE key = 'fts_schema'").fetchall() == [(FTS_SCHEMA,)]
+
+
+def _fold_current(cur):
+    """
+    Helper function for search_ready, call once the index is current.
+
+    Args: see above.
+
+    Returns:
+        True if the folded vocabulary was built from the current index.
+    """
+    versions = dict(cur.execute("SELECT key, value FROM wisdoms_meta WHERE key "
+                                "IN ('fts_version', 'fold_version')").fetchall())
+    return versions.get("fold_version") == versions.get("fts_version")
+
+
+def search_wisdoms(db_file, query, limit=10, column=None):
+    """
+    Search quotes by keywords, accent and case insensitive,
+    best bm25 matches first. All keywords must match.
+
+    Args:
+        db_file: Path to database file.
+        query(str): keywords.
+        limit(int): maximum number of results.
+        column(str/None): restrict the search to one of FTS_COLUMNS.
+
+    Returns:
+        wis_list(list[Wisdom]): matching quotes.
+
+    Raises:
+        ValueError: if the column is not searchable.
+        sqlite3.Error: if there is a database-related error.
+    """
+    if column is not None and column not in FTS_COLUMNS:
+        raise ValueError(f"Column not searchable: {column}")
+    try:
+        # Read-only, the index is only written if missing or outdated.
+        with db_transaction(db_file, role="read") as cur:
+            ready = search_ready(cur)
+        if not ready:
+            with db_transaction(db_file, role="corpus") as cur:
+                init_search(cur)
+        with db_transaction(db_file, role="read") as cur:
+            match = _build_match(query, _fold_map(cur, query), column)
+            if match is None:
+                return []
+            cur.execute("SELECT wisdoms.* FROM wisdoms_fts "
+                        "JOIN wisdoms_keys ON wisdoms_keys.key = wisdoms_fts.rowid "
+                        "JOIN wisdoms ON wisdoms.id_title = wisdoms_keys.id_title "
+                        "WHERE wisdoms_fts MATCH ? ORDER BY rank LIMIT ?",
+                        (match, limit))
+            return [Wisdom(*row) for row in cur.fetchall()]
+    except sqlite3.Error as e:
+        logger.error("Search failed: %s", e)
+        raise
+
+
+def fold_text(text):
+    """
+    Strip diacritics (Greek accents and breathings included) and case.
+
+    Args:
+        text(str): text to fold.
+
+    Returns:
+        folded(str): folded text.
+    """
+    decomposed = unicodedata.normalize("NFD", text)
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch)).casefold()
+
+
+def _fold_map(cur, query):
+    """
+    Helper function for search_wisdoms. Look up the accented index
+    terms the query's keywords stand for: one indexed lookup per query.
+
+    Args: see above.
+
+    Returns:
+        fold_map(dict): {folded keyword: [index terms]}.
+    """
+    folded = sorted({fold_text(word) for word in re.findall(r"\w+", query)})
+    if not folded:
+        return {}
+    fold_map = {}
+    cur.execute(f"SELECT folded, term FROM wisdoms_fold "
+                f"WHERE folded IN ({', '.join('?' * len(folded))})", folded)
+    for folded_term, term in cur.fetchall():
+        fold_map.setdefault(folded_term, []).append(term)
+    return fold_map
+
+
+def _build_match(query, fold_map, column):
+    """
+    Helper function for search_wisdoms. Turn keywords into an FTS5 MATCH
+    expression, each keyword expanded to its accented index variants.
+
+    Args: see above.
+
+    Returns:
+        match(str/None): MATCH expression or None if there are no keywords.
+    """
+    words = re.findall(r"\w+", query)
+    if not words:
+        return None
+    groups = []
+    for word in words:
+        folded = fold_text(word)
+        variants = dict.fromkeys([word, folded, *fold_map.get(folded, ())])
+        groups.append("(" + " OR ".join(f'"{term}"' for term in variants) + ")")
+    match = " AND ".join(groups)
+    if column is not None:
+        match = f"{column} : ({match})"
+    return match
+
+
+# Print on accidental run:
+if __name__ == "__main__":
+    print("Importable module. Not meant to be run!")
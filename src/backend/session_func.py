@@ -0,0 +1,231 @@
+"""
+session_func.py
+
+Encrypted store of login sessions, so warm starts skip authentication:
+Bluesky session strings (refreshed by the client, re-saved on every
+refresh) and the validation of the Mastodon and X credentials.
+
+Every entry is a Fernet token (AES-128-CBC with HMAC-SHA256, from the
+cryptography package) carrying its creation time: entries older than
+the time to live are discarded, entries older than the refresh age are
+still used but due for a refresh in the background (see async_func).
+Entries are bound to a fingerprint of the credentials they were made
+with: changing the keys in keys.yaml invalidates them. The encryption
+key comes from the AWD_SESSION_KEY environment variable, or from a key
+file kept outside the project tree (see path_constants). Without a
+usable key every login is a fresh one.
+
+Part of the "Ancient Wisdom Daily" project by OperaVaria.
+"""
+
+# Imports from built-in modules:
+import json
+import logging
+import os
+import threading
+import time
+from hashlib import sha256
+from pathlib import Path
+from tempfile import mkstemp
+
+# Imports from external packages:
+from cryptography.fernet import Fernet, InvalidToken
+
+# Imports from local modules:
+from config.path_constants import SESSION_KEY_FILE, SESSION_STORE_FILE
+from config.settings import SESSION_REFRESH_AGE, SESSION_TTL
+
+# Setup logging.
+logger = logging.getLogger(__name__)
+
+# Environment variable overriding the key file.
+KEY_VARIABLE = "AWD_SESSION_KEY"
+
+
+def fingerprint(*secrets):
+    """
+    Hash the credentials an entry belongs to.
+
+    Args:
+        secrets: str values.
+
+    Returns:
+        fingerprint(str): hex digest.
+    """
+    return sha256("\0".join(secrets).encode("utf-8")).hexdigest()
+
+
+class SessionStore:
+    """Encrypted file of per-platform session entries with a time to live."""
+
+    def __init__(self, path=SESSION_STORE_FILE, key_file=SESSION_KEY_FILE,
+                 ttl=SESSION_TTL, refresh_age=SESSION_REFRESH_AGE):
+        """
+        Create a SessionStore instance.
+
+        Args:
+            path: Path of the store file, created on first write.
+            key_file: Path of the key file (outside the project tree),
+                      generated on first use unless the AWD_SESSION_KEY
+                      environment variable holds a key.
+            ttl(int): seconds an entry stays valid.
+            refresh_age(int): seconds after which an entry is due for a refresh.
+        """
+        self.path = Path(path)
+        self.key_file = Path(key_file)
+        self.ttl = ttl
+        self.refresh_age = refresh_age
+        self._fernet = None
+        self._lock = threading.Lock()
+
+    def get(self, platform, owner):
+        """
+        Return an entry's data if it is valid, decrypted.
+
+        Args:
+            platform(str): platform name.
+            owner(str): fingerprint of the current credentials.
+
+        Returns:
+            data(dict) or None if missing, expired, tampered with or
+            made with other credentials.
+        """
+        with self._lock:
+            token = self._read().get(platform)
+            if token is None:
+                return None
+            try:
+                entry = json.loads(self._cipher().decrypt(token.encode("ascii"), ttl=self.ttl))
+            except (InvalidToken, ValueError, OSError):
+                logger.info("Stored %s session expired or unreadable", platform)
+                return None
+        if entry.get("owner") != owner:
+            return None
+        return entry["data"]
+
+    def stale(self, platform):
+        """
+        Check if an entry is due for a refresh.
+
+        Args:
+            platform(str): platform name.
+
+        Returns:
+            True if the entry is older than the refresh age or unreadable.
+        """
+        with self._lock:
+            token = self._read().get(platform)
+            if token is None:
+                return True
+            try:
+                created = self._cipher().extract_timestamp(token.encode("ascii"))
+            except (InvalidToken, ValueError, OSError):
+                return True
+        return time.time() - created > self.refresh_age
+
+    def put(self, platform, owner, data):
+        """
+        Encrypt and store an entry, replacing the previous one. Failing
+        to write is logged: it only costs a login next time.
+
+        Args:
+            platform(str): platform name.
+            owner(str): fingerprint of the credentials.
+            data(dict): JSON-serializable session data.
+        """
+        with self._lock:
+            try:
+                token = self._cipher().encrypt(json.dumps({"owner": owner, "data": data})
+                                               .encode("utf-8")).decode("ascii")
+                tokens = self._read()
+                tokens[platform] = token
+                _write_private(self.path, json.dumps(tokens).encode("utf-8"))
+            except (ValueError, OSError) as e:
+                logger.error("Failed to write session store: %s", e)
+
+    def drop(self, platform):
+        """
+        Remove an entry, if present.
+
+        Args:
+            platform(str): platform name.
+        """
+        with self._lock:
+            tokens = self._read()
+            if tokens.pop(platform, None) is None:
+                return
+            try:
+                _write_private(self.path, json.dumps(tokens).encode("utf-8"))
+            except OSError as e:
+                logger.error("Failed to write session store: %s", e)
+
+    def _cipher(self):
+        """
+        Helper function, call with the lock held. Load the key
+        (environment variable or key file), or generate the key file.
+
+        Returns:
+            Fernet object.
+
+        Raises:
+            OSError: if the key file cannot be read or written.
+            ValueError: if the key is not a valid Fernet key.
+        """
+        if self._fernet is None:
+            key = os.environ.get(KEY_VARIABLE)
+            source = KEY_VARIABLE
+            if key is None:
+                source = self.key_file
+                try:
+                    key = self.key_file.read_bytes().strip()
+                except FileNotFoundError:
+                    key = Fernet.generate_key()
+                    _write_private(self.key_file, key)
+                    logger.info("Session key generated: %s", self.key_file)
+            try:
+                self._fernet = Fernet(key)
+            except ValueError:
+                logger.error("Invalid session key in %s: stored sessions not used", source)
+                raise
+        return self._fernet
+
+    def _read(self):
+        """
+        Helper function. Read the store file.
+
+        Returns:
+            tokens(dict): {platform: token}, empty if missing or corrupt.
+        """
+        try:
+            return json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return {}
+
+
+def _write_private(path, data):
+    """
+    Helper function. Write a file readable by the owner only (mkstemp
+    creates it so), through a temporary file: readers never see a
+    partial file.
+
+    Args:
+        path: Path of the file.
+        data(bytes): contents.
+
+    Raises:
+        OSError: if writing fails.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    handle, temp_path = mkstemp(dir=path.parent, prefix=".tmp-")
+    try:
+        with os.fdopen(handle, "wb") as temp_file:
+            temp_file.write(data)
+        os.replace(temp_path, path)
+    except OSError:
+        os.remove(temp_path)
+        raise
+
+
+# Print on accidental run:
+if __name__ == "__main__":
+    print("Importable module. Not meant to be run!")
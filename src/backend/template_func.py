@@ -0,0 +1,183 @@
+"""
+template_func.py
+
+Pre-composited background templates of quote images: a plain color, a
+gradient or an artwork from assets/img, optionally blurred, darkened
+and vignetted.
+
+A template is built once (decoded, resized, filtered), kept in memory
+and in an on-disk cache shared by every process, and handed out as
+copies to draw text on. Seeded texture layers (parchment, film grain,
+see procedural_func) are applied to the copies.
+
+Part of the "Ancient Wisdom Daily" project by OperaVaria.
+"""
+
+# Imports from built-in modules:
+import logging
+import threading
+from dataclasses import dataclass, replace
+from functools import lru_cache
+from io import BytesIO
+
+# Imports from external packages:
+from PIL import Image, ImageFilter, ImageOps
+
+# Imports from local modules:
+from backend.cache_func import RenderCache, render_key
+from backend.procedural_func import gradient, texture
+from config.path_constants import IMG_DIR, TEMPLATE_CACHE_DIR
+from config.settings import TEMPLATE_CACHE_MAX_BYTES, TEMPLATE_CACHE_SIZE
+
+# Setup logging.
+logger = logging.getLogger(__name__)
+
+# Version of the template filters, part of the cache keys:
+# bump when _compose output changes.
+TEMPLATE_VERSION = 1
+
+# Serializes building, so concurrent misses build a template only once.
+_template_lock = threading.Lock()
+
+# On-disk cache of finished templates, shared by every process.
+_disk_cache = RenderCache(TEMPLATE_CACHE_DIR, TEMPLATE_CACHE_MAX_BYTES, ".png")
+
+
+@dataclass(frozen=True)
+class Background:
+    """
+    Background of a quote image. Without an image, a gradient pattern
+    from the accent to the background color or the plain background
+    color. Images are scaled and cropped to cover the canvas.
+    """
+    image: str = None
+    pattern: str = None
+    accent: tuple = (64, 48, 32)
+    angle: float = 90.0
+    blur: float = 0.0
+    darken: float = 0.0
+    vignette: float = 0.0
+    parchment: float = 0.0
+    grain: float = 0.0
+
+    @property
+    def seeded(self):
+        """True if the background has seeded texture layers."""
+        return bool(self.parchment or self.grain)
+
+    def base(self):
+        """
+        Returns:
+            Background object without the seeded texture layers.
+        """
+        return replace(self, parchment=0.0, grain=0.0)
+
+
+def load_background(size, bg_color, background=None, seed=0):
+    """
+    Return a copy of the template, build it on first use, with the
+    seeded texture layers applied.
+
+    Args:
+        size(tuple): (width, height) in pixels.
+        bg_color(tuple): (r, g, b) color: the plain background,
+                         darkening and vignette color.
+        background: Background object, None for the plain color.
+        seed(int): seed of the texture layers (see procedural_func.seed_from).
+
+    Returns:
+        canvas: RGB PIL Image object, the caller's to draw on.
+    """
+    background = background or Background()
+    with _template_lock:
+        template = _template(tuple(size), tuple(bg_color), background.base())
+    if background.seeded:
+        return texture(template, seed, background.parchment, background.grain)
+    return template.copy()
+
+
+def template_key(size, bg_color, background):
+    """
+    Hash everything a template depends on, the image file included.
+
+    Args: see load_background.
+
+    Returns:
+        key(str): hex digest.
+    """
+    image_path = None if background.image is None else IMG_DIR.joinpath(background.image)
+    return render_key(TEMPLATE_VERSION, tuple(size), tuple(bg_color), background, image_path)
+
+
+def clear_template_cache():
+    """Drop every template kept in memory (the disk cache is kept)."""
+    with _template_lock:
+        _template.cache_clear()
+
+
+@lru_cache(maxsize=TEMPLATE_CACHE_SIZE)
+def _template(size, bg_color, background):
+    """
+    Helper function for load_background, cached in memory. Load the
+    template from the disk cache, or build and store it.
+
+    Args: see above.
+
+    Returns:
+        template: RGB PIL Image object, shared: do not modify.
+    """
+    if background == Background():
+        # Nothing to decode or filter.
+        return Image.new("RGB", size, bg_color)
+    key = template_key(size, bg_color, background)
+    data = _disk_cache.get(key)
+    if data is not None:
+        with Image.open(BytesIO(data)) as cached:
+            return cached.convert("RGB")
+    template = _compose(size, bg_color, background)
+    buffer = BytesIO()
+    template.save(buffer, "PNG")
+    _disk_cache.put(key, buffer.getvalue())
+    logger.debug("Background template built: %s", background)
+    return template
+
+
+def _compose(size, bg_color, background):
+    """
+    Helper function for _template. Decode, resize and filter.
+
+    Args: see above.
+
+    Returns:
+        canvas: RGB PIL Image object.
+    """
+    if background.image is None and background.pattern is not None:
+        canvas = gradient(size, background.accent, bg_color,
+                          background.pattern, background.angle)
+    elif background.image is None:
+        canvas = Image.new("RGB", size, bg_color)
+    else:
+        try:
+            with Image.open(IMG_DIR.joinpath(background.image)) as artwork:
+                # Let JPEG decode at a reduced scale when it is much larger.
+                artwork.draft("RGB", size)
+                canvas = ImageOps.fit(artwork.convert("RGB"), size, Image.Resampling.LANCZOS)
+        except OSError as e:
+            logger.error("Background image loading error: %s. Using plain color", e)
+            canvas = Image.new("RGB", size, bg_color)
+    if background.blur:
+        canvas = canvas.filter(ImageFilter.GaussianBlur(background.blur))
+    solid = Image.new("RGB", size, bg_color)
+    if background.darken:
+        canvas = Image.blend(canvas, solid, background.darken)
+    if background.vignette:
+        # Radial gradient: 0 at the center, 255 at the corners.
+        mask = Image.radial_gradient("L").resize(size, Image.Resampling.BILINEAR)
+        mask = mask.point(lambda value: min(255, round(value * background.vignette)))
+        canvas = Image.composite(solid, canvas, mask)
+    return canvas
+
+
+# Print on accidental run:
+if __name__ == "__main__":
+    print("Importable module. Not meant to be run!")
@@ -0,0 +1,165 @@
+"""
+variant_func.py
+
+Per-platform encodings of a rendered quote image: size, format and
+quality, with the quality bisected to stay within a byte budget.
+
+Part of the "Ancient Wisdom Daily" project by OperaVaria.
+"""
+
+# Imports from built-in modules:
+import logging
+from dataclasses import dataclass, replace
+from io import BytesIO
+
+# Imports from external packages:
+from PIL import Image, ImageOps
+
+# Setup logging.
+logger = logging.getLogger(__name__)
+
+# Supported formats: {PIL format: (MIME type, file extension, lossy)}.
+FORMATS = {
+    "JPEG": ("image/jpeg", ".jpg", True),
+    "WEBP": ("image/webp", ".webp", True),
+    "PNG": ("image/png", ".png", False),
+}
+
+
+@dataclass(frozen=True)
+class VariantSpec:
+    """
+    Encoding of an image for one platform. Images of another aspect
+    ratio are scaled to fit and padded with the background color.
+    """
+    size: tuple = None
+    format: str = "JPEG"
+    max_bytes: int = None
+    progressive: bool = False
+    quality_range: tuple = (40, 95)
+
+
+@dataclass(frozen=True)
+class EncodedImage:
+    """Encoded image data with its MIME type and file extension."""
+    data: bytes
+    mime_type: str
+    extension: str
+
+    @classmethod
+    def from_bytes(cls, data, image_format):
+        """
+        Args:
+            data(bytes): encoded image.
+            image_format(str): PIL format name, a key of FORMATS.
+
+        Returns:
+            EncodedImage object.
+        """
+        mime_type, extension, _ = FORMATS[image_format]
+        return cls(data, mime_type, extension)
+
+
+def variant_specs(variants):
+    """
+    Build variant specifications from settings.
+
+    Args:
+        variants(dict): {platform: VariantSpec keyword arguments}.
+
+    Returns:
+        specs(dict): {platform: VariantSpec}.
+
+    Raises:
+        ValueError: if a format is not supported.
+    """
+    specs = {platform: VariantSpec(**kwargs) for platform, kwargs in variants.items()}
+    for platform, spec in specs.items():
+        if spec.format not in FORMATS:
+            raise ValueError(f"Unsupported image format for {platform}: {spec.format}")
+    return specs
+
+
+def encode_variant(image, spec):
+    """
+    Encode an image as specified. Lossy formats are encoded at the
+    highest quality within the byte budget (bisection over the quality
+    range); a lossless image over the budget falls back to JPEG.
+
+    Args:
+        image: PIL Image object, not modified.
+        spec: VariantSpec object.
+
+    Returns:
+        EncodedImage object.
+    """
+    if spec.size is not None and tuple(spec.size) != image.size:
+        image = ImageOps.pad(image, tuple(spec.size), Image.Resampling.LANCZOS,
+                             color=image.getpixel((0, 0)))
+    if not FORMATS[spec.format][2]:
+        data = _save(image, spec, None)
+        if spec.max_bytes is None or len(data) <= spec.max_bytes:
+            return EncodedImage.from_bytes(data, spec.format)
+        logger.warning("%s image of %d bytes is over budget, encoding JPEG instead",
+                       spec.format, len(data))
+        spec = replace(spec, format="JPEG")
+    return EncodedImage.from_bytes(_bisect_quality(image, spec), spec.format)
+
+
+def _bisect_quality(image, spec):
+    """
+    Helper function for encode_variant. Find the highest quality whose
+    encoding fits the byte budget.
+
+    Args: see above.
+
+    Returns:
+        data(bytes): encoded image.
+    """
+    low, high = spec.quality_range
+    # Most images fit at the top quality: a single encode.
+    data = _save(image, spec, high)
+    if spec.max_bytes is None or len(data) <= spec.max_bytes:
+        return data
+    best = None
+    high -= 1
+    while low <= high:
+        quality = (low + high) // 2
+        candidate = _save(image, spec, quality)
+        if len(candidate) <= spec.max_bytes:
+            best, low = candidate, quality + 1
+        else:
+            data, high = candidate, quality - 1
+    if best is None:
+        logger.warning("%s image of %d bytes is over the %d byte budget at quality %d",
+                       spec.format, len(data), spec.max_bytes, spec.quality_range[0])
+        return data
+    return best
+
+
+def _save(image, spec, quality):
+    """
+    Helper function. Encode an image in memory.
+
+    Args:
+        image: PIL Image object.
+        spec: VariantSpec object.
+        quality(int/None): quality of lossy formats.
+
+    Returns:
+        data(bytes): encoded image.
+    """
+    buffer = BytesIO()
+    if spec.format == "JPEG":
+        image.save(buffer, "JPEG", quality=quality, optimize=True,
+                   progressive=spec.progressive)
+    elif spec.format == "WEBP":
+        image.save(buffer, "WEBP", quality=quality, method=4)
+    else:
+        image.save(buffer, spec.format, optimize=True)
+    return buffer.getvalue()
+
+
+# Print on accidental run:
+if __name__ == "__main__":
+    print("Importable module. Not meant to be run!")
@@ -6,7 +6,8 @@ File path constants.
 Part of the "Ancient Wisdom Daily" project by OperaVaria.
 """
 
-# Import.
+# Imports.
+import os
 from pathlib import Path
 
 
@@ -14,19 +15,35 @@ from pathlib import Path
 PROJECT_DIR = Path(__file__).parents[2].resolve()
 ASSETS_DIR = PROJECT_DIR.joinpath("assets/")
 FONT_DIR = ASSETS_DIR.joinpath("fonts/")
+IMG_DIR = ASSETS_DIR.joinpath("img/")
 DB_DIR = PROJECT_DIR.joinpath("db/")
 SRC_DIR = PROJECT_DIR.joinpath("src/")
 CONFIG_DIR = SRC_DIR.joinpath("config/")
 TEMP_DIR = SRC_DIR.joinpath("temp/")
+RENDER_CACHE_DIR = PROJECT_DIR.joinpath("cache/render/")
+TEMPLATE_CACHE_DIR = PROJECT_DIR.joinpath("cache/templates/")
+LOG_DIR = PROJECT_DIR.joinpath("logs/")
+# RAM-backed directory for files clients need on disk (Linux).
+TMPFS_DIR = Path("/dev/shm")
+# Per-user configuration directory, outside the project tree:
+# secrets kept there cannot end up in a commit or a copy of the project.
+USER_CONFIG_DIR = Path(os.environ.get("XDG_CONFIG_HOME")
+                       or Path.home().joinpath(".config")).joinpath("ancient_wisdom_daily/")
 
 # Files:
 GENTIUM_REG_TTF = FONT_DIR.joinpath("Gentium_Plus/GentiumPlus-Regular.ttf")
 GENTIUM_BOLD_TTF = FONT_DIR.joinpath("Gentium_Plus/GentiumPlus-Bold.ttf")
+FONT_COVERAGE_FILE = FONT_DIR.joinpath("coverage.json")
 DB_FILE = DB_DIR.joinpath("wisdoms.db")
+STATE_DB_FILE = DB_DIR.joinpath("state.db")
 FAKE_DB_FILE = TEMP_DIR.joinpath("nonexistent_database.db")
 INSTA_SESSION = CONFIG_DIR.joinpath("session.json")
+SESSION_STORE_FILE = CONFIG_DIR.joinpath("session_store.json")
+SESSION_KEY_FILE = USER_CONFIG_DIR.joinpath("session.key")
 LOGIN_KEYS = CONFIG_DIR.joinpath("keys.yaml")
+RUN_REPORT_FILE = LOG_DIR.joinpath("last_run.json")
 TEMP_DB_COPY = TEMP_DIR.joinpath("copy.db")
+TEMP_STATE_DB = TEMP_DIR.joinpath("state.db")
 TEMP_POST_IMG = TEMP_DIR.joinpath("post.jpg")
 
 
@@ -7,14 +7,91 @@ Part of the "Ancient Wisdom Daily" project by OperaVaria.
 """
 
 
+# Database settings.
+# Quote selection mode: "random" (pick among unused rows) or
+# "deck" (pop from a precomputed shuffled order, reshuffle per cycle).
+DB_SELECT_MODE = "random"
+
+# Selection state channel (bot account) used when none is given.
+DB_DEFAULT_CHANNEL = "default"
+
+# Pragmas applied to every long-lived connection (WAL journal and
+# relaxed syncing to state databases only, memory mapped I/O, 16 MB
+# page cache), see conn_func.
+DB_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "mmap_size": 268435456,
+    "cache_size": -16000,
+    "temp_store": "MEMORY",
+    "busy_timeout": 5000,
+}
+
+# Import settings: rows per transaction, characters per .json read.
+IMPORT_BATCH_SIZE = 5000
+IMPORT_CHUNK_SIZE = 65536
+
 # Instagrapi settings.
 INSTA_DELAY_RANGE = [1, 3]
 
+# Seconds allowed per platform for logging in and for posting.
+API_TIMEOUT = 60.0
+
+# Stored login sessions (see session_func): time to live (7 days) and
+# age after which they are refreshed in the background (12 hours).
+SESSION_TTL = 604800
+SESSION_REFRESH_AGE = 43200
+
+# Text post limits, in each platform's units (see length_func):
+# longer texts are posted as images.
+TEXT_LIMITS = {"bluesky": 300, "mastodon": 500, "x": 280}
+
 # Image properties.
 IMG_SIZE = (1080, 1080)
 IMG_BG_COLOR = (12, 4, 4)
 IMG_TEXT_COLOR = (255, 255, 255)
 
+# Image background (see template_func.Background): artwork file name in
+# assets/img or None; without artwork, gradient pattern ("linear",
+# "radial" or None for the plain background color) from the accent color
+# at the given angle; blur radius; darkening and vignette strength (0-1,
+# toward the background color); parchment texture and film grain
+# strength (0-1, seeded by the quote id).
+# E.g. {"image": "the_school_of_athens.jpg", "blur": 4, "darken": 0.7}
+# or {"pattern": "radial", "parchment": 0.3, "grain": 0.2}.
+IMG_BACKGROUND = {"image": None, "pattern": None, "accent": (64, 48, 32), "angle": 90.0,
+                  "blur": 0, "darken": 0.0, "vignette": 0.0, "parchment": 0.0, "grain": 0.0}
+
+# Per-platform image variants (see variant_func.VariantSpec): size
+# (other aspect ratios are padded), format ("JPEG", "WEBP", "PNG"),
+# byte budget (JPEG/WEBP quality is bisected to fit it), progressive JPEG.
+IMG_VARIANTS = {
+    "bluesky": {"format": "JPEG", "max_bytes": 1000000, "progressive": True},
+    "instagram": {"size": (1080, 1350), "format": "JPEG", "max_bytes": 8388608},
+    "mastodon": {"format": "PNG", "max_bytes": 16777216},
+    "x": {"format": "PNG", "max_bytes": 5242880},
+}
+
+# Text layout: base font size search range (attribution drawn at 3/4),
+# margin as a fraction of the image width, gap between blocks as a
+# fraction of the base font size.
+LAYOUT_SIZE_RANGE = (16, 48)
+LAYOUT_MARGIN = 0.08
+LAYOUT_GAP = 1.0
+
+# Size cap of the rendered image cache directory (256 MB).
+RENDER_CACHE_MAX_BYTES = 268435456
+
+# Background templates kept in memory, size cap of their disk cache (64 MB).
+TEMPLATE_CACHE_SIZE = 8
+TEMPLATE_CACHE_MAX_BYTES = 67108864
+
+# Quotes per task of the batch renderer.
+RENDER_BATCH_SIZE = 64
+
+# Fonts kept loaded by the process-wide font cache (path, size, variant).
+FONT_CACHE_SIZE = 32
+
 
 # Print on accidental run:
 if __name__ == "__main__":
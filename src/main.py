@@ -9,19 +9,26 @@ TODO: 1. Steadily add to database.
 """
 
 # Imports from built-in modules:
+import asyncio
+import json
 import logging
-from os import remove as os_remove
-from os.path import exists as os_exists
+from sys import exit as sys_exit
 
 # Imports from external packages:
 from yaml import safe_load
 
 # Imports from local modules:
-from backend.multith_func import threaded_login, threaded_posting
+from backend.async_func import publish, run_summary
+from backend.cache_func import RenderCache
+from backend.conn_func import close_connections
 from backend.post_func import assemble_posts
+from backend.session_func import SessionStore
+from backend.variant_func import variant_specs
 from config.path_constants import (DB_FILE, GENTIUM_REG_TTF, GENTIUM_BOLD_TTF,
-                                   LOGIN_KEYS, TEMP_POST_IMG)
-from config.settings import IMG_SIZE, IMG_BG_COLOR, IMG_TEXT_COLOR
+                                   LOGIN_KEYS, RENDER_CACHE_DIR, RUN_REPORT_FILE,
+                                   STATE_DB_FILE)
+from config.settings import (IMG_SIZE, IMG_BG_COLOR, IMG_TEXT_COLOR, IMG_VARIANTS,
+                             RENDER_CACHE_MAX_BYTES)
 
 
 # Metadata variables:
@@ -69,26 +76,41 @@ def main():
     except (FileNotFoundError, PermissionError) as e:
         logger.critical("Failed to load authentication keys: %s", e)
         return 1
-    # Authenticate APIs concurrently.
-    bs_cl, in_cl, mt_api, x_api, x_cl = threaded_login(keys)
-    # Assemble posts.
-    text_post, image_post = assemble_posts(DB_FILE, IMG_SIZE, IMG_BG_COLOR, IMG_TEXT_COLOR,
-                                           GENTIUM_REG_TTF, GENTIUM_BOLD_TTF)
-    # Temporarily save image post jpeg.
-    image_post.save_image(TEMP_POST_IMG)
-    # Post concurrently.
-    threaded_posting(bs_cl, in_cl, mt_api, x_api, x_cl,
-                     text_post, image_post)
-    # Remove temp image with error handling,
-    if os_exists(TEMP_POST_IMG):
-        try:
-            os_remove(TEMP_POST_IMG)
-        except OSError as e:
-            logger.error("Failed to remove temporary image: %s", e)
+    # Log in while the posts are assembled, post as soon as ready.
+    summary = run_summary(asyncio.run(publish(keys, prepare_posts, store=SessionStore())))
+    # Close database connections.
+    close_connections(shutdown=True)
+    # Store the per-platform summary for monitoring.
+    try:
+        RUN_REPORT_FILE.parent.mkdir(parents=True, exist_ok=True)
+        RUN_REPORT_FILE.write_text(json.dumps(summary, indent=2), encoding="utf-8")
+    except OSError as e:
+        logger.error("Failed to write run report: %s", e)
+    if not summary["ok"]:
+        logger.error("Process completed with failures")
+        return 1
     logger.info("Process completed")
     return 0
 
 
+def prepare_posts():
+    """
+    Select the quote, assemble the posts and encode the image variants.
+
+    Returns:
+        text_post, image_post: TextPost and ImagePost objects.
+    """
+    # Images from the render cache when available.
+    render_cache = RenderCache(RENDER_CACHE_DIR, RENDER_CACHE_MAX_BYTES)
+    text_post, image_post = assemble_posts(DB_FILE, IMG_SIZE, IMG_BG_COLOR, IMG_TEXT_COLOR,
+                                           GENTIUM_REG_TTF, GENTIUM_BOLD_TTF,
+                                           state_file=STATE_DB_FILE,
+                                           render_cache=render_cache)
+    # Encode the per-platform image variants once, in memory.
+    image_post.encode_variants(variant_specs(IMG_VARIANTS))
+    return text_post, image_post
+
+
 # Launch main function.
 if __name__ == "__main__":
-    main()
+    sys_exit(main())
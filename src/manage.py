@@ -0,0 +1,219 @@
+"""
+manage.py
+
+Command line maintenance tasks for the "Ancient Wisdom Daily" project.
+
+Usage: python manage.py <command> [options]
+    import: import quotes from a .csv or .json file into the database.
+    search: full-text search of the quotes.
+    schedule: reserve the quotes of the next N days, list the queue.
+    render: render quote images in parallel (review, render cache warm-up).
+    glyphs: report characters the image fonts cannot draw.
+
+Part of the "Ancient Wisdom Daily" project by OperaVaria.
+"""
+
+# Imports from built-in modules:
+import argparse
+import logging
+import sqlite3
+from sys import exit as sys_exit
+
+# Imports from local modules:
+from backend.conn_func import close_connections
+from backend.db_func import schedule_list, schedule_reserve
+from backend.glyph_func import check_corpus
+from backend.import_func import import_file
+from backend.render_func import render_corpus
+from backend.search_func import FTS_COLUMNS, search_wisdoms
+from config.path_constants import (DB_FILE, GENTIUM_BOLD_TTF, GENTIUM_REG_TTF,
+                                   RENDER_CACHE_DIR, STATE_DB_FILE)
+from config.settings import (DB_DEFAULT_CHANNEL, DB_SELECT_MODE, IMG_BG_COLOR,
+                             IMG_SIZE, IMG_TEXT_COLOR, IMPORT_BATCH_SIZE,
+                             RENDER_CACHE_MAX_BYTES)
+
+# Setup logging:
+logger = logging.getLogger(__name__)
+
+
+def import_command(args):
+    """
+    Run the import subcommand.
+
+    Args:
+        args: parsed argparse Namespace.
+
+    Returns:
+        Exit code.
+    """
+    try:
+        import_file(args.db, args.file, args.batch_size)
+    except (OSError, ValueError, KeyError, sqlite3.Error) as e:
+        logger.critical("Import failed: %s", e)
+        return 1
+    return 0
+
+
+def search_command(args):
+    """
+    Run the search subcommand, print matching quotes.
+
+    Args:
+        args: parsed argparse Namespace.
+
+    Returns:
+        Exit code.
+    """
+    try:
+        wis_list = search_wisdoms(args.db, " ".join(args.query),
+                                  args.limit, args.column)
+    except sqlite3.Error as e:
+        logger.critical("Search failed: %s", e)
+        return 1
+    for wis_obj in wis_list:
+        print(f"{wis_obj.id}: {wis_obj.original} / {wis_obj.attribution}, {wis_obj.locus}")
+    return 0
+
+
+def schedule_command(args):
+    """
+    Run the schedule subcommand: reserve quotes for the next N days
+    (if requested), then print the channel's upcoming queue.
+
+    Args:
+        args: parsed argparse Namespace.
+
+    Returns:
+        Exit code.
+    """
+    try:
+        if args.days > 0:
+            schedule_reserve(args.db, args.days, args.mode,
+                             args.state, args.channel)
+        upcoming = schedule_list(args.db, args.state, args.channel)
+    except (ValueError, sqlite3.Error) as e:
+        logger.critical("Scheduling failed: %s", e)
+        return 1
+    for post_date, wis_obj in upcoming:
+        print(f"{post_date} {wis_obj.id}: {wis_obj.original} / {wis_obj.attribution}")
+    return 0
+
+
+def render_command(args):
+    """
+    Run the render subcommand.
+
+    Args:
+        args: parsed argparse Namespace.
+
+    Returns:
+        Exit code.
+    """
+    image_settings = (IMG_SIZE, IMG_BG_COLOR, IMG_TEXT_COLOR,
+                      GENTIUM_REG_TTF, GENTIUM_BOLD_TTF)
+    cache_settings = None if args.no_cache else (RENDER_CACHE_DIR, RENDER_CACHE_MAX_BYTES)
+    try:
+        render_corpus(args.db, image_settings, args.out, cache_settings,
+                      args.ids, args.author, args.workers)
+    except (OSError, ValueError, sqlite3.Error) as e:
+        logger.critical("Rendering failed: %s", e)
+        return 1
+    return 0
+
+
+def glyphs_command(args):
+    """
+    Run the glyphs subcommand: check the corpus against the glyph
+    coverage of the image fonts, print the missing characters.
+
+    Args:
+        args: parsed argparse Namespace.
+
+    Returns:
+        Exit code: 1 if characters are missing.
+    """
+    try:
+        issues = check_corpus(args.db)
+    except (OSError, ValueError, sqlite3.Error) as e:
+        logger.critical("Glyph check failed: %s", e)
+        return 1
+    for issue in issues:
+        print(f"{issue.id} {issue.field}: {issue.chars} ({' '.join(issue.codepoints)})")
+    logger.info("%d fields with missing glyphs", len(issues))
+    return 1 if issues else 0
+
+
+def build_parser():
+    """
+    Build the command line argument parser.
+
+    Returns:
+        parser: argparse ArgumentParser object.
+    """
+    parser = argparse.ArgumentParser(description="Ancient Wisdom Daily maintenance tasks")
+    parser.add_argument("--db", default=DB_FILE, help="database file (default: %(default)s)")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    # Import.
+    import_parser = subparsers.add_parser("import", help="import a .csv or .json file")
+    import_parser.add_argument("file", help="path to the .csv or .json file")
+    import_parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE,
+                               help="rows per transaction (default: %(default)s)")
+    import_parser.set_defaults(func=import_command)
+    # Search.
+    search_parser = subparsers.add_parser("search", help="full-text search of the quotes")
+    search_parser.add_argument("query", nargs="+", help="keywords")
+    search_parser.add_argument("--limit", type=int, default=10,
+                               help="maximum number of results (default: %(default)s)")
+    search_parser.add_argument("--column", choices=FTS_COLUMNS,
+                               help="search a single column only")
+    search_parser.set_defaults(func=search_command)
+    # Schedule.
+    schedule_parser = subparsers.add_parser("schedule",
+                                            help="reserve upcoming quotes, list the queue")
+    schedule_parser.add_argument("--days", type=int, default=0,
+                                 help="days to reserve after the last scheduled one "
+                                      "(default: %(default)s, list only)")
+    schedule_parser.add_argument("--mode", choices=("random", "deck"), default=DB_SELECT_MODE,
+                                 help="selection mode (default: %(default)s)")
+    schedule_parser.add_argument("--state", default=STATE_DB_FILE,
+                                 help="state database file (default: %(default)s)")
+    schedule_parser.add_argument("--channel", default=DB_DEFAULT_CHANNEL,
+                                 help="channel to schedule for (default: %(default)s)")
+    schedule_parser.set_defaults(func=schedule_command)
+    # Render.
+    render_parser = subparsers.add_parser("render", help="render quote images in parallel")
+    render_parser.add_argument("--out", help="directory to write <id>.jpg files to")
+    render_parser.add_argument("--no-cache", action="store_true",
+                               help="do not read or fill the render cache")
+    render_parser.add_argument("--ids", nargs="+", help="only render these quote ids")
+    render_parser.add_argument("--author", help="only render quotes by matching authors")
+    render_parser.add_argument("--workers", type=int,
+                               help="worker processes (default: one per core)")
+    render_parser.set_defaults(func=render_command)
+    # Glyphs.
+    glyphs_parser = subparsers.add_parser("glyphs",
+                                          help="report characters the image fonts cannot draw")
+    glyphs_parser.set_defaults(func=glyphs_command)
+    return parser
+
+
+def manage():
+    """
+    Main function of the maintenance tool.
+
+    Returns:
+        Exit code.
+    """
+    # Configure logging.
+    logging.basicConfig(
+    format="%(asctime)s : %(levelname)s : %(message)s.", level=logging.INFO
+    )
+    args = build_parser().parse_args()
+    exit_code = args.func(args)
+    close_connections(shutdown=True)
+    return exit_code
+
+
+# Launch maintenance tool.
+if __name__ == "__main__":
+    sys_exit(manage())
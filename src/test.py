@@ -17,6 +17,7 @@ from pick import pick
 # Imports from local modules:
 import testing.api_test as api_tests
 import testing.db_test as db_tests
+import testing.import_test as import_tests
 import testing.class_test as class_tests
 import testing.post_test as post_tests
 import testing.workflow_test as workflow_tests
@@ -47,7 +48,8 @@ def test_menu():
     # Menu variables.
     title = "Ancient Wisdom Bot 2.1.0 Unittest\n\nSelect functionality to test:"
     options = ["1. Database operations", "2. Class instantiation", "3. Assembling posts",
-               "4. API requests", "5. Workflow integration", "6. Exit"]
+               "4. API requests", "5. Workflow integration", "6. Importing quote files",
+               "7. Exit"]
 
     # Menu loop.
     while True:
@@ -63,7 +65,9 @@ def test_menu():
                 run_tests(api_tests)
             case 4: # Workflow
                 run_tests(workflow_tests)
-            case 5: # Exit (break loop)
+            case 5: # Import
+                run_tests(import_tests)
+            case 6: # Exit (break loop)
                 break
             case _:  # Incorrect selection (should not happen).
                 # Logs critical error. Exits with error code: 1.
@@ -7,6 +7,10 @@ Part of the "Ancient Wisdom Daily" project by OperaVaria.
 """
 
 # Imports from built-in modules:
+import asyncio
+import base64
+import json
+import time
 from pathlib import Path
 from unittest import TestCase
 from unittest.mock import MagicMock, create_autospec, patch
@@ -19,8 +23,11 @@ from tweepy.errors import Forbidden
 
 # Imports from local modules:
 from backend.classes import TextPost, ImagePost
-from backend.multith_func import threaded_login
+from backend.async_func import post_all, publish, run_summary
+from backend.auth_func import bluesky_login_async
 from backend.post_func import bluesky_post, mastodon_post, x_post
+from backend.session_func import KEY_VARIABLE, SessionStore, fingerprint
+from config.path_constants import TEMP_DIR
 
 
 
@@ -100,17 +107,42 @@ class APITests(TestCase):
         self.mock_client.media_upload.assert_called_once()
         self.assertEqual(result, {"ok": True})
 
-    @patch('backend.multith_func.bluesky_login')
-    @patch('backend.multith_func.insta_login')
-    @patch('backend.multith_func.mastodon_login')
-    @patch('backend.multith_func.x_auth')
-    def test_threaded_login(self, mock_x_auth, mock_mastodon_login,
-                        mock_insta_login, mock_bluesky_login):
+    def test_long_text_skips_text_post(self):
+        """Test that texts over the local length limit are posted as images directly."""
+
+        # Text too long for every platform.
+        self.mock_text_post.fits.return_value = False
+        self.mock_client.media_post.return_value = {"id": 1}
+
+        # Call functions.
+        bluesky_post(self.mock_client, self.mock_image_post, self.mock_text_post)
+        mastodon_post(self.mock_client, self.mock_image_post, self.mock_text_post)
+        x_post(self.mock_client, self.mock_client, self.mock_image_post, self.mock_text_post)
+
+        # Assert: no text post round trips, one image post each.
+        self.mock_client.send_post.assert_not_called()
+        self.mock_client.send_image.assert_called_once()
+        self.mock_client.status_post.assert_called_once_with(
+            status=self.mock_text_post.comment_text, media_ids=[1], visibility="public")
+        media_id = self.mock_client.media_upload.return_value.media_id
+        self.mock_client.create_tweet.assert_called_once_with(
+            text=self.mock_text_post.comment_text, media_ids=[media_id])
+
+    @patch('backend.async_func.x_post', return_value="x_res")
+    @patch('backend.async_func.mastodon_post', return_value="mastodon_res")
+    @patch('backend.async_func.insta_post', return_value="insta_res")
+    @patch('backend.async_func.bluesky_post_async', return_value="bs_res")
+    @patch('backend.async_func.bluesky_login_async')
+    @patch('backend.async_func.insta_login')
+    @patch('backend.async_func.mastodon_login')
+    @patch('backend.async_func.x_auth')
+    def test_async_login(self, mock_x_auth, mock_mastodon_login,
+                        mock_insta_login, mock_bluesky_login, *mock_posts):
         """Test concurrent login functionality."""
 
         # Mock constants that are used in the function.
-        with patch('backend.multith_func.INSTA_SESSION', 'mock_session'), \
-            patch('backend.multith_func.INSTA_DELAY_RANGE', 'mock_delay'):
+        with patch('backend.async_func.INSTA_SESSION', 'mock_session'), \
+            patch('backend.async_func.INSTA_DELAY_RANGE', 'mock_delay'):
 
             # Setup mock returns.
             mock_bluesky_login.return_value = "bs_client"
@@ -127,14 +159,20 @@ class APITests(TestCase):
             }
 
             # Call function.
-            result = threaded_login(keys)
-
-            # Assert.
-            self.assertEqual(result, ("bs_client", "insta_client", "mastodon_api",
-                                      "x_api", "x_client"))
+            results = asyncio.run(publish(
+                keys, lambda: (self.mock_text_post, self.mock_image_post)))
+
+            # Assert: each platform posted with its own login's client.
+            self.assertEqual([result.response for result in results],
+                             ["bs_res", "insta_res", "mastodon_res", "x_res"])
+            for mock_post, client in zip(mock_posts, ("bs_client", "insta_client",
+                                                      "mastodon_api", "x_api")):
+                self.assertEqual(mock_post.call_args.args[0], client)
+            self.assertEqual(mock_posts[3].call_args.args[1], "x_client")
             mock_bluesky_login.assert_called_once_with(
                 keys["bluesky"]["handle"],
-                keys["bluesky"]["password"]
+                keys["bluesky"]["password"],
+                store=None
             )
             mock_insta_login.assert_called_once_with(
                 keys["instagram"]["username"],
@@ -144,10 +182,152 @@ class APITests(TestCase):
             )
             mock_mastodon_login.assert_called_once_with(
                 keys["mastodon"]["access_token"],
-                keys["mastodon"]["api_base_uri"]
+                keys["mastodon"]["api_base_uri"],
+                store=None
             )
-            mock_x_auth.assert_called_once_with(keys["x"])
+            mock_x_auth.assert_called_once_with(keys["x"], store=None)
+
+    @patch('backend.async_func.x_post')
+    @patch('backend.async_func.mastodon_post')
+    @patch('backend.async_func.insta_post')
+    @patch('backend.async_func.bluesky_post_async')
+    def test_post_timeout(self, mock_bluesky_post, mock_insta_post,
+                          mock_mastodon_post, mock_x_post):
+        """Test that a slow platform times out without holding up the others."""
+
+        async def slow_post(*_):
+            await asyncio.sleep(10)
+
+        # Setup mock returns: Bluesky hangs.
+        mock_bluesky_post.side_effect = slow_post
+        mock_insta_post.return_value = "insta_res"
+        mock_mastodon_post.return_value = "mastodon_res"
+        mock_x_post.return_value = "x_res"
+
+        # Call function, assert.
+        with self.assertLogs("backend.async_func", "INFO") as logs:
+            results = asyncio.run(post_all(*[MagicMock()] * 7, timeout=0.2))
+        self.assertEqual([result.platform for result in results],
+                         ["Bluesky", "Instagram", "Mastodon", "X"])
+        self.assertEqual(results[0].error, "TimeoutError")
+        self.assertEqual(results[0].stage, "posting")
+        self.assertEqual([result.response for result in results[1:]],
+                         ["insta_res", "mastodon_res", "x_res"])
+        # The others are reported before the slow one.
+        self.assertIn("Bluesky failed at posting", logs.output[-1])
+        mock_insta_post.assert_called_once()
+        mock_mastodon_post.assert_called_once()
+        mock_x_post.assert_called_once()
+
+    @patch('backend.async_func.x_post', return_value="x_res")
+    @patch('backend.async_func.mastodon_post')
+    @patch('backend.async_func.insta_post', return_value="insta_res")
+    @patch('backend.async_func.bluesky_post_async', return_value="bs_res")
+    @patch('backend.async_func.x_auth', return_value=("x_api", "x_client"))
+    @patch('backend.async_func.mastodon_login', side_effect=MastodonAPIError("denied"))
+    @patch('backend.async_func.insta_login', return_value="insta_client")
+    @patch('backend.async_func.bluesky_login_async')
+    def test_publish_pipeline(self, mock_bluesky_login, *mocks):
+        """Test that posts are prepared during logins, a failed login skips only its platform."""
+        mock_mastodon_post = mocks[5]
+        events = []
+
+        async def slow_login(*_, **__):
+            await asyncio.sleep(0.3)
+            events.append("login")
+            return "bs_client"
+
+        def prepare():
+            events.append("prepare")
+            return self.mock_text_post, self.mock_image_post
 
+        # Call function.
+        mock_bluesky_login.side_effect = slow_login
+        keys = {"bluesky": {"handle": "test", "password": "test"},
+                "instagram": {"username": "test", "password": "test"},
+                "mastodon": {"access_token": "test", "api_base_uri": "test"},
+                "x": {}}
+        summary = run_summary(asyncio.run(publish(keys, prepare)))
+
+        # Assert: prepared while logging in, others posted, temp files removed.
+        self.assertEqual(events, ["prepare", "login"])
+        self.assertFalse(summary["ok"])
+        self.assertEqual(summary["platforms"]["Mastodon"]["stage"], "login")
+        self.assertEqual(summary["platforms"]["Mastodon"]["error"], "MastodonAPIError: denied")
+        self.assertEqual([name for name, result in summary["platforms"].items() if result["ok"]],
+                         ["Bluesky", "Instagram", "X"])
+        for mock_post in (mocks[3], mocks[4], mocks[6]):
+            mock_post.assert_called_once()
+        mock_mastodon_post.assert_not_called()
+        self.mock_image_post.discard_file.assert_called_once()
+
+    def test_session_store(self):
+        """Test that stored sessions are encrypted, bound to their credentials and expire."""
+        store_file = TEMP_DIR.joinpath("session_store.json")
+        key_file = TEMP_DIR.joinpath("session.key")
+        self.addCleanup(store_file.unlink, missing_ok=True)
+        self.addCleanup(key_file.unlink, missing_ok=True)
+        store = SessionStore(store_file, key_file, ttl=60, refresh_age=30)
+        owner = fingerprint("handle", "password")
+
+        # Round trip, encrypted at rest.
+        store.put("bluesky", owner, {"session": "secret session"})
+        self.assertEqual(store.get("bluesky", owner), {"session": "secret session"})
+        self.assertNotIn("secret", store_file.read_text(encoding="utf-8"))
+        self.assertFalse(store.stale("bluesky"))
+        # Other credentials, another key, expiry.
+        self.assertIsNone(store.get("bluesky", fingerprint("handle", "new password")))
+        self.assertIsNone(SessionStore(store_file, TEMP_DIR.joinpath("other.key"))
+                          .get("bluesky", owner))
+        TEMP_DIR.joinpath("other.key").unlink()
+        with patch("cryptography.fernet.time.time", return_value=time.time() + 45):
+            self.assertTrue(store.stale("bluesky"))
+            self.assertIsNotNone(store.get("bluesky", owner))
+        with patch("cryptography.fernet.time.time", return_value=time.time() + 90):
+            self.assertIsNone(store.get("bluesky", owner))
+        store.drop("bluesky")
+        self.assertIsNone(store.get("bluesky", owner))
+
+    @patch('atproto.AsyncClient.login')
+    def test_bluesky_session_resume(self, mock_login):
+        """Test that a stored Bluesky session is resumed without any request."""
+        store_file = TEMP_DIR.joinpath("session_store.json")
+        key_file = TEMP_DIR.joinpath("session.key")
+        self.addCleanup(store_file.unlink, missing_ok=True)
+        self.addCleanup(key_file.unlink, missing_ok=True)
+        store = SessionStore(store_file, key_file)
+
+        # Unsigned test tokens, valid for an hour.
+        payload = base64.urlsafe_b64encode(json.dumps(
+            {"exp": int(time.time()) + 3600, "sub": "did:plc:test"}).encode()).decode().rstrip("=")
+        jwt = f"e30.{payload}.sig"
+        session = f"test.bsky.social:::did:plc:test:::{jwt}:::{jwt}:::https://bsky.social"
+        store.put("bluesky", fingerprint("test", "test"), {"session": session})
+
+        # Call function, assert: resumed, no login.
+        bs_cl = asyncio.run(bluesky_login_async("test", "test", store))
+        mock_login.assert_not_called()
+        self.assertEqual(bs_cl.me.did, "did:plc:test")
+
+
+    @patch('atproto.AsyncClient.login')
+    def test_invalid_session_key(self, mock_login):
+        """Test that an invalid session key falls back to a fresh login."""
+        store_file = TEMP_DIR.joinpath("session_store.json")
+        self.addCleanup(store_file.unlink, missing_ok=True)
+
+        # Call function with a malformed key in the environment.
+        with patch.dict("os.environ", {KEY_VARIABLE: "not a key"}), \
+                self.assertLogs("backend.session_func", level="ERROR"):
+            store = SessionStore(store_file, TEMP_DIR.joinpath("unused.key"))
+            store.put("bluesky", fingerprint("test", "test"), {"session": "session"})
+            asyncio.run(bluesky_login_async("test", "test", store))
+
+        # Assert.
+        mock_login.assert_awaited_once_with("test", "test")
+        self.assertTrue(store.stale("bluesky"))
+        self.assertFalse(store_file.exists())
+        self.assertFalse(TEMP_DIR.joinpath("unused.key").exists())
 
 # Print on accidental run:
 if __name__ == "__main__":
@@ -0,0 +1,306 @@
+"""
+benchmark.py
+
+Rendering benchmark: times the image pipeline (layout, create_image,
+encode, save_image, open_bin) over every quote of the database and
+over synthetic short, long and polytonic-heavy quotes. Reports p50/p95
+latency and peak traced memory per stage as JSON and compares them
+with a stored baseline: a regression exits with code 1.
+
+Run from the src directory:
+    python -m testing.benchmark [--out FILE] [--save-baseline]
+
+Part of the "Ancient Wisdom Daily" project by OperaVaria.
+"""
+
+# Imports from built-in modules:
+import argparse
+import json
+import logging
+import platform
+import sqlite3
+import sys
+import tracemalloc
+from contextlib import suppress
+from os import remove
+from pathlib import Path
+from time import perf_counter
+
+# Imports from local modules:
+from backend.classes import ImagePost, Wisdom
+from backend.layout_func import fit_layout
+from config.path_constants import (DB_FILE, GENTIUM_REG_TTF, GENTIUM_BOLD_TTF,
+                                   SRC_DIR, TEMP_POST_IMG)
+from config.settings import IMG_SIZE, IMG_BG_COLOR, IMG_TEXT_COLOR
+
+# Setup logging.
+logger = logging.getLogger(__name__)
+
+# Stored baseline results.
+BASELINE_FILE = SRC_DIR.joinpath("testing/benchmark_baseline.json")
+
+# Allowed slowdown over the baseline, as a factor, and absolute slack
+# in milliseconds for stages too fast to time steadily.
+TOLERANCE = 1.5
+SLACK_MS = 0.5
+
+# Quotes per dataset traced for peak memory (tracing slows timing down).
+MEMORY_SAMPLE = 3
+
+# Synthetic quotes: the layout extremes.
+SYNTHETIC = {
+    "short": ("Carpe diem.", "Seize the day.", "Horace", "Carm. 1.11.8"),
+    "long": (
+        " ".join(["Quid autem est tam ridiculum quam, cum de rebus maximis "
+                  "disputetur, verba captare et syllabas aucupari?"] * 4),
+        " ".join(["What is so ridiculous as, when the greatest matters are "
+                  "discussed, to catch at words and hunt for syllables?"] * 4),
+        "Marcus Tullius Cicero, consul and philosopher of the Roman Republic",
+        "De Officiis 1.22.74-76, with a long locus note"),
+    "polytonic": (
+        " ".join(["Ἐν ἀρχῇ ἦν ὁ λόγος, καὶ ὁ λόγος ἦν πρὸς τὸν θεόν· "
+                  "ᾧ ᾔδειν ὑΐος ῥήτωρ ἐῤῥωμένος ᾄδει;"] * 3),
+        "In the beginning was the word, and the word was with god.",
+        "Ἰωάννης ὁ Θεολόγος",
+        "Εὐαγγέλιον 1.1"),
+}
+
+# Stages timed, in pipeline order.
+STAGES = ("layout", "create_image", "encode", "save_image", "open_bin")
+
+
+def corpus_quotes(db_file=DB_FILE):
+    """
+    Read every quote of the database, read-only.
+
+    Args:
+        db_file: Path to database file.
+
+    Returns:
+        quotes(list[Wisdom]): Wisdom objects.
+    """
+    con = sqlite3.connect(f"file:{db_file}?mode=ro", uri=True)
+    try:
+        rows = con.execute("SELECT id_title, quote_orig, quote_eng, attrib_to, locus, "
+                           "locus_form, comment, used FROM wisdoms").fetchall()
+    finally:
+        con.close()
+    return [Wisdom(*row) for row in rows]
+
+
+def synthetic_quotes():
+    """
+    Returns:
+        datasets(dict): {name: [Wisdom]} of the synthetic quotes.
+    """
+    return {name: [Wisdom(f"synthetic_{name}", original, translation,
+                          attribution, locus, locus, "", False)]
+            for name, (original, translation, attribution, locus) in SYNTHETIC.items()}
+
+
+def run_benchmark(datasets, repeat=1):
+    """
+    Time every stage over every quote of the datasets, then trace
+    peak memory over a sample of them.
+
+    Args:
+        datasets(dict): {name: [Wisdom]}.
+        repeat(int): passes over each dataset.
+
+    Returns:
+        results(dict): {dataset: {stage: {"n", "p50_ms", "p95_ms", "peak_kib"}}}.
+    """
+    results = {}
+    for name, quotes in datasets.items():
+        timings = {stage: [] for stage in STAGES}
+        for _ in range(repeat):
+            for wis_obj in quotes:
+                for stage, seconds in _time_stages(wis_obj).items():
+                    timings[stage].append(seconds * 1000)
+        peaks = _trace_peaks(quotes[:MEMORY_SAMPLE])
+        results[name] = {stage: {"n": len(values),
+                                 "p50_ms": round(_percentile(values, 50), 3),
+                                 "p95_ms": round(_percentile(values, 95), 3),
+                                 "peak_kib": peaks[stage]}
+                         for stage, values in timings.items()}
+    return results
+
+
+def compare(results, baseline, tolerance=TOLERANCE, slack_ms=SLACK_MS):
+    """
+    Compare results with a baseline, stage by stage.
+
+    Args:
+        results, baseline(dict): run_benchmark results.
+        tolerance(float): allowed slowdown factor.
+        slack_ms(float): allowed absolute slowdown in milliseconds.
+
+    Returns:
+        regressions(list[str]): descriptions, empty if none.
+    """
+    regressions = []
+    for name, stages in results.items():
+        for stage, current in stages.items():
+            previous = baseline.get(name, {}).get(stage)
+            if previous is None:
+                continue
+            for metric in ("p50_ms", "p95_ms"):
+                limit = previous[metric] * tolerance + slack_ms
+                if current[metric] > limit:
+                    regressions.append(f"{name}/{stage} {metric}: {current[metric]:.3f} "
+                                       f"> {limit:.3f} (baseline {previous[metric]:.3f})")
+    return regressions
+
+
+def _new_post(wis_obj):
+    """
+    Helper function. Create an uncached ImagePost.
+
+    Args:
+        wis_obj: Wisdom object.
+
+    Returns:
+        ImagePost object.
+    """
+    return ImagePost(wis_obj, IMG_SIZE, IMG_BG_COLOR, IMG_TEXT_COLOR,
+                     GENTIUM_REG_TTF, GENTIUM_BOLD_TTF)
+
+
+def _steps(image_post, wis_obj):
+    """
+    Helper function. The stages of one render, each starting from the
+    previous one's result: call them in order.
+
+    Args:
+        image_post: new ImagePost object.
+        wis_obj: its Wisdom object.
+
+    Returns:
+        steps(dict): {stage: function}.
+    """
+    return {
+        "layout": lambda: fit_layout(image_post.text_blocks(wis_obj), IMG_SIZE),
+        # First access draws the image (create_image).
+        "create_image": lambda: image_post.image,
+        "encode": image_post.encode,
+        "save_image": lambda: image_post.save_image(TEMP_POST_IMG),
+        "open_bin": image_post.open_bin,
+    }
+
+
+def _time_stages(wis_obj):
+    """
+    Helper function for run_benchmark. Time each stage once.
+
+    Args:
+        wis_obj: Wisdom object.
+
+    Returns:
+        seconds(dict): {stage: seconds}.
+    """
+    seconds = {}
+    for stage, step in _steps(_new_post(wis_obj), wis_obj).items():
+        start = perf_counter()
+        step()
+        seconds[stage] = perf_counter() - start
+    with suppress(FileNotFoundError):
+        remove(TEMP_POST_IMG)
+    return seconds
+
+
+def _trace_peaks(quotes):
+    """
+    Helper function for run_benchmark. Trace the peak memory allocated
+    by each stage.
+
+    Args:
+        quotes(list[Wisdom]): Wisdom objects.
+
+    Returns:
+        peaks(dict): {stage: largest peak in KiB}.
+    """
+    peaks = dict.fromkeys(STAGES, 0)
+    tracemalloc.start()
+    try:
+        for wis_obj in quotes:
+            for stage, step in _steps(_new_post(wis_obj), wis_obj).items():
+                tracemalloc.reset_peak()
+                before = tracemalloc.get_traced_memory()[0]
+                step()
+                peak = (tracemalloc.get_traced_memory()[1] - before) // 1024
+                peaks[stage] = max(peaks[stage], peak)
+    finally:
+        tracemalloc.stop()
+        with suppress(FileNotFoundError):
+            remove(TEMP_POST_IMG)
+    return peaks
+
+
+def _percentile(values, percent):
+    """
+    Helper function for run_benchmark. Nearest-rank percentile.
+
+    Args:
+        values(list[float]): samples.
+        percent(int): 0-100.
+
+    Returns:
+        value(float): percentile, 0.0 without samples.
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * percent // 100))
+    return ordered[rank - 1]
+
+
+def main(argv=None):
+    """
+    Command line entry point.
+
+    Args:
+        argv(list[str]): arguments, None for sys.argv.
+
+    Returns:
+        Exit code: 1 on a regression.
+    """
+    logging.basicConfig(
+    format="%(asctime)s : %(levelname)s : %(message)s.", level=logging.INFO
+    )
+    parser = argparse.ArgumentParser(description="Rendering benchmark.")
+    parser.add_argument("--out", type=Path, help="write the JSON report here")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_FILE)
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="store the results as the new baseline")
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    args = parser.parse_args(argv)
+    TEMP_POST_IMG.parent.mkdir(parents=True, exist_ok=True)
+    datasets = {"corpus": corpus_quotes(), **synthetic_quotes()}
+    # Warm up font and template caches: time steady-state renders.
+    _time_stages(datasets["short"][0])
+    report = {"python": platform.python_version(), "machine": platform.machine(),
+              "results": run_benchmark(datasets, args.repeat)}
+    output = json.dumps(report, indent=2)
+    if args.out is not None:
+        args.out.write_text(output, encoding="utf-8")
+    else:
+        print(output)
+    if args.save_baseline:
+        args.baseline.write_text(output, encoding="utf-8")
+        logger.info("Baseline saved: %s", args.baseline)
+        return 0
+    try:
+        baseline = json.loads(args.baseline.read_text(encoding="utf-8"))["results"]
+    except FileNotFoundError:
+        logger.warning("No baseline file at %s, nothing to compare", args.baseline)
+        return 0
+    regressions = compare(report["results"], baseline, args.tolerance)
+    for regression in regressions:
+        logger.error("Render regression: %s", regression)
+    return 1 if regressions else 0
+
+
+# Run benchmark.
+if __name__ == "__main__":
+    sys.exit(main())
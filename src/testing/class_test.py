@@ -7,13 +7,31 @@ Part of the "Ancient Wisdom Daily" project by OperaVaria.
 """
 
 # Imports from built-in modules:
+import sqlite3
+from contextlib import closing, suppress
+from io import BytesIO
 from os import path, remove
+from shutil import copyfile, rmtree
 from unittest import TestCase
+from unittest.mock import patch
+
+# Imports from external packages:
+from PIL import Image
 
 # Imports from local modules:
+from backend.cache_func import RenderCache
 from backend.classes import Wisdom, ImagePost, TextPost
-from config.path_constants import GENTIUM_REG_TTF, GENTIUM_BOLD_TTF, TEMP_DIR
-from config.settings import IMG_SIZE, IMG_BG_COLOR, IMG_TEXT_COLOR
+from backend.render_func import render_corpus
+from backend.font_func import clear_font_cache, font_cache_info, load_font
+from backend.layout_func import TextBlock, fit_layout, line_height, text_width
+from backend.conn_func import close_connections
+from backend.procedural_func import gradient, seed_from, texture
+from backend.template_func import Background, clear_template_cache, load_background
+from backend.variant_func import variant_specs
+from testing.benchmark import STAGES, compare, run_benchmark, synthetic_quotes
+from config.path_constants import (DB_FILE, GENTIUM_REG_TTF, GENTIUM_BOLD_TTF, TEMP_DIR,
+                                   TEMP_DB_COPY)
+from config.settings import IMG_SIZE, IMG_BG_COLOR, IMG_TEXT_COLOR, IMG_VARIANTS
 
 
 class ClassTests(TestCase):
@@ -98,17 +116,259 @@ class ClassTests(TestCase):
         self.assertIsNotNone(image_post.image)
         self.assertEqual(image_post.image.size, IMG_SIZE)
 
-    def test_image_post_path_error(self):
-        """Test error handling when trying to open binary before saving image."""
+    def test_font_cache_reuse(self):
+        """Test if fonts are loaded once and shared between ImagePosts."""
+
+        # Create two instances with an empty cache.
+        clear_font_cache()
+        wisdom = Wisdom(*self.test_data)
+        infos = []
+        for _ in range(2):
+            self.assertIsNotNone(ImagePost(wisdom, IMG_SIZE, IMG_BG_COLOR, IMG_TEXT_COLOR,
+                                           GENTIUM_REG_TTF, GENTIUM_BOLD_TTF).image)
+            infos.append(font_cache_info())
+
+        # Assert: fonts parsed once, served from cache the second time.
+        self.assertGreater(infos[0].misses, 0)
+        self.assertEqual(infos[1].misses, infos[0].misses)
+        self.assertGreater(infos[1].hits, infos[0].hits)
+        self.assertIs(load_font(GENTIUM_REG_TTF, 40), load_font(str(GENTIUM_REG_TTF), 40))
+
+    def test_layout_fits_canvas(self):
+        """Test if long and short texts are laid out inside the margins."""
+
+        # Lay out a long and a short quote.
+        long_text = " ".join(["Πάντα χωρεῖ καὶ οὐδὲν μένει, everything flows."] * 12)
+        layouts = {}
+        for name, text in (("long", long_text), ("short", "Brevis esse laboro.")):
+            layouts[name] = fit_layout([TextBlock(text, GENTIUM_BOLD_TTF),
+                                        TextBlock("/ Author\n In Locus 1.1 /",
+                                                  GENTIUM_REG_TTF, 0.75)], IMG_SIZE)
+
+        # Assert.
+        width, height = IMG_SIZE
+        for _, lines in layouts.values():
+            for line in lines:
+                self.assertLessEqual(text_width(line.font, line.text), width * 0.84 + 1)
+                self.assertGreaterEqual(line.y, 0)
+                self.assertLessEqual(line.y + line_height(line.font), height)
+        self.assertGreater(layouts["short"][0], layouts["long"][0])
+        self.assertGreater(len(layouts["long"][1]), 5)
+
+    def test_render_cache_hit_skips_drawing(self):
+        """Test if a render cache hit returns the stored bytes without drawing."""
+
+        # Render once into an empty cache.
+        cache_dir = TEMP_DIR.joinpath("render_cache")
+        rmtree(cache_dir, ignore_errors=True)
+        cache = RenderCache(cache_dir, 10 ** 7)
+        wisdom = Wisdom(*self.test_data)
+        first = ImagePost(wisdom, IMG_SIZE, IMG_BG_COLOR, IMG_TEXT_COLOR,
+                          GENTIUM_REG_TTF, GENTIUM_BOLD_TTF, cache).encode()
+
+        # Same quote again, different settings.
+        with patch.object(ImagePost, "create_image") as mock_create:
+            second = ImagePost(wisdom, IMG_SIZE, IMG_BG_COLOR, IMG_TEXT_COLOR,
+                               GENTIUM_REG_TTF, GENTIUM_BOLD_TTF, cache).encode()
+            drawn_on_hit = mock_create.call_count
+        other = ImagePost(wisdom, IMG_SIZE, IMG_BG_COLOR, (0, 0, 0),
+                          GENTIUM_REG_TTF, GENTIUM_BOLD_TTF, cache).encode()
+        rmtree(cache_dir, ignore_errors=True)
+
+        # Assert.
+        self.assertEqual(first, second)
+        self.assertEqual(drawn_on_hit, 0)
+        self.assertNotEqual(first, other)
+        self.assertEqual((cache.hits, cache.misses), (1, 2))
+
+    def test_render_cache_lru_eviction(self):
+        """Test if the render cache evicts least recently used entries."""
+
+        # Cache of 250 bytes, three 100 byte entries, "a" used again.
+        cache_dir = TEMP_DIR.joinpath("render_cache")
+        rmtree(cache_dir, ignore_errors=True)
+        cache = RenderCache(cache_dir, 250)
+        cache.put("a", b"a" * 100)
+        cache.put("b", b"b" * 100)
+        cache.get("a")
+        cache.put("c", b"c" * 100)
+        kept = [key for key in "abc" if cache.get(key) is not None]
+        rmtree(cache_dir, ignore_errors=True)
+
+        # Assert.
+        self.assertEqual(kept, ["a", "c"])
+
+    def test_render_corpus_subset(self):
+        """Test if the batch renderer writes one image per selected quote."""
+
+        # Render two quotes and Heraclitus' quotes with two workers.
+        TEMP_DIR.mkdir(parents=True, exist_ok=True)
+        copyfile(DB_FILE, TEMP_DB_COPY)
+        out_dir = TEMP_DIR.joinpath("render_out")
+        rmtree(out_dir, ignore_errors=True)
+        image_settings = (IMG_SIZE, IMG_BG_COLOR, IMG_TEXT_COLOR,
+                          GENTIUM_REG_TTF, GENTIUM_BOLD_TTF)
+        by_id = render_corpus(TEMP_DB_COPY, image_settings, out_dir,
+                              ids=["agathon_past", "cicero_inter_arma"], workers=2)
+        by_author = render_corpus(TEMP_DB_COPY, image_settings, out_dir,
+                                  author="Heraclitus", workers=2)
+        written = sorted(file.name for file in out_dir.iterdir())
+        rmtree(out_dir, ignore_errors=True)
+        close_connections()
+        with suppress(FileNotFoundError):
+            remove(TEMP_DB_COPY)
+
+        # Assert.
+        self.assertEqual(by_id, 2)
+        self.assertGreater(by_author, 0)
+        self.assertEqual(len(written), by_id + by_author)
+        self.assertIn("agathon_past.jpg", written)
+
+    def test_render_corpus_warms_variants(self):
+        """Test if the batch renderer fills the cache with the variants
+           the posts are encoded to, so posting draws nothing."""
+
+        # Render one quote to the cache.
+        TEMP_DIR.mkdir(parents=True, exist_ok=True)
+        copyfile(DB_FILE, TEMP_DB_COPY)
+        cache_dir = TEMP_DIR.joinpath("render_warm")
+        rmtree(cache_dir, ignore_errors=True)
+        image_settings = (IMG_SIZE, IMG_BG_COLOR, IMG_TEXT_COLOR,
+                          GENTIUM_REG_TTF, GENTIUM_BOLD_TTF)
+        render_corpus(TEMP_DB_COPY, image_settings, cache_settings=(cache_dir, 10 ** 8),
+                      ids=["agathon_past"], workers=1)
+        close_connections()
+        with suppress(FileNotFoundError):
+            remove(TEMP_DB_COPY)
+
+        # Encode the variants as prepare_posts does, without drawing.
+        with closing(sqlite3.connect(f"{DB_FILE.as_uri()}?mode=ro", uri=True)) as con:
+            wisdom = Wisdom(*con.execute(
+                "SELECT id_title, quote_orig, quote_eng, attrib_to, locus, locus_form, "
+                "comment, used FROM wisdoms WHERE id_title = 'agathon_past'").fetchone())
+        image_post = ImagePost(wisdom, *image_settings, RenderCache(cache_dir, 10 ** 8))
+        with patch.object(ImagePost, "create_image") as mock_create:
+            media = image_post.encode_variants(variant_specs(IMG_VARIANTS))
+        rmtree(cache_dir, ignore_errors=True)
+
+        # Assert.
+        mock_create.assert_not_called()
+        self.assertEqual(set(media), set(IMG_VARIANTS))
+
+    def test_image_post_in_memory_buffer(self):
+        """Test if the image is encoded once in memory, and written to disk
+           only for path-only clients."""
 
         # Create instance.
         wisdom = Wisdom(*self.test_data)
         image_post = ImagePost(wisdom, IMG_SIZE, IMG_BG_COLOR, IMG_TEXT_COLOR,
                             GENTIUM_REG_TTF, GENTIUM_BOLD_TTF)
 
-        # Attempt to open binary before saving.
-        with self.assertRaises(TypeError):
-            image_post.open_bin()
+        # Binary data without saving, then a temporary file.
+        bin_data = image_post.open_bin()
+        temp_path = image_post.file_path()
+        with open(temp_path, "rb") as file:
+            file_data = file.read()
+        image_post.discard_file()
+
+        # Assert.
+        self.assertIsInstance(bin_data, bytes)
+        self.assertIs(image_post.encode(), bin_data)
+        self.assertEqual(bytes(image_post.view()), bin_data)
+        self.assertEqual(image_post.open_stream().read(), bin_data)
+        self.assertEqual(file_data, bin_data)
+        self.assertFalse(path.exists(temp_path))
+        self.assertIsNone(image_post.path)
+
+    def test_image_post_variants(self):
+        """Test per-platform variants: size, format and byte budget."""
+
+        # Create instance.
+        wisdom = Wisdom(*self.test_data)
+        image_post = ImagePost(wisdom, IMG_SIZE, IMG_BG_COLOR, IMG_TEXT_COLOR,
+                            GENTIUM_REG_TTF, GENTIUM_BOLD_TTF)
+
+        # Encode a tight budget portrait JPEG and a lossless PNG.
+        specs = variant_specs({
+            "small": {"size": (1080, 1350), "format": "JPEG", "max_bytes": 21000},
+            "lossless": {"format": "PNG"},
+        })
+        media = image_post.encode_variants(specs)
+        with Image.open(BytesIO(media["small"].data)) as small:
+            small_info = (small.format, small.size)
+        with Image.open(BytesIO(media["lossless"].data)) as lossless:
+            lossless_info = (lossless.format, lossless.size)
+
+        # Assert.
+        self.assertLessEqual(len(media["small"].data), 21000)
+        self.assertEqual(small_info, ("JPEG", (1080, 1350)))
+        self.assertEqual(lossless_info, ("PNG", IMG_SIZE))
+        self.assertEqual(media["lossless"].mime_type, "image/png")
+        self.assertEqual(image_post.open_bin("small"), media["small"].data)
+        # Platforms without a variant get the baseline JPEG.
+        self.assertEqual(image_post.open_bin("other"), image_post.encode())
+        with self.assertRaises(ValueError):
+            variant_specs({"bad": {"format": "BMP"}})
+
+    def test_background_template_cache(self):
+        """Test if an artwork background is built once, then served as
+           copies from memory and from the disk cache."""
+
+        # Build a template with a temporary disk cache.
+        background = Background("the_thinker_640x480.jpg", blur=2, darken=0.5, vignette=0.5)
+        disk_cache = RenderCache(TEMP_DIR.joinpath("templates"), 1 << 24, ".png")
+        with patch("backend.template_func._disk_cache", disk_cache):
+            clear_template_cache()
+            first = load_background((300, 200), IMG_BG_COLOR, background)
+            first.putpixel((0, 0), (255, 0, 0))
+            second = load_background((300, 200), IMG_BG_COLOR, background)
+            clear_template_cache()
+            from_disk = load_background((300, 200), IMG_BG_COLOR, background)
+            clear_template_cache()
+        rmtree(TEMP_DIR.joinpath("templates"), ignore_errors=True)
+
+        # Assert.
+        self.assertEqual(second.size, (300, 200))
+        self.assertNotEqual(second.getpixel((0, 0)), (255, 0, 0))
+        self.assertEqual((disk_cache.hits, disk_cache.misses), (1, 1))
+        self.assertEqual(from_disk.tobytes(), second.tobytes())
+
+    def test_procedural_background(self):
+        """Test gradients and seeded textures: deterministic per seed."""
+
+        # Create a gradient and textured copies of it.
+        base = gradient((64, 48), (255, 0, 0), (0, 0, 255), "linear", 0)
+        first = texture(base, seed_from("agathon_past"), parchment=0.5, grain=0.5)
+        again = texture(base, seed_from("agathon_past"), parchment=0.5, grain=0.5)
+        other = texture(base, seed_from("cicero_inter_arma"), parchment=0.5, grain=0.5)
+
+        # Assert.
+        self.assertEqual(base.getpixel((0, 24)), (255, 0, 0))
+        self.assertEqual(base.getpixel((63, 24)), (0, 0, 255))
+        self.assertEqual(first.size, (64, 48))
+        self.assertEqual(first.tobytes(), again.tobytes())
+        self.assertNotEqual(first.tobytes(), other.tobytes())
+        self.assertNotEqual(first.tobytes(), base.tobytes())
+        with self.assertRaises(ValueError):
+            gradient((64, 48), (0, 0, 0), (0, 0, 0), "spiral")
+
+    def test_benchmark_report(self):
+        """Test the rendering benchmark report and baseline comparison."""
+
+        # Benchmark the short synthetic quote.
+        TEMP_DIR.mkdir(parents=True, exist_ok=True)
+        datasets = {"short": synthetic_quotes()["short"]}
+        results = run_benchmark(datasets, repeat=2)
+        # A baseline twice as fast as the slowest stage, with no slack.
+        slowest = max(results["short"], key=lambda stage: results["short"][stage]["p95_ms"])
+        baseline = {"short": {slowest: {"p50_ms": 0.0, "p95_ms": 0.0}}}
+
+        # Assert.
+        self.assertEqual(set(results["short"]), set(STAGES))
+        self.assertEqual(results["short"]["encode"]["n"], 2)
+        self.assertGreater(results["short"]["create_image"]["peak_kib"], 0)
+        self.assertEqual(compare(results, results), [])
+        self.assertEqual(len(compare(results, baseline, slack_ms=0.0)), 2)
 
 
 # Print on accidental run:
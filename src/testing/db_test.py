@@ -1,38 +1,88 @@
 """
 db_test.py
 
-Unittest class that tests database functionality.
+Unittest classes that test database functionality.
 
 Part of the "Ancient Wisdom Daily" project by OperaVaria.
 """
 
 # Imports from built-in modules:
 import sqlite3
-from contextlib import suppress
-from os import remove
-from shutil import copyfile
-from unittest import TestCase
+import threading
+from datetime import date
+from hashlib import sha256
+from os import chmod
 
 # Imports from local modules:
-from backend.db_func import db_get, db_reset, log_remaining
+from backend.conn_func import close_connections, db_connection, get_connection
+from backend.db_func import (claim_random, db_get, db_reset, init_schema, log_remaining,
+                             schedule_list, schedule_reserve)
 from backend.classes import Wisdom
-from config.path_constants import DB_FILE, TEMP_DIR, TEMP_DB_COPY, FAKE_DB_FILE
+from backend.glyph_func import check_corpus
+from backend.sampler_func import FenwickTree, WeightedSampler
+from backend.search_func import search_wisdoms
+from config.path_constants import TEMP_DB_COPY, TEMP_STATE_DB, FAKE_DB_FILE
+from testing.temp_db import TempDatabaseTestCase
 
 
-class DatabaseTests(TestCase):
+class DatabaseTests(TempDatabaseTestCase):
     """Database related unit tests."""
 
-    def setUp(self):
-        """Copy wisdoms.db file to temp dir.
-           Create temp dir if one does not exist."""
-        TEMP_DIR.mkdir(parents=True, exist_ok=True)
-        copyfile(DB_FILE, TEMP_DB_COPY)
-
     def test_db_get_error_handling(self):
         """Test db_get with invalid database path."""
         with self.assertRaises(sqlite3.Error):
             db_get(FAKE_DB_FILE)
 
+    def test_connection_reuse_and_pragmas(self):
+        """Test if connections are cached per thread and tuned."""
+
+        # Same thread: same warm connection.
+        with db_connection(TEMP_DB_COPY) as con:
+            journal_mode = con.execute("PRAGMA journal_mode").fetchone()[0]
+        same_con = get_connection(TEMP_DB_COPY)
+
+        # Other thread: its own connection.
+        other = []
+        worker = threading.Thread(target=lambda: other.append(get_connection(TEMP_DB_COPY)))
+        worker.start()
+        worker.join()
+
+        # Assert.
+        self.assertIs(con, same_con)
+        self.assertIsNot(con, other[0])
+        self.assertEqual(journal_mode, "wal")
+
+    def test_corpus_readers_keep_journal_mode(self):
+        """Test if searching and glyph checks open the corpus read-only
+           and leave its rollback journal."""
+
+        # Search (builds the index) and check the glyphs.
+        search_wisdoms(TEMP_DB_COPY, "laws")
+        check_corpus(TEMP_DB_COPY)
+        close_connections()
+        con = sqlite3.connect(TEMP_DB_COPY)
+        journal_mode = con.execute("PRAGMA journal_mode").fetchone()[0]
+        con.close()
+
+        # Assert.
+        self.assertEqual(journal_mode, "delete")
+        with self.assertRaises(sqlite3.OperationalError):
+            with db_connection(TEMP_DB_COPY, role="read") as con:
+                con.execute("UPDATE wisdoms SET used = 1")
+
+    def test_connections_closed_on_thread_exit(self):
+        """Test if a thread's connections are closed once it exits."""
+
+        # Open a connection in a short-lived thread.
+        other = []
+        worker = threading.Thread(target=lambda: other.append(get_connection(TEMP_DB_COPY)))
+        worker.start()
+        worker.join()
+
+        # Assert.
+        with self.assertRaises(sqlite3.ProgrammingError):
+            other[0].execute("SELECT 1")
+
     def test_db_get_returns_wisdom_object(self):
         """Test if db_get returns a valid Wisdom object."""
 
@@ -50,6 +100,165 @@ class DatabaseTests(TestCase):
         self.assertIsNotNone(wisdom.comment)
         self.assertIsNotNone(wisdom.used)
 
+    def test_db_get_empty_corpus(self):
+        """Test if db_get raises instead of looping on an empty corpus."""
+
+        # Empty the corpus.
+        with db_connection(TEMP_DB_COPY) as con:
+            con.execute("DELETE FROM wisdoms")
+            con.commit()
+
+        # Assert.
+        with self.assertRaises(sqlite3.DataError):
+            db_get(TEMP_DB_COPY)
+
+    def test_db_get_deck_mode_cycle(self):
+        """Test if deck mode returns every quote once per cycle
+           without writing the used flags."""
+
+        # Get the number of quotes.
+        con = sqlite3.connect(TEMP_DB_COPY)
+        cur = con.cursor()
+        cur.execute("SELECT COUNT(*) FROM wisdoms")
+        total = cur.fetchone()[0]
+        con.close()
+
+        # Draw a full cycle plus one.
+        cycle = [db_get(TEMP_DB_COPY, mode="deck").id for _ in range(total)]
+        next_cycle = db_get(TEMP_DB_COPY, mode="deck")
+
+        # Check the used flags.
+        con = sqlite3.connect(TEMP_DB_COPY)
+        cur = con.cursor()
+        cur.execute("SELECT COUNT(*) FROM state WHERE used = 1")
+        flagged_used = cur.fetchone()[0]
+        con.close()
+
+        # Assert.
+        self.assertEqual(len(set(cycle)), total, "Quote repeated within a cycle.")
+        self.assertIsInstance(next_cycle, Wisdom)
+        self.assertEqual(flagged_used, 0)
+
+    def test_deck_pop_concurrent(self):
+        """Test if threads popping one deck never get the same quote."""
+
+        # Deal the deck.
+        db_get(TEMP_DB_COPY, mode="deck")
+
+        # Four threads, each on its own connection, popping five quotes.
+        ids = []
+        def pop_five():
+            ids.extend(db_get(TEMP_DB_COPY, mode="deck").id for _ in range(5))
+        workers = [threading.Thread(target=pop_five) for _ in range(4)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        # Assert.
+        self.assertEqual(len(ids), 20)
+        self.assertEqual(len(set(ids)), 20)
+
+    def test_db_get_separate_state(self):
+        """Test if db_get works with a read-only corpus and a separate state file."""
+
+        # Make corpus read-only, remember its content.
+        chmod(TEMP_DB_COPY, 0o444)
+        with open(TEMP_DB_COPY, "rb") as file:
+            corpus_hash = sha256(file.read()).hexdigest()
+
+        # Claim two quotes.
+        first = db_get(TEMP_DB_COPY, state_file=TEMP_STATE_DB)
+        second = db_get(TEMP_DB_COPY, state_file=TEMP_STATE_DB)
+        close_connections()
+
+        # Check the state file and the corpus.
+        con = sqlite3.connect(TEMP_STATE_DB)
+        cur = con.cursor()
+        cur.execute("SELECT id_title FROM state WHERE used = 1")
+        claimed = {row[0] for row in cur.fetchall()}
+        con.close()
+        with open(TEMP_DB_COPY, "rb") as file:
+            new_hash = sha256(file.read()).hexdigest()
+        chmod(TEMP_DB_COPY, 0o644)
+
+        # Assert.
+        self.assertNotEqual(first.id, second.id)
+        self.assertEqual(claimed, {first.id, second.id})
+        self.assertEqual(corpus_hash, new_hash)
+
+    def test_db_get_channels_independent(self):
+        """Test if channels keep separate selection state and resets."""
+
+        # Get the number of quotes.
+        con = sqlite3.connect(TEMP_DB_COPY)
+        cur = con.cursor()
+        cur.execute("SELECT COUNT(*) FROM wisdoms")
+        total = cur.fetchone()[0]
+        con.close()
+
+        # Use up channel "a", draw once from channel "b".
+        cycle_a = {db_get(TEMP_DB_COPY, channel="a").id for _ in range(total)}
+        db_get(TEMP_DB_COPY, channel="b")
+        # Next draw resets channel "a" only.
+        db_get(TEMP_DB_COPY, channel="a")
+        close_connections()
+
+        # Count used flags per channel.
+        con = sqlite3.connect(TEMP_DB_COPY)
+        cur = con.cursor()
+        cur.execute("SELECT channel, COUNT(*) FROM state WHERE used = 1 GROUP BY channel")
+        used_counts = dict(cur.fetchall())
+        con.close()
+
+        # Assert.
+        self.assertEqual(len(cycle_a), total, "Quote repeated within a cycle.")
+        self.assertEqual(used_counts.get("a"), 1)
+        self.assertEqual(used_counts.get("b"), 1)
+
+    def test_sync_state_low_rowid(self):
+        """Test if quotes added below the highest rowid (as after a VACUUM
+           renumbering) still reach the channel state."""
+
+        # First sync, then add a quote with the lowest rowid.
+        db_get(TEMP_DB_COPY)
+        with db_connection(TEMP_DB_COPY) as con:
+            con.execute("INSERT INTO wisdoms (rowid, id_title, quote_orig, quote_eng, "
+                        "attrib_to, locus, locus_form, comment, used) "
+                        "VALUES (-1, 'low_rowid', 'a', 'b', 'c', 'd', 'e', 'f', 0)")
+            con.commit()
+        db_get(TEMP_DB_COPY)
+
+        # Check the state table.
+        with db_connection(TEMP_DB_COPY) as con:
+            synced = con.execute("SELECT COUNT(*) FROM state "
+                                 "WHERE id_title = 'low_rowid'").fetchone()[0]
+
+        # Assert.
+        self.assertEqual(synced, 1)
+
+    def test_db_get_skips_unchanged_corpus(self):
+        """Test if a run on an unchanged corpus does not scan the wisdoms table."""
+
+        # First run syncs, trace the statements of the second one.
+        db_get(TEMP_DB_COPY)
+        con = get_connection(TEMP_DB_COPY)
+        statements = []
+        con.set_trace_callback(statements.append)
+        try:
+            db_get(TEMP_DB_COPY)
+        finally:
+            con.set_trace_callback(None)
+
+        # Query plans of the statements reading the corpus.
+        plans = [" ".join(row[3] for row in con.execute(f"EXPLAIN QUERY PLAN {sql}"))
+                 for sql in statements if "wisdoms" in sql and not sql.startswith("--")]
+
+        # Assert.
+        self.assertTrue(plans)
+        for plan in plans:
+            self.assertNotIn("SCAN wisdoms", plan)
+
     def test_db_reset_clears_used_flags(self):
         """Test if db_reset properly resets used flags."""
 
@@ -58,14 +267,15 @@ class DatabaseTests(TestCase):
         cur = con.cursor()
 
         # Set all items to used.
-        cur.execute("UPDATE wisdoms SET used = 1")
+        init_schema(cur)
+        cur.execute("UPDATE state SET used = 1")
         con.commit()
 
         # Call db_reset function.
         db_reset(con, cur)
 
         # Check the result.
-        cur.execute("SELECT COUNT(*) FROM wisdoms WHERE used = 0")
+        cur.execute("SELECT COUNT(*) FROM state WHERE used = 0")
         flagged_used = cur.fetchone()[0]
         cur.execute("SELECT COUNT(*) FROM wisdoms")
         total = cur.fetchone()[0]
@@ -74,6 +284,56 @@ class DatabaseTests(TestCase):
         con.close()
         self.assertEqual(flagged_used, total, "Not all rows were reset.")
 
+    def test_claim_random_skips_used(self):
+        """Test if claim_random only claims unused rows, None when exhausted."""
+
+        # Set up connection.
+        con = sqlite3.connect(TEMP_DB_COPY)
+        cur = con.cursor()
+        init_schema(cur)
+
+        # Leave two unused items.
+        cur.execute("UPDATE state SET used = 1")
+        cur.execute("UPDATE state SET used = 0 WHERE rowid IN "
+                    "(SELECT rowid FROM state ORDER BY rowid DESC LIMIT 2)")
+        con.commit()
+        cur.execute("SELECT id_title FROM state WHERE used = 0")
+        expected = {row[0] for row in cur.fetchall()}
+
+        # Claim both, then nothing is left.
+        claimed = {claim_random(cur), claim_random(cur)}
+        exhausted = claim_random(cur)
+
+        # Close and assert.
+        con.close()
+        self.assertEqual(claimed, expected)
+        self.assertIsNone(exhausted)
+
+    def test_remaining_counter_follows_updates(self):
+        """Test if the trigger-maintained counter matches a full count."""
+
+        # Set up connection.
+        con = sqlite3.connect(TEMP_DB_COPY)
+        cur = con.cursor()
+        init_schema(cur)
+
+        # Change flags, claim and reset.
+        cur.execute("UPDATE state SET used = 1 WHERE id_title LIKE 'c%'")
+        claim_random(cur)
+        con.commit()
+        counted = log_remaining(cur)
+        cur.execute("SELECT COUNT(*) FROM state WHERE used = 0")
+        expected = cur.fetchone()[0]
+        db_reset(con, cur)
+        after_reset = log_remaining(cur)
+        cur.execute("SELECT COUNT(*) FROM wisdoms")
+        total = cur.fetchone()[0]
+
+        # Close and assert.
+        con.close()
+        self.assertEqual(counted, expected)
+        self.assertEqual(after_reset, total)
+
     def test_log_remaining_counts_correctly(self):
         """Test if log_remaining correctly counts unused items."""
 
@@ -82,12 +342,13 @@ class DatabaseTests(TestCase):
         cur = con.cursor()
 
         # Set a known state.
-        cur.execute("UPDATE wisdoms SET used = 0")
-        cur.execute("UPDATE wisdoms SET used = 1 WHERE id_title LIKE 'test%'")
+        init_schema(cur)
+        cur.execute("UPDATE state SET used = 0")
+        cur.execute("UPDATE state SET used = 1 WHERE id_title LIKE 'test%'")
         con.commit()
 
         # Get the correct count.
-        cur.execute("SELECT COUNT(*) FROM wisdoms WHERE used = 0")
+        cur.execute("SELECT COUNT(*) FROM state WHERE used = 0")
         expected = cur.fetchone()[0]
 
         # Test the function.
@@ -97,11 +358,212 @@ class DatabaseTests(TestCase):
         con.close()
         self.assertEqual(result, expected, "Incorrect count of remaining items.")
 
-    def tearDown(self):
-        """Remove temporary files if they exist."""
-        with suppress(FileNotFoundError):
-            remove(TEMP_DB_COPY)
-            remove(FAKE_DB_FILE)
+
+class ScheduleTests(TempDatabaseTestCase):
+    """Unit tests of the posting schedule."""
+
+    def test_schedule_reserve_and_get(self):
+        """Test if reserved quotes are posted on their dates, once."""
+
+        # Reserve three days, then two more after them.
+        start = date(2030, 1, 1)
+        first = schedule_reserve(TEMP_DB_COPY, 3, start=start)
+        second = schedule_reserve(TEMP_DB_COPY, 2, start=start)
+        upcoming = schedule_list(TEMP_DB_COPY, start=start)
+
+        # Daily runs: the scheduled quote, then a fresh pick on a rerun.
+        scheduled = db_get(TEMP_DB_COPY, post_date=start)
+        rerun = db_get(TEMP_DB_COPY, post_date=start)
+
+        # Assert.
+        self.assertEqual([day for day, _ in first + second],
+                         ["2030-01-01", "2030-01-02", "2030-01-03",
+                          "2030-01-04", "2030-01-05"])
+        self.assertEqual([wis.id for _, wis in upcoming],
+                         [wis.id for _, wis in first + second])
+        self.assertEqual(len({wis.id for _, wis in upcoming}), 5)
+        self.assertEqual(scheduled.id, first[0][1].id)
+        self.assertNotIn(rerun.id, [wis.id for _, wis in upcoming])
+        self.assertEqual(len(schedule_list(TEMP_DB_COPY, start=start)), 4)
+
+
+    def test_reset_keeps_scheduled_quotes(self):
+        """Test if a quote scheduled for an upcoming date stays out of
+           the new cycle after the corpus is exhausted."""
+
+        # Reserve a day, then exhaust the rest of the corpus.
+        scheduled = schedule_reserve(TEMP_DB_COPY, 1, start=date(2030, 1, 1))[0][1].id
+        with db_connection(TEMP_DB_COPY) as con:
+            con.execute("UPDATE state SET used = 1")
+            con.commit()
+            total = con.execute("SELECT COUNT(*) FROM wisdoms").fetchone()[0]
+
+        # Post a full new cycle before the scheduled date, on both modes.
+        ids = [db_get(TEMP_DB_COPY, post_date=date(2029, 1, 1)).id for _ in range(total - 1)]
+        deck_ids = [db_get(TEMP_DB_COPY, mode="deck", post_date=date(2029, 1, 1)).id
+                    for _ in range(total - 1)]
+        on_date = db_get(TEMP_DB_COPY, post_date=date(2030, 1, 1))
+
+        # Assert.
+        self.assertNotIn(scheduled, ids)
+        self.assertEqual(len(set(ids)), total - 1)
+        self.assertNotIn(scheduled, deck_ids)
+        self.assertEqual(on_date.id, scheduled)
+
+class SamplerTests(TempDatabaseTestCase):
+    """Unit tests of the weighted sampler."""
+
+    def test_fenwick_tree_lookup(self):
+        """Test weighted index lookup and updates of FenwickTree."""
+
+        # Weights 1, 0, 3, 0, 2: cumulative ranges [0, 1), [1, 4), [4, 6).
+        tree = FenwickTree([1.0, 0.0, 3.0, 0.0, 2.0])
+        found = [tree.find(value) for value in (0.0, 0.99, 1.0, 3.99, 4.0, 5.99)]
+        tree.add(2, -3.0)
+
+        # Assert.
+        self.assertEqual(found, [0, 0, 2, 2, 4, 4])
+        self.assertEqual(tree.total(), 3.0)
+        self.assertEqual(tree.find(1.5), 4)
+
+    def test_weighted_sampler_exclusion_window(self):
+        """
+        Test if the sampler does not repeat an author within the window
+        while quotes by other authors are still unused.
+        """
+
+        # Sampler balancing authors, excluding the last two.
+        sampler = WeightedSampler(balance_column="attrib_to", recency_half_life=5,
+                                  exclude_column="attrib_to", exclude_window=2)
+        authors = [db_get(TEMP_DB_COPY, sampler=sampler).attribution for _ in range(2)]
+
+        # Draw more than a full cycle, recording the authors still available.
+        available = []
+        for _ in range(40):
+            with db_connection(TEMP_DB_COPY) as con:
+                unused = {row[0] for row in con.execute(
+                    "SELECT attrib_to FROM wisdoms JOIN state USING (id_title) "
+                    "WHERE channel = 'default' AND state.used = 0")}
+            available.append(unused)
+            authors.append(db_get(TEMP_DB_COPY, sampler=sampler).attribution)
+
+        # Assert.
+        for i, unused in enumerate(available, start=2):
+            if unused - set(authors[i - 2:i]):
+                self.assertNotIn(authors[i], authors[i - 2:i])
+
+    def test_weighted_sampler_recency_follows_posts(self):
+        """Test if the recency term counts the posts made after the
+           sampler state was built, e.g. by another process."""
+
+        # Two unused quotes, sampler state built before either is posted.
+        db_get(TEMP_DB_COPY)
+        sampler = WeightedSampler(recency_half_life=10 ** 6)
+        with db_connection(TEMP_DB_COPY) as con:
+            con.execute("UPDATE state SET used = id_title NOT IN "
+                        "('agathon_past', 'heraclitus_flow') WHERE channel = 'default'")
+            sampler.draw(con.cursor(), "default")
+            con.execute("INSERT INTO history (channel, id_title) "
+                        "VALUES ('default', 'agathon_past')")
+            draws = {sampler.draw(con.cursor(), "default") for _ in range(20)}
+            con.commit()
+
+        # Assert: the quote just posted weighs next to nothing.
+        self.assertEqual(draws, {"heraclitus_flow"})
+
+    def test_weighted_sampler_full_cycles(self):
+        """Test if the sampler keeps cycling through the whole corpus."""
+
+        # Count the quotes.
+        with db_connection(TEMP_DB_COPY) as con:
+            total = con.execute("SELECT COUNT(*) FROM wisdoms").fetchone()[0]
+        with db_connection(TEMP_DB_COPY) as con:
+            con.execute("UPDATE wisdoms SET used = 0")
+            con.commit()
+        sampler = WeightedSampler(balance_column="attrib_to", recency_half_life=5,
+                                  exclude_column="attrib_to", exclude_window=2)
+
+        # Draw several full cycles.
+        ids = [db_get(TEMP_DB_COPY, sampler=sampler).id for _ in range(total * 5)]
+
+        # Assert: every cycle posts each quote once.
+        for start in range(0, len(ids), total):
+            self.assertEqual(len(set(ids[start:start + total])), total)
+
+
+class SearchTests(TempDatabaseTestCase):
+    """Unit tests of the full-text search."""
+
+    def test_search_accent_insensitive(self):
+        """Test if search matches polytonic Greek without accents."""
+
+        # Accented, unaccented and upper case queries.
+        accented = [wis.id for wis in search_wisdoms(TEMP_DB_COPY, "θεὸς")]
+        plain = [wis.id for wis in search_wisdoms(TEMP_DB_COPY, "θεος")]
+        upper = [wis.id for wis in search_wisdoms(TEMP_DB_COPY, "ΘΕΟΣ")]
+
+        # Assert.
+        self.assertIn("agathon_past", accented)
+        self.assertEqual(accented, plain)
+        self.assertEqual(accented, upper)
+
+    def test_search_reuses_folded_vocabulary(self):
+        """Test if the folded vocabulary is stored with the index, so later
+           searches (from any process) do not scan the index vocabulary."""
+
+        # Build the index, then trace a search on fresh connections.
+        search_wisdoms(TEMP_DB_COPY, "laws")
+        close_connections()
+        con = get_connection(TEMP_DB_COPY, role="read")
+        statements = []
+        con.set_trace_callback(statements.append)
+        try:
+            found = [wis.id for wis in search_wisdoms(TEMP_DB_COPY, "θεος")]
+        finally:
+            con.set_trace_callback(None)
+
+        # Assert.
+        self.assertIn("agathon_past", found)
+        self.assertTrue(statements)
+        self.assertFalse([sql for sql in statements if "wisdoms_fts_vocab" in sql])
+
+    def test_search_follows_updates(self):
+        """Test if the search index is kept in sync by triggers."""
+
+        # Build index, then change a comment.
+        search_wisdoms(TEMP_DB_COPY, "laws")
+        con = sqlite3.connect(TEMP_DB_COPY)
+        cur = con.cursor()
+        cur.execute("UPDATE wisdoms SET comment = 'Ἀνάγκη ephemeral' "
+                    "WHERE id_title = 'cicero_inter_arma'")
+        con.commit()
+        con.close()
+
+        # Search for the new words.
+        found = [wis.id for wis in search_wisdoms(TEMP_DB_COPY, "ephemeral αναγκη",
+                                                  column="comment")]
+
+        # Assert.
+        self.assertEqual(found, ["cicero_inter_arma"])
+
+    def test_search_survives_rowid_renumbering(self):
+        """Test if search results stay right after the implicit wisdoms
+           rowids change (as VACUUM may do) and after a deletion."""
+
+        # Build index, then shift every rowid and delete a quote.
+        search_wisdoms(TEMP_DB_COPY, "laws")
+        with db_connection(TEMP_DB_COPY) as con:
+            con.execute("UPDATE wisdoms SET rowid = rowid + 1000")
+            con.execute("DELETE FROM wisdoms WHERE id_title = 'cicero_inter_arma'")
+            con.commit()
+
+        # Search.
+        found = [wis.id for wis in search_wisdoms(TEMP_DB_COPY, "flows")]
+        gone = search_wisdoms(TEMP_DB_COPY, "laws")
+
+        # Assert.
+        self.assertEqual(found, ["heraclitus_flow"])
+        self.assertEqual(gone, [])
 
 
 # Print on accidental run:
@@ -0,0 +1,125 @@
+"""
+import_test.py
+
+Unittest class that tests importing quote files.
+
+Part of the "Ancient Wisdom Daily" project by OperaVaria.
+"""
+
+# Imports from built-in modules:
+import json
+import sqlite3
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+# Imports from local modules:
+from backend.conn_func import close_connections
+from backend.glyph_func import DRAWN_FIELDS, check_corpus, check_rows, font_coverage
+from backend.import_func import import_file, import_rows, iter_json
+from config.path_constants import DB_DIR, DB_FILE, GENTIUM_BOLD_TTF, TEMP_DB_COPY
+from testing.temp_db import TempDatabaseTestCase
+
+
+class ImportTests(TempDatabaseTestCase):
+    """Unit tests related to importing quote files."""
+
+    def test_iter_json_streams_all_items(self):
+        """Test if the chunked .json reader yields the same items as json.load."""
+
+        # Load the whole file for comparison.
+        with open(DB_DIR.joinpath("wisdoms.json"), "r", encoding="utf-8") as file:
+            expected = json.load(file)
+
+        # Stream with a chunk size smaller than a single item.
+        streamed = list(iter_json(DB_DIR.joinpath("wisdoms.json"), chunk_size=64))
+
+        # Assert.
+        self.assertEqual(streamed, expected)
+
+    def test_iter_json_reports_malformed_offset(self):
+        """Test if malformed data before the end of the file raises with its byte offset."""
+
+        # A valid item with non-ASCII text, a broken one, then more than a chunk of items.
+        head = '[{"quote": "μῆνιν ἄειδε"}, '
+        items = ", ".join(['{"quote": "ok"}'] * 20)
+        with TemporaryDirectory() as temp_dir:
+            json_file = Path(temp_dir).joinpath("broken.json")
+            json_file.write_text(f"{head}{{\"quote\" 1}}, {items}]", encoding="utf-8")
+
+            # Stream with a small chunk size.
+            streamed = []
+            with self.assertRaises(ValueError) as context:
+                for row in iter_json(json_file, chunk_size=64):
+                    streamed.append(row)
+
+        # Assert: the offset points at the missing colon, in bytes.
+        error_at = len(f"{head}{{\"quote\" ".encode("utf-8"))
+        self.assertEqual(streamed, [{"quote": "μῆνιν ἄειδε"}])
+        self.assertIn(f"byte {error_at}:", str(context.exception))
+
+    def test_import_keeps_used_state(self):
+        """Test if importing updates content but keeps the used flags."""
+
+        # Change a quote and flag it used.
+        con = sqlite3.connect(TEMP_DB_COPY)
+        cur = con.cursor()
+        cur.execute("SELECT id_title FROM wisdoms LIMIT 1")
+        id_title = cur.fetchone()[0]
+        cur.execute("UPDATE wisdoms SET used = 1, comment = 'stale' WHERE id_title = ?",
+                    (id_title,))
+        cur.execute("SELECT COUNT(*) FROM wisdoms")
+        total = cur.fetchone()[0]
+        con.commit()
+        con.close()
+
+        # Import both file formats.
+        csv_count = import_file(TEMP_DB_COPY, DB_DIR.joinpath("wisdoms.csv"))
+        json_count = import_file(TEMP_DB_COPY, DB_DIR.joinpath("wisdoms.json"), batch_size=5)
+        close_connections()
+
+        # Check the row.
+        con = sqlite3.connect(TEMP_DB_COPY)
+        cur = con.cursor()
+        cur.execute("SELECT used, comment FROM wisdoms WHERE id_title = ?", (id_title,))
+        used, comment = cur.fetchone()
+        cur.execute("SELECT COUNT(*) FROM wisdoms")
+        new_total = cur.fetchone()[0]
+        con.close()
+
+        # Assert.
+        self.assertEqual(csv_count, total)
+        self.assertEqual(json_count, total)
+        self.assertEqual(new_total, total)
+        self.assertEqual(used, 1)
+        self.assertNotEqual(comment, "stale")
+
+    def test_import_unsupported_type(self):
+        """Test import_file with an unsupported file type."""
+        with self.assertRaises(ValueError):
+            import_file(TEMP_DB_COPY, DB_FILE)
+
+    def test_import_reports_missing_glyphs(self):
+        """Test if the import reports characters the image fonts lack,
+           and the corpus check finds none in the shipped quotes."""
+
+        # Import a row with an emoji and a symbol Gentium Plus lacks.
+        row = {"id_title": "glyph_test", "quote_orig": "Γνῶθι σεαυτόν \U0001F989",
+               "quote_eng": "Know thyself \u2BD1", "attrib_to": "Delphi",
+               "locus": "Paus. 10.24.1", "locus_form": "𝐏𝐚𝐮𝐬. 10.24.1", "comment": ""}
+        corpus_issues = check_corpus(TEMP_DB_COPY)
+        with self.assertLogs("backend.glyph_func", "WARNING") as logs:
+            import_rows(TEMP_DB_COPY, [row])
+        issues = check_rows([row], DRAWN_FIELDS)
+        coverage = font_coverage(GENTIUM_BOLD_TTF)
+
+        # Assert.
+        self.assertEqual([(issue.field, issue.codepoints) for issue in issues],
+                         [("quote_orig", ["U+1F989"]), ("quote_eng", ["U+2BD1"])])
+        self.assertEqual(len(logs.output), 2)
+        self.assertTrue({"Γ", "ῶ", "ό", "A", "é"} <= coverage)
+        self.assertEqual(corpus_issues, [])
+
+
+# Print on accidental run:
+if __name__ == "__main__":
+    print("Importable module. Not meant to be run!")
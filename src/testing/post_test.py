@@ -8,27 +8,20 @@ Part of the "Ancient Wisdom Daily" project by OperaVaria.
 
 # Imports from built-in modules:
 import sqlite3
-from contextlib import suppress
-from os import remove
-from shutil import copyfile
-from unittest import TestCase
+from unittest.mock import patch
 
 # Imports from local modules:
 from backend.classes import Wisdom, TextPost, ImagePost
+from backend.length_func import fits, graphemes, text_length
 from backend.post_func import assemble_posts
-from config.path_constants import TEMP_DIR, DB_FILE, GENTIUM_REG_TTF, GENTIUM_BOLD_TTF, TEMP_DB_COPY
+from config.path_constants import GENTIUM_REG_TTF, GENTIUM_BOLD_TTF, TEMP_DB_COPY
 from config.settings import IMG_SIZE, IMG_BG_COLOR, IMG_TEXT_COLOR
+from testing.temp_db import TempDatabaseTestCase
 
 
-class PostTests(TestCase):
+class PostTests(TempDatabaseTestCase):
     """Unit tests related to assembling posts."""
 
-    def setUp(self):
-        """Copy wisdoms.db file to temp dir.
-           Create temp dir if one does not exist."""
-        TEMP_DIR.mkdir(parents=True, exist_ok=True)
-        copyfile(DB_FILE, TEMP_DB_COPY)
-
     def test_assemble_posts(self):
         """Test if assemble_posts creates valid TextPost and ImagePost objects."""
 
@@ -73,10 +66,31 @@ class PostTests(TestCase):
                 self.assertLessEqual(post_length, 280,
                                      f"{wis_obj.id} exceeds X character limit")
 
-    def tearDown(self):
-        """Remove temporary files if they exist."""
-        with suppress(FileNotFoundError):
-            remove(TEMP_DB_COPY)
+    def test_text_length_rules(self):
+        """Test each platform's length counting rules."""
+
+        # Combining marks, emoji ZWJ sequences and flags are single graphemes.
+        text = "ὁ λόγος e\u0301 \U0001F468\u200d\U0001F469\u200d\U0001F467 \U0001F1EC\U0001F1F7"
+        self.assertEqual(len(list(graphemes(text))), 13)
+        self.assertEqual(text_length("bluesky", text), 13)
+        # X: Greek weighs 1, Greek Extended and emoji 2, links 23.
+        self.assertEqual(text_length("x", "λόγος"), 5)
+        self.assertEqual(text_length("x", "ὁ"), 2)
+        self.assertEqual(text_length("x", "\U0001F468\u200d\U0001F469\u200d\U0001F467"), 2)
+        self.assertEqual(text_length("x", "see https://example.com/" + "a" * 100), 27)
+        # Mastodon: links 23, remote mentions without the domain.
+        self.assertEqual(text_length("mastodon", "@user@example.social https://example.com/"
+                                     + "a" * 100), 29)
+
+        # TextPost memoizes per platform.
+        wis_obj = Wisdom("test_id", "x" * 290, "", "", "", "", "", False)
+        text_post = TextPost(wis_obj)
+        with patch("backend.classes.fits", wraps=fits) as mock_fits:
+            for _ in range(2):
+                self.assertFalse(text_post.fits("bluesky"))
+                self.assertFalse(text_post.fits("x"))
+                self.assertTrue(text_post.fits("mastodon"))
+        self.assertEqual(mock_fits.call_count, 3)
 
 
 # Print on accidental run:
@@ -0,0 +1,43 @@
+"""
+temp_db.py
+
+Base class of the unittest classes working on a temporary copy of the
+wisdoms.db file.
+
+Part of the "Ancient Wisdom Daily" project by OperaVaria.
+"""
+
+# Imports from built-in modules:
+from contextlib import suppress
+from os import remove
+from shutil import copyfile
+from unittest import TestCase
+
+# Imports from local modules:
+from backend.conn_func import close_connections
+from config.path_constants import DB_FILE, FAKE_DB_FILE, TEMP_DIR, TEMP_DB_COPY, TEMP_STATE_DB
+
+
+class TempDatabaseTestCase(TestCase):
+    """Copies the database before each test, cleans up after it."""
+
+    def setUp(self):
+        """Copy wisdoms.db file to temp dir.
+           Create temp dir if one does not exist."""
+        TEMP_DIR.mkdir(parents=True, exist_ok=True)
+        copyfile(DB_FILE, TEMP_DB_COPY)
+
+    def tearDown(self):
+        """Close cached connections, remove temporary files if they exist.
+           A read-only connection closed last leaves the WAL files behind:
+           they must not be paired with the next copy."""
+        close_connections()
+        for temp_file in (TEMP_DB_COPY, TEMP_STATE_DB, FAKE_DB_FILE):
+            for suffix in ("", "-wal", "-shm"):
+                with suppress(FileNotFoundError):
+                    remove(f"{temp_file}{suffix}")
+
+
+# Print on accidental run:
+if __name__ == "__main__":
+    print("Importable module. Not meant to be run!")
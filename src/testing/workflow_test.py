@@ -7,13 +7,14 @@ Part of the "Ancient Wisdom Daily" project by OperaVaria.
 """
 
 # Imports from built-in modules:
+import asyncio
 from os import path, remove
 from unittest import TestCase
-from unittest.mock import MagicMock, patch
+from unittest.mock import AsyncMock, MagicMock, patch
 
 # Imports from local modules:
 from backend.classes import Wisdom, TextPost, ImagePost
-from backend.multith_func import threaded_posting
+from backend.async_func import post_all
 from config.path_constants import GENTIUM_REG_TTF, GENTIUM_BOLD_TTF, TEMP_POST_IMG
 from config.settings import IMG_SIZE, IMG_BG_COLOR, IMG_TEXT_COLOR
 
@@ -25,7 +26,7 @@ class IntegrationTests(TestCase):
         """Integration test for the full posting workflow."""        
 
         # Create mock API clients.
-        mock_bs_cl = MagicMock()
+        mock_bs_cl = AsyncMock()
         mock_in_cl = MagicMock()
         mock_mt_api = MagicMock()
         mock_x_api = MagicMock()
@@ -54,11 +55,11 @@ class IntegrationTests(TestCase):
             # Mock the assemble_posts function to return the objects.
             mock_assemble.return_value = (text_post, image_post)
 
-            # Call threaded_posting function.
-            results = threaded_posting(
+            # Call post_all coroutine.
+            results = asyncio.run(post_all(
                 mock_bs_cl, mock_in_cl, mock_mt_api, mock_x_api, mock_x_cl,
                 text_post, image_post
-            )
+            ))
 
             # Verify all platforms were posted to.
             mock_bs_cl.send_post.assert_called_once()
@@ -68,6 +69,7 @@ class IntegrationTests(TestCase):
 
             # Verify response objects.
             self.assertEqual(len(results), 4)
+            self.assertTrue(all(result.ok for result in results))
 
             # Clean up.
             if path.exists(TEMP_POST_IMG):